@@ -0,0 +1,237 @@
+# app/api/routes_admin.py
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..core import jobs, profiler, scheduler
+from ..core.config import ADMIN_TOKEN
+from ..core.conversation_log import conversation_log
+from ..core.keypool import key_pool
+from ..core.loop_monitor import loop_monitor
+from ..core.metrics import render_prometheus
+from ..core.tracing import InMemoryExporter, get_exporter, summarize
+from ..core.usage import DIMENSIONS, usage_meter
+from ..presets.registry import get_registry, reload_registry
+from ..services.asr_cache import transcript_cache
+from ..services.knowledge import knowledge_base
+from ..services.response_cache import response_cache
+from ..services.warmup import run_warmup, start_background_warmup, warmup_status
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+
+def require_admin(token: Optional[str]) -> None:
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(401, {"error": "ADMIN_TOKEN_REQUIRED", "message": "需要有效的 X-Admin-Token"})
+
+
+@router.get("/traces")
+def get_traces(
+    turn_id: Optional[str] = Query(None),
+    trace_id: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=5000),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    查询最近的 span（需要 TRACE_EXPORTER=memory）
+    - 指定 turn_id：返回该轮 asr→chat→tts 全部 span 及最慢阶段
+    - 不指定：返回最近 limit 个 span
+    """
+    require_admin(x_admin_token)
+    exporter = get_exporter()
+    if not isinstance(exporter, InMemoryExporter):
+        raise HTTPException(400, {"error": "TRACE_EXPORTER_NOT_MEMORY", "message": "当前导出器不支持查询"})
+
+    spans = exporter.get_finished_spans(trace_id=trace_id, turn_id=turn_id)
+    if turn_id or trace_id:
+        return summarize(spans)
+    return {"spans": [s.to_dict() for s in spans[-limit:]], "total": len(spans)}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(x_admin_token: Optional[str] = Header(None)):
+    """Prometheus 文本格式的进程内指标"""
+    require_admin(x_admin_token)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/cache/responses")
+def get_response_cache_stats(x_admin_token: Optional[str] = Header(None)):
+    """角色对话响应缓存：条目数与命中/未命中统计"""
+    require_admin(x_admin_token)
+    return response_cache.stats()
+
+
+@router.delete("/cache/responses")
+def clear_response_cache(role: Optional[str] = Query(None), x_admin_token: Optional[str] = Header(None)):
+    """清空响应缓存（可只清某个角色）"""
+    require_admin(x_admin_token)
+    return {"cleared": response_cache.clear(role)}
+
+
+@router.get("/cache/asr")
+def get_asr_cache_stats(x_admin_token: Optional[str] = Header(None)):
+    """ASR 识别结果缓存与上传去重统计"""
+    require_admin(x_admin_token)
+    return transcript_cache.stats()
+
+
+@router.delete("/cache/asr")
+def clear_asr_cache(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {"cleared": transcript_cache.clear()}
+
+
+@router.get("/warmup")
+def get_warmup_status(x_admin_token: Optional[str] = Header(None)):
+    """角色语音预热进度"""
+    require_admin(x_admin_token)
+    return warmup_status()
+
+
+@router.post("/warmup")
+async def trigger_warmup(wait: bool = Query(False), x_admin_token: Optional[str] = Header(None)):
+    """重新预热（新增角色或清理缓存后使用）；wait=true 时等待完成再返回"""
+    require_admin(x_admin_token)
+    if wait:
+        return await run_warmup()
+    start_background_warmup()
+    return warmup_status()
+
+
+@router.post("/roles/reload")
+def reload_roles(force: bool = Query(False), x_admin_token: Optional[str] = Header(None)):
+    """重新加载角色数据（presets/data/*.json），无需重启；数据有误时保留旧版本"""
+    require_admin(x_admin_token)
+    try:
+        changed = reload_registry(force=force)
+    except ValueError as e:
+        raise HTTPException(400, {"error": "ROLE_DATA_INVALID", "message": str(e)})
+    registry = get_registry()
+    return {"reloaded": changed, "roles": [r.id for r in registry], "loaded_at": registry.loaded_at}
+
+
+@router.get("/upstream/keys")
+def get_upstream_keys(x_admin_token: Optional[str] = Header(None)):
+    """上游密钥池：各 key 的在途请求、限流次数、剩余配额与冷却状态（key 已脱敏）"""
+    require_admin(x_admin_token)
+    return {"keys": key_pool.stats()}
+
+
+@router.get("/jobs")
+def get_jobs_stats(x_admin_token: Optional[str] = Header(None)):
+    """后台任务：worker 数、已注册类型、各状态任务数"""
+    require_admin(x_admin_token)
+    return jobs.stats()
+
+
+@router.get("/loop")
+def get_loop_stats(stacks: bool = Query(True), x_admin_token: Optional[str] = Header(None)):
+    """事件循环延迟（最近一分钟）与最近的阻塞记录（LOOP_BLOCK_DEBUG=1 时带调用栈）"""
+    require_admin(x_admin_token)
+    return loop_monitor.stats(include_stacks=stacks)
+
+
+@router.delete("/loop/blocks")
+def clear_loop_blocks(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {"cleared": loop_monitor.clear()}
+
+
+@router.get("/conversations")
+async def get_conversations(conversation_id: Optional[str] = Query(None), kind: Optional[str] = Query(None),
+                            limit: int = Query(100, ge=1, le=1000), x_admin_token: Optional[str] = Header(None)):
+    """对话日志：条数统计 + 最近的记录（可按 session_id / scene_id、kind=session|roles|scene 过滤）"""
+    require_admin(x_admin_token)
+    await conversation_log.flush()
+    return {**await asyncio.to_thread(conversation_log.stats),
+            "turns": await asyncio.to_thread(conversation_log.turns, conversation_id, kind, limit)}
+
+
+@router.get("/knowledge")
+async def search_knowledge(role: Optional[str] = Query(None), q: Optional[str] = Query(None),
+                           k: int = Query(5, ge=1, le=50), x_admin_token: Optional[str] = Header(None)):
+    """已加载的角色知识索引；带 role + q 时返回检索结果（不过阈值，便于调参）"""
+    require_admin(x_admin_token)
+    if role and q:
+        hits = await knowledge_base.retrieve(role, q, k=k, min_score=-1.0)
+        return {"role": role, "query": q,
+                "hits": [{"score": round(h.score, 4), "source": h.passage.source, "text": h.passage.text} for h in hits]}
+    return knowledge_base.stats()
+
+
+@router.get("/usage")
+async def get_usage(dim: str = Query("role"), hours: float = Query(24, gt=0), limit: int = Query(50, ge=1, le=1000),
+                    session: Optional[str] = Query(None), x_admin_token: Optional[str] = Header(None)):
+    """用量汇总：按 dim（role / skill / session / task / model / key）排行 + 按 task 的调参数据；带 session 时返回该会话累计与预算"""
+    require_admin(x_admin_token)
+    if dim not in DIMENSIONS + ("all",):
+        raise HTTPException(400, {"error": "INVALID_DIM", "message": f"dim 只能是 {', '.join(DIMENSIONS)}"})
+    if session:
+        return {"session": session, **await usage_meter.session_usage(session)}
+    await usage_meter.flush()
+    return {"dim": dim, "hours": hours,
+            "rows": await asyncio.to_thread(usage_meter.summary, dim, hours, limit),
+            "tuning": await asyncio.to_thread(usage_meter.tuning, hours)}
+
+
+@router.get("/scheduler")
+def get_scheduler_stats(x_admin_token: Optional[str] = Header(None)):
+    """上游调用调度：各资源的名额配置、按优先级的占用与排队数"""
+    require_admin(x_admin_token)
+    return {name: scheduler.get_scheduler(name).stats() for name in ("llm", "tts")}
+
+
+@router.get("/profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """最近的采样结果（单请求剖析 + 滚动采集）"""
+    require_admin(x_admin_token)
+    return {"profiles": [p.to_dict() for p in profiler.profile_store.list()], "active": profiler.profile_store.active}
+
+
+@router.post("/profiles/capture")
+async def capture_profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=1, le=1000),
+    wait: bool = Query(False),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """对所有线程采样 seconds 秒；wait=true 时等采集结束再返回"""
+    require_admin(x_admin_token)
+    profile = profiler.capture(seconds, interval_ms)
+    if wait:
+        await asyncio.to_thread(profiler.wait_capture, profile)
+    return profile.to_dict()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed|summary)$"),
+    top: int = Query(20, ge=1, le=200),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    取回采样结果：
+    - speedscope：拖进 https://www.speedscope.app 查看
+    - collapsed：折叠栈文本，flamegraph.pl / inferno-flamegraph 生成火焰图
+    - summary：按函数汇总的 self / total 占比
+    """
+    require_admin(x_admin_token)
+    profile = profiler.profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(404, {"error": "PROFILE_NOT_FOUND", "message": f"采样结果不存在: {profile_id}"})
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "summary":
+        return profile.summary(top)
+    return profile.speedscope()
+
+
+@router.delete("/profiles")
+def clear_profiles(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {"cleared": profiler.profile_store.clear()}
@@ -1,28 +1,38 @@
 # app/api/routes_audio.py
 import os
-import uuid
-import pathlib
+import re
+import base64
+import hashlib
+import asyncio
 import requests
 import mimetypes
 from typing import Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..core.responses import TracedJSONResponse as JSONResponse
+from ..core import jobs
+from ..core.cancellation import upstream_timeout
+from ..core.keypool import key_pool, has_keys, last_key
+from ..core.scheduler import get_scheduler, priority
+from ..core.tracing import span
+from ..core.upstream import httpx
+from ..core.usage import BudgetExceeded, usage_meter
+from ..models.schemas import BulkTTSReq, TTSJoinReq
+from ..services import audio_cache, bulk_tts, mp3
+from ..services.tts import record_usage as record_tts_usage
+from ..services.asr_cache import transcript_cache, upload_refs, upload_url
+from ..services.storage import get_store
+from ..services.tts_text import normalize as normalize_tts_text
+from .routes_jobs import accepted
 
 router = APIRouter(prefix="/v1", tags=["audio"])
 
 # === 环境变量 ===
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openai.qiniu.com/v1").rstrip("/")
-OPENAI_API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
 
-# === 本地静态目录 ===
-STATIC_DIR = pathlib.Path("static")
-STATIC_DIR.mkdir(exist_ok=True)
-
-UPLOAD_DIR = STATIC_DIR / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 # === 工具函数 ===
 def _guess_audio_format(filename: Optional[str], content_type: Optional[str], fallback: str = "mp3") -> str:
     """智能猜测音频格式"""
@@ -66,20 +76,14 @@ def _check_public_url():
             }
         )
 
-def _call_qiniu_asr(audio_url: str, audio_format: str) -> dict:
+async def _call_qiniu_asr(audio_url: str, audio_format: str) -> dict:
     """调用七牛云ASR接口 - 按官方文档格式"""
-    if not OPENAI_API_KEY:
+    if not has_keys():
         raise HTTPException(500, {
             "error": "MISSING_API_KEY", 
             "message": "ASR服务未配置，缺少 OPENAI_API_KEY"
         })
     
-    url = f"{OPENAI_BASE_URL}/voice/asr"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    
     # 按照官方文档格式构建请求
     payload = {
         "model": "asr",
@@ -94,7 +98,11 @@ def _call_qiniu_asr(audio_url: str, audio_format: str) -> dict:
     print(f"[ASR] 请求数据: {payload}")
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=90)
+        with span("upstream.qiniu.asr", audio_format=audio_format) as s:
+            response = await key_pool.request("POST", "/voice/asr", OPENAI_BASE_URL,
+                                              headers={"Content-Type": "application/json"},
+                                              json=payload, timeout=upstream_timeout(90))
+            s.set_attribute("http.status_code", response.status_code)
         
         print(f"[ASR] 响应状态: {response.status_code}")
         print(f"[ASR] 响应头: {dict(response.headers)}")
@@ -111,9 +119,13 @@ def _call_qiniu_asr(audio_url: str, audio_format: str) -> dict:
         result = response.json()
         print(f"[ASR] 原始响应: {result}")
         
+        # 用量：按上游返回的音频时长（毫秒）计
+        data = result.get("data") if isinstance(result.get("data"), dict) else {}
+        usage_meter.record_asr(((data.get("audio_info") or {}).get("duration") or 0) / 1000, key=last_key())
+        
         return result
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         error_detail = {
             "error": "ASR_REQUEST_FAILED",
             "message": f"ASR请求失败: {str(e)}",
@@ -150,6 +162,7 @@ async def speech_to_text(
     语音识别接口
     - 上传音频文件
     - 自动识别音频格式
+    - 按内容哈希去重保存；相同音频 + 语言直接返回缓存的识别结果
     - 调用七牛云ASR
     - 返回识别文本
     """
@@ -185,21 +198,22 @@ async def speech_to_text(
             "supported_formats": list(supported_formats)
         })
     
-    # 保存文件到本地
+    # 按内容保存（同一段音频只写一次，对象名即内容哈希；S3 存储时放线程池）
     try:
-        filename = f"{uuid.uuid4().hex}.{audio_format}"
-        file_path = UPLOAD_DIR / filename
-        file_path.write_bytes(content)
+        audio_key, object_key, written = await upload_refs.save(content, audio_format)
         
         # 生成公网可访问的URL
-        audio_url = f"{PUBLIC_BASE_URL}/static/uploads/{filename}"
+        audio_url = upload_url(object_key)
         
     except Exception as e:
         raise HTTPException(500, {"error": "FILE_SAVE_FAILED", "message": f"保存文件失败: {str(e)}"})
     
-    # 调用ASR
+    # 调用ASR（同一音频 + 语言命中识别缓存时不访问上游）
+    failed = True
     try:
-        asr_result = _call_qiniu_asr(audio_url, audio_format)
+        asr_result, cached = await transcript_cache.get_or_compute(
+            audio_key, language, lambda: _call_qiniu_asr(audio_url, audio_format)
+        )
         recognized_text = _extract_text_from_asr_result(asr_result)
         
         # 构建响应
@@ -210,6 +224,7 @@ async def speech_to_text(
             "audio_format": audio_format,
             "file_size": len(content),
             "language": language,
+            "cached": cached,
             "qiniu_reqid": asr_result.get("reqid"),
             "raw_response": asr_result  # 调试用，生产环境可以移除
         }
@@ -219,30 +234,24 @@ async def speech_to_text(
             audio_info = asr_result["data"]["audio_info"]
             response_data["audio_duration_ms"] = audio_info.get("duration")
         
+        failed = False
         return JSONResponse(response_data)
         
-    except HTTPException:
-        # 清理失败的文件
-        try:
-            file_path.unlink(missing_ok=True)
-        except:
-            pass
+    except (HTTPException, asyncio.CancelledError):
         raise
         
     except Exception as e:
-        # 清理失败的文件
-        try:
-            file_path.unlink(missing_ok=True)
-        except:
-            pass
-        
         raise HTTPException(500, {
             "error": "ASR_PROCESSING_FAILED",
             "message": f"语音识别处理失败: {str(e)}"
         })
+    
+    finally:
+        # 失败 / 客户端已断开：只删本次新写入、且没有其他请求或进行中的识别还在用的文件（线程里删）
+        upload_refs.release(audio_key, object_key, written, failed)
 
 @router.post("/asr/url")
-def speech_to_text_by_url(
+async def speech_to_text_by_url(
     audio_url: str = Form(...),
     audio_format: str = Form("mp3"),
     language: str = Form("auto")
@@ -268,7 +277,7 @@ def speech_to_text_by_url(
     
     try:
         # 调用ASR
-        asr_result = _call_qiniu_asr(audio_url, audio_format)
+        asr_result = await _call_qiniu_asr(audio_url, audio_format)
         recognized_text = _extract_text_from_asr_result(asr_result)
         
         response_data = {
@@ -294,6 +303,79 @@ def speech_to_text_by_url(
             "message": f"语音识别处理失败: {str(e)}"
         })
 
+SUPPORTED_FORMATS = {"mp3", "wav", "m4a", "webm", "ogg", "flac"}
+
+@jobs.register("asr")
+async def _asr_job(payload: dict, ctx: jobs.JobContext) -> dict:
+    """后台识别：上传的音频按内容 key 走识别缓存，URL 直接调用上游"""
+    audio_url, audio_format = payload["audio_url"], payload["audio_format"]
+    language = payload.get("language", "auto")
+    ctx.progress(0, 1, "识别中")
+    if payload.get("audio_key"):
+        asr_result, cached = await transcript_cache.get_or_compute(
+            payload["audio_key"], language, lambda: _call_qiniu_asr(audio_url, audio_format)
+        )
+    else:
+        asr_result, cached = await _call_qiniu_asr(audio_url, audio_format), False
+    ctx.progress(1, 1, "完成")
+    result = {
+        "text": _extract_text_from_asr_result(asr_result),
+        "audio_url": audio_url,
+        "audio_format": audio_format,
+        "language": language,
+        "cached": cached,
+        "qiniu_reqid": asr_result.get("reqid"),
+        "raw_response": asr_result,
+    }
+    if "data" in asr_result and "audio_info" in asr_result["data"]:
+        result["audio_duration_ms"] = asr_result["data"]["audio_info"].get("duration")
+    return result
+
+@router.post("/asr/jobs")
+async def submit_asr_job(
+    file: Optional[UploadFile] = File(None),
+    audio_url: Optional[str] = Form(None),
+    audio_format: Optional[str] = Form(None),
+    language: str = Form("auto")
+):
+    """
+    提交后台识别任务（长音频不再占着连接等 90 秒）
+    - 上传 file，或给出公网 audio_url（二选一）
+    - 返回 202 + job_id，进度 / 结果见 /v1/jobs/{job_id}、/v1/jobs/{job_id}/events
+    """
+    if not has_keys():
+        raise HTTPException(500, {"error": "MISSING_API_KEY", "message": "ASR服务未配置，缺少 OPENAI_API_KEY"})
+    if file is not None:
+        _check_public_url()
+        content = await file.read()
+        if not content:
+            raise HTTPException(400, {"error": "EMPTY_FILE", "message": "上传的音频文件为空"})
+        if len(content) > 50 * 1024 * 1024:
+            raise HTTPException(400, {"error": "FILE_TOO_LARGE", "message": "音频文件大小不能超过50MB"})
+        audio_format = audio_format or _guess_audio_format(file.filename, file.content_type)
+    elif audio_url:
+        if not audio_url.startswith(("http://", "https://")):
+            raise HTTPException(400, {"error": "INVALID_URL", "message": "音频URL必须以http://或https://开头"})
+        audio_format = audio_format or _guess_audio_format(audio_url, None)
+    else:
+        raise HTTPException(400, {"error": "NO_AUDIO", "message": "需要上传 file 或提供 audio_url"})
+
+    if audio_format not in SUPPORTED_FORMATS:
+        raise HTTPException(400, {
+            "error": "UNSUPPORTED_FORMAT",
+            "message": f"不支持的音频格式: {audio_format}",
+            "supported_formats": list(SUPPORTED_FORMATS)
+        })
+
+    payload = {"audio_url": audio_url, "audio_format": audio_format, "language": language}
+    if file is not None:
+        audio_key, object_key, written = await upload_refs.save(content, audio_format)
+        # 任务稍后才执行（可能在别的进程）：这个对象不能再被同步识别的失败清理删掉
+        upload_refs.keep(audio_key)
+        upload_refs.release(audio_key, object_key, written, failed=False)
+        payload.update(audio_url=upload_url(object_key), audio_key=audio_key, file_size=len(content))
+    return accepted(await asyncio.to_thread(jobs.submit, "asr", payload))
+
 @router.get("/asr/test")
 def test_asr_setup():
     """
@@ -306,27 +388,31 @@ def test_asr_setup():
     issues = []
     
     # 检查API密钥
-    if not OPENAI_API_KEY:
+    if not has_keys():
         issues.append("缺少 OPENAI_API_KEY 环境变量")
-    elif len(OPENAI_API_KEY) < 10:
+    elif any(len(c.key) < 10 for c in key_pool.credentials):
         issues.append("OPENAI_API_KEY 格式可能不正确")
     
     # 检查公网URL
     if PUBLIC_BASE_URL.startswith(("http://localhost", "http://127.0.0.1")):
         issues.append("PUBLIC_BASE_URL 必须设置为公网地址，ASR无法访问localhost")
     
-    # 检查目录
-    if not UPLOAD_DIR.exists():
-        issues.append(f"上传目录不存在: {UPLOAD_DIR}")
-    elif not os.access(UPLOAD_DIR, os.W_OK):
-        issues.append(f"上传目录无写权限: {UPLOAD_DIR}")
+    # 检查存储
+    store = get_store()
+    storage_writable = False
+    try:
+        store.put("uploads/.probe", b"")
+        store.delete("uploads/.probe")
+        storage_writable = True
+    except Exception as e:
+        issues.append(f"音频存储不可写（{store.name}）: {e}")
     
     # 检查API连通性
     connectivity_ok = True
     try:
-        test_url = f"{OPENAI_BASE_URL}/voice/list"
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
-        response = requests.get(test_url, headers=headers, timeout=10)
+        with key_pool.lease(OPENAI_BASE_URL) as lease:
+            response = requests.get(lease.url("/voice/list"), headers=lease.headers(), timeout=10)
+            lease.observe(response)
         if response.status_code != 200:
             issues.append(f"API连通性测试失败: {response.status_code}")
             connectivity_ok = False
@@ -340,12 +426,12 @@ def test_asr_setup():
         "status": status,
         "issues": issues,
         "configuration": {
-            "api_key_configured": bool(OPENAI_API_KEY),
-            "api_key_length": len(OPENAI_API_KEY) if OPENAI_API_KEY else 0,
+            "api_key_configured": has_keys(),
+            "api_key_count": len(key_pool),
             "base_url": OPENAI_BASE_URL,
             "public_url": PUBLIC_BASE_URL,
-            "upload_dir": str(UPLOAD_DIR),
-            "upload_dir_writable": os.access(UPLOAD_DIR, os.W_OK) if UPLOAD_DIR.exists() else False,
+            "storage_backend": store.name,
+            "storage_writable": storage_writable,
             "api_connectivity": connectivity_ok
         },
         "quick_fixes": [
@@ -364,20 +450,17 @@ def cleanup_audio_files(max_age_hours: int = 24):
     errors = []
     current_time = time.time()
     
-    if not UPLOAD_DIR.exists():
-        return {"message": "上传目录不存在", "cleaned_files": 0}
-    
-    for file_path in UPLOAD_DIR.glob("*"):
-        if file_path.is_file():
-            try:
-                file_age_seconds = current_time - file_path.stat().st_mtime
-                file_age_hours = file_age_seconds / 3600
-                
-                if file_age_hours > max_age_hours:
-                    file_path.unlink()
-                    cleaned += 1
-            except Exception as e:
-                errors.append(f"{file_path.name}: {str(e)}")
+    store = get_store()
+    for info in list(store.list("uploads/")):
+        try:
+            file_age_seconds = current_time - info.modified
+            file_age_hours = file_age_seconds / 3600
+            
+            if file_age_hours > max_age_hours:
+                store.delete(info.key)
+                cleaned += 1
+        except Exception as e:
+            errors.append(f"{info.key}: {str(e)}")
     
     return {
         "cleaned_files": cleaned,
@@ -387,17 +470,11 @@ def cleanup_audio_files(max_age_hours: int = 24):
 
 
 
-def _call_qiniu_tts(text: str, voice_type: str, speed_ratio: float) -> bytes:
+async def _call_qiniu_tts(text: str, voice_type: str, speed_ratio: float) -> bytes:
     """调用七牛云TTS接口"""
-    if not OPENAI_API_KEY:
+    if not has_keys():
         raise HTTPException(500, {"error": "MISSING_API_KEY", "message": "TTS服务未配置"})
     
-    url = f"{OPENAI_BASE_URL}/voice/tts"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    
     payload = {
         "audio": {
             "voice_type": voice_type,
@@ -408,62 +485,189 @@ def _call_qiniu_tts(text: str, voice_type: str, speed_ratio: float) -> bytes:
             "text": text
         }
     }
+    try:
+        await usage_meter.check_budget("tts_chars")
+    except BudgetExceeded as e:
+        raise HTTPException(429, e.detail())
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        with span("upstream.qiniu.tts", voice_type=voice_type, chars=len(text)) as s:
+            async with get_scheduler("tts").slot() as level:
+                s.set_attribute("priority", level)
+                response = await key_pool.request("POST", "/voice/tts", OPENAI_BASE_URL,
+                                                  headers={"Content-Type": "application/json"},
+                                                  json=payload, timeout=upstream_timeout(60))
+            s.set_attribute("http.status_code", response.status_code)
         if response.status_code != 200:
             raise HTTPException(response.status_code, f"TTS错误: {response.text}")
         
         result = response.json()
         if "data" in result:
-            import base64
             audio_data = base64.b64decode(result["data"])
+            record_tts_usage(text, audio_data)
             return audio_data
         else:
             raise HTTPException(500, "TTS响应格式错误")
             
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(500, f"TTS请求失败: {str(e)}")
 
 @router.post("/tts")
 async def text_to_speech(
     text: str = Form(...),
     voice_type: str = Form("qiniu_zh_female_wwxkjx"),
-    speed_ratio: float = Form(1.0)
+    speed_ratio: float = Form(1.0),
+    normalize: bool = Form(True)
 ):
-    """文字转语音"""
+    """
+    文字转语音（同一文本+音色+语速命中音频缓存时不访问上游，预热过的问候语即点即播）
+    - normalize=true（默认）：先去掉 markdown / emoji，数字与单位转成读法；返回 tts_text 为实际合成的文本
+    """
+    original = text
+    if normalize:
+        text = normalize_tts_text(text)
+        if not text:
+            raise HTTPException(400, {"error": "EMPTY_TEXT", "message": "规范化后没有可合成的文本"})
     try:
-        audio_data = _call_qiniu_tts(text, voice_type, speed_ratio)
-        
-        # 保存音频文件
-        filename = f"{uuid.uuid4().hex}.mp3"
-        file_path = UPLOAD_DIR / filename
-        file_path.write_bytes(audio_data)
+        key = audio_cache.tts_key(text, voice_type, speed_ratio)
+        audio_url = audio_cache.lookup(key)
+        cached = audio_url is not None
         
-        audio_url = f"{PUBLIC_BASE_URL}/static/uploads/{filename}"
+        if not cached:
+            audio_data = await _call_qiniu_tts(text, voice_type, speed_ratio)
+            # 保存音频文件（按内容寻址；客户端已断开时任务在上面被取消，不会落盘）
+            audio_url = await asyncio.to_thread(audio_cache.store, key, audio_data)
         
         return JSONResponse({
             "success": True,
             "audio_url": audio_url,
-            "text": text,
+            "text": original,
+            "tts_text": text,
             "voice_type": voice_type,
-            "speed_ratio": speed_ratio
+            "speed_ratio": speed_ratio,
+            "cached": cached
         })
         
     except Exception as e:
         raise HTTPException(500, f"TTS处理失败: {str(e)}")
 
+@router.post("/tts/bulk")
+async def text_to_speech_bulk(req: BulkTTSReq):
+    """
+    批量合成（每条 text + role/voice + speed）：相同内容只合成一次，已缓存的直接返回，
+    并发按 key 数限流；返回与输入顺序一致的 manifest。
+    同步接口受请求截止时间限制，单次最多 BULK_TTS_MAX_ITEMS 条；更大的批次用 POST /v1/tts/bulk/jobs
+    或命令行 python -m app.services.bulk_tts
+    """
+    if not has_keys():
+        raise HTTPException(500, {"error": "MISSING_API_KEY", "message": "TTS服务未配置"})
+    if len(req.items) > bulk_tts.BULK_TTS_MAX_ITEMS:
+        raise HTTPException(413, {"error": "TOO_MANY_ITEMS",
+                                  "message": f"单次最多 {bulk_tts.BULK_TTS_MAX_ITEMS} 条，"
+                                             "更多请用 POST /v1/tts/bulk/jobs 提交后台任务",
+                                  "jobs_url": "/v1/tts/bulk/jobs"})
+    try:
+        items = [bulk_tts.parse_item(raw, str(i)) for i, raw in enumerate(req.items, 1)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, {"error": "INVALID_ITEM", "message": str(e)})
+    concurrency = min(req.concurrency or bulk_tts.default_concurrency(), bulk_tts.default_concurrency())
+    with priority("batch"):
+        return JSONResponse(await bulk_tts.render_bulk(items, concurrency))
+
+@router.post("/tts/bulk/jobs")
+def submit_bulk_tts_job(req: BulkTTSReq):
+    """批量合成的后台版本：返回 202 + job_id，结果（manifest）见 /v1/jobs/{job_id}/result"""
+    if not has_keys():
+        raise HTTPException(500, {"error": "MISSING_API_KEY", "message": "TTS服务未配置"})
+    try:
+        for i, raw in enumerate(req.items, 1):
+            bulk_tts.parse_item(raw, str(i))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, {"error": "INVALID_ITEM", "message": str(e)})
+    return accepted(jobs.submit("tts_bulk", {"items": req.items, "concurrency": req.concurrency}))
+
+_AUDIO_KEY = re.compile(r"[0-9a-f]{32}")
+_SEGMENT_KEY = re.compile(rf"({_AUDIO_KEY.pattern})\.mp3")
+MAX_JOIN_SEGMENTS = 200
+
+def _segment_keys(keys, audio_urls) -> list:
+    # key 会拼进对象路径 audio/<key>.mp3，只接受 tts_key 的格式（防 ../ 读到 audio/ 之外）
+    for key in keys:
+        if not _AUDIO_KEY.fullmatch(key):
+            raise HTTPException(400, {"error": "INVALID_AUDIO_KEY", "message": f"不是有效的音频 key: {key[:64]}"})
+    out = list(keys)
+    for url in audio_urls:
+        m = _SEGMENT_KEY.search(url)
+        if not m:
+            raise HTTPException(400, {"error": "UNKNOWN_AUDIO_URL", "message": f"不是本服务生成的音频: {url}"})
+        out.append(m.group(1))
+    if not out:
+        raise HTTPException(400, {"error": "NO_SEGMENTS", "message": "需要 keys 或 audio_urls"})
+    if len(out) > MAX_JOIN_SEGMENTS:
+        raise HTTPException(400, {"error": "TOO_MANY_SEGMENTS", "message": f"最多拼接 {MAX_JOIN_SEGMENTS} 段"})
+    return out
+
+async def _plan_join(keys: list) -> mp3.JoinPlan:
+    segments = []
+    for key in keys:
+        data = await asyncio.to_thread(audio_cache.read, key)
+        if data is None:
+            raise HTTPException(404, {"error": "SEGMENT_NOT_FOUND", "message": f"音频不存在: {key}"})
+        segments.append(data)
+    try:
+        return await asyncio.to_thread(mp3.plan_join, segments)
+    except mp3.Mp3Error as e:
+        raise HTTPException(422, {"error": "MP3_JOIN_FAILED", "message": str(e)})
+
+def _join_key(keys: list) -> str:
+    return hashlib.sha256(("join|" + "|".join(keys)).encode("ascii")).hexdigest()[:32]
+
+@router.post("/tts/join")
+async def join_tts_segments(req: TTSJoinReq):
+    """
+    把分句合成的多段音频按帧拼成一个 mp3（不解码、不重编码，带正确时长的 Xing 头），写入音频缓存
+    同样的分段组合只拼一次
+    """
+    keys = _segment_keys(req.keys, req.audio_urls)
+    join_key = _join_key(keys)
+    audio_url = audio_cache.lookup(join_key)
+    if audio_url:
+        return JSONResponse({"success": True, "audio_url": audio_url, "segments": len(keys), "cached": True})
+    plan = await _plan_join(keys)
+    data = await asyncio.to_thread(mp3.join_bytes, plan.segments)
+    audio_url = await asyncio.to_thread(audio_cache.store, join_key, data)
+    return JSONResponse({
+        "success": True,
+        "audio_url": audio_url,
+        "segments": len(keys),
+        "frames": plan.frames,
+        "duration_ms": round(plan.duration * 1000),
+        "bytes": plan.size,
+        "cached": False
+    })
+
+@router.get("/tts/join")
+async def stream_joined_tts(keys: str = Query(..., description="逗号分隔的音频缓存 key")):
+    """直接流式返回拼接结果（逐段输出 memoryview，不落盘）；分段内容寻址，响应可永久缓存"""
+    key_list = _segment_keys([k.strip() for k in keys.split(",") if k.strip()], [])
+    plan = await _plan_join(key_list)
+    return StreamingResponse(plan.chunks(), media_type="audio/mpeg", headers={
+        "Content-Length": str(plan.size),
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{_join_key(key_list)}"',
+        "X-Audio-Duration-Ms": str(round(plan.duration * 1000)),
+    })
+
 @router.get("/voices")
 def get_available_voices():
     """获取可用TTS音色列表"""
-    if not OPENAI_API_KEY:
+    if not has_keys():
         raise HTTPException(500, "未配置API密钥")
     
-    url = f"{OPENAI_BASE_URL}/voice/list"
-    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
-    
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        with span("upstream.qiniu.voice_list"), key_pool.lease(OPENAI_BASE_URL) as lease:
+            response = requests.get(lease.url("/voice/list"), headers=lease.headers(), timeout=30)
+            lease.observe(response)
         if response.status_code != 200:
             raise HTTPException(response.status_code, f"获取音色失败: {response.text}")
         return response.json()
@@ -1,7 +1,9 @@
 # backend/app/routes/chat.py
 from fastapi import APIRouter, HTTPException
 from ..models.schemas import StartSessionReq, StartSessionResp, ChatReq, ChatResp
-from ..core.session_store import create_session, get_session
+from ..core.conversation_log import conversation_log
+from ..core.session_store import Session, create_session, get_session
+from ..core.usage import BudgetExceeded, scope as usage_scope, usage_meter
 from ..services.role import build_role_card
 from ..services import llm
 from ..services.tts import synthesize  
@@ -9,11 +11,12 @@ from ..services.tts import synthesize
 router = APIRouter(prefix="/v1")
 
 @router.post("/session/start", response_model=StartSessionResp)
-def start_session(req: StartSessionReq):
+async def start_session(req: StartSessionReq):
     rn = (req.role_name or "").strip()
     if not rn:
         raise HTTPException(400, "role_name 不能为空")
-    role_card = build_role_card(rn)
+    with usage_scope(role=rn):
+        role_card = await build_role_card(rn)
     sid = create_session(rn, role_card, req.memory_limit)
     return StartSessionResp(session_id=sid, role_name=rn)
 
@@ -22,26 +25,33 @@ async def chat(req: ChatReq):
     sess = get_session(req.session_id)
     if not sess:
         raise HTTPException(404, "session 不存在")
+    with usage_scope(session=req.session_id, role=sess.role_name, skill=req.skill):
+        # 会话用量超出预算时直接拒绝（llm.chat 出错会落回占位回答）
+        try:
+            await usage_meter.check_budget("tokens")
+        except BudgetExceeded as e:
+            raise HTTPException(429, e.detail())
+        return await _chat_turn(req, sess)
 
+async def _chat_turn(req: ChatReq, sess: Session) -> ChatResp:
     # 1) 先让 LLM 生成文本
     reply = await llm.chat(
-        sess["role_name"],
-        sess["role_card"],
-        sess["history"],
+        sess.role_name,
+        sess.role_card,
+        sess.history.recent(8),
         req.text,
         req.skill,
     )
 
-    # 滚动对话历史
-    sess["history"].append({"user": req.text, "assistant": reply})
-    if len(sess["history"]) > sess["limit"]:
-        del sess["history"][0]
+    # 滚动对话历史（超出 memory_limit 自动丢弃最早一轮）
+    sess.history.append(req.text, reply)
+    conversation_log.append("session", req.session_id, sess.role_name, req.text, reply, req.skill)
 
     # 2) 语音合成（根据角色名自动挑音色）
     # 如果你的请求体/会话里有手动指定的音色，可作为 voice_override 传入
-    audio_url, tts_b64 = synthesize(
+    audio_url, tts_b64 = await synthesize(
         reply,
-        role_name=sess["role_name"],
+        role_name=sess.role_name,
         reply_text=reply,
         # voice_override=sess.get("voice_type")  # 可选
     )
@@ -49,7 +59,7 @@ async def chat(req: ChatReq):
     # 3) 返回
     return ChatResp(
         session_id=req.session_id,
-        role_name=sess["role_name"],
+        role_name=sess.role_name,
         reply_text=reply,
         audio_url=audio_url,   # ← 新增：可直接播放
         tts_b64=tts_b64,       # 备用
@@ -1,17 +1,38 @@
+from typing import Callable, Optional
+
 from fastapi import APIRouter
+from ..core import jobs
+from ..core.scheduler import priority
 from ..models.schemas import EvalReq, EvalResp
 from ..services.role import build_role_card
 from ..services.llm import chat as llm_chat
+from .routes_jobs import accepted
 
 router = APIRouter(prefix="/v1")
 
+async def run_eval(req: EvalReq, progress: Optional[Callable[[int, int], None]] = None) -> EvalResp:
+    # 评测流量让位于在线对话
+    with priority("batch"):
+        role_card = await build_role_card(req.role_name)
+        passed, details = 0, []
+        for i, q in enumerate(req.cases, 1):
+            reply = await llm_chat(req.role_name, role_card, [], q, "knowledge")
+            ok = all(k in reply for k in req.keywords)
+            passed += int(ok)
+            details.append({"q": q, "reply": reply, "ok": ok})
+            if progress is not None:
+                progress(i, len(req.cases))
+    return EvalResp(passed=passed, total=len(req.cases), details=details)
+
 @router.post("/eval", response_model=EvalResp)
 async def eval_role(req: EvalReq):
-    role_card = build_role_card(req.role_name)
-    passed, details = 0, []
-    for q in req.cases:
-        reply = await llm_chat(req.role_name, role_card, [], q, "knowledge")
-        ok = all(k in reply for k in req.keywords)
-        passed += int(ok)
-        details.append({"q": q, "reply": reply, "ok": ok})
-    return EvalResp(passed=passed, total=len(req.cases), details=details)
+    return await run_eval(req)
+
+@jobs.register("eval")
+async def _eval_job(payload: dict, ctx: jobs.JobContext) -> dict:
+    return (await run_eval(EvalReq(**payload), ctx.progress)).model_dump()
+
+@router.post("/eval/jobs")
+def submit_eval_job(req: EvalReq):
+    """大批量评测放到后台：返回 202 + job_id"""
+    return accepted(jobs.submit("eval", req.model_dump()))
@@ -0,0 +1,96 @@
+# app/api/routes_jobs.py
+"""
+后台任务查询（提交入口在各业务路由：/v1/asr/jobs、/v1/tts/bulk/jobs、/v1/eval/jobs）
+
+  GET    /v1/jobs                  最近的任务（可按 kind / status 过滤）
+  GET    /v1/jobs/{id}             状态 + 进度
+  GET    /v1/jobs/{id}/result      结果（未完成 409，失败 / 取消返回错误）
+  GET    /v1/jobs/{id}/events      SSE：event: progress（状态 / 进度变化）… event: done（含结果）
+  DELETE /v1/jobs/{id}             取消
+"""
+import json
+import asyncio
+from typing import Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..core import jobs
+from ..core.responses import TracedJSONResponse as JSONResponse
+
+router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
+
+
+def accepted(job: jobs.Job) -> JSONResponse:
+    """提交接口统一的 202 响应"""
+    body = job.to_dict()
+    body.update(status_url=f"/v1/jobs/{job.id}", events_url=f"/v1/jobs/{job.id}/events",
+                result_url=f"/v1/jobs/{job.id}/result")
+    return JSONResponse(body, status_code=202)
+
+
+def _get_job(job_id: str) -> jobs.Job:
+    job = jobs.get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(404, {"error": "JOB_NOT_FOUND", "message": f"任务不存在: {job_id}"})
+    return job
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("")
+def list_jobs(kind: Optional[str] = None, status: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    return {"jobs": [j.to_dict() for j in jobs.get_job_store().list(kind, status, limit)]}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: str):
+    job = _get_job(job_id)
+    if not job.finished:
+        raise HTTPException(409, {"error": "JOB_NOT_FINISHED", "status": job.status,
+                                  "message": "任务尚未完成"})
+    if job.status != "succeeded":
+        raise HTTPException(422, {"error": "JOB_" + job.status.upper(), "message": job.error or job.status})
+    return job.to_dict(include_result=True)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    进度流：连接后先推送一次当前状态，之后状态 / 进度变化时推送；结束时 event: done 并断开
+    （长时间无变化每 15 秒发一次注释行保活，避免代理断开）
+    """
+    job = await asyncio.to_thread(_get_job, job_id)
+
+    async def events():
+        current = job
+        last_seen = -1.0
+        while True:
+            if current.updated_at > last_seen:
+                last_seen = current.updated_at
+                if current.finished:
+                    yield _sse("done", current.to_dict(include_result=True))
+                    return
+                yield _sse("progress", current.to_dict())
+            else:
+                yield ": keep-alive\n\n"
+            current = await jobs.wait_for_update(job_id, last_seen)
+            if current is None:
+                yield _sse("error", {"message": "任务已被删除"})
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.delete("/{job_id}")
+def cancel_job(job_id: str):
+    _get_job(job_id)
+    return jobs.get_job_store().cancel(job_id).to_dict()
@@ -0,0 +1,83 @@
+# app/api/routes_media.py
+"""
+对象存储中的音频（/media/<key>）
+
+只提供存储自己的前缀（audio/、uploads/），LocalStore 根目录下的其他文件一律 404
+  - 内容寻址的 key（<前缀><32 位哈希>.<扩展名>）内容永不变化：
+    Cache-Control: public, max-age=31536000, immutable —— 浏览器 / CDN 不再回源校验
+  - 其他 key（如旧文件）：Cache-Control: no-cache，靠 ETag 重新校验
+  - If-None-Match 与 ETag 相同时返回 304
+  - Range: bytes=a-b 返回 206（<audio> 拖动进度、Safari 播放都依赖它），不可满足返回 416
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import Response
+
+from ..services.storage import OBJECT_PREFIXES, get_store, is_content_key, parse_range
+
+router = APIRouter(tags=["media"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+
+@router.api_route("/media/{key:path}", methods=["GET", "HEAD"])
+def get_media(
+    key: str,
+    request: Request,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+):
+    """同步处理（在线程池中执行），S3 后端的阻塞读取不占事件循环"""
+    store = get_store()
+    info = None
+    if key.startswith(OBJECT_PREFIXES):
+        try:
+            info = store.head(key)
+        except ValueError:
+            pass
+    if info is None:
+        raise HTTPException(404, {"error": "MEDIA_NOT_FOUND", "message": f"对象不存在: {key}"})
+
+    etag = f'"{info.etag}"'
+    headers = {"Cache-Control": IMMUTABLE if is_content_key(key) else REVALIDATE, "ETag": etag,
+               "Accept-Ranges": "bytes"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range 与当前 ETag 不符：忽略 Range，返回整个对象
+    if if_range and if_range.strip() != etag:
+        range = None
+    try:
+        span_ = parse_range(range, info.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{info.size}"})
+
+    if request.method == "HEAD":
+        length = info.size if span_ is None else span_[1] - span_[0] + 1
+        if span_ is not None:
+            headers["Content-Range"] = f"bytes {span_[0]}-{span_[1]}/{info.size}"
+        return Response(status_code=200 if span_ is None else 206, media_type=info.content_type,
+                        headers={**headers, "Content-Length": str(length)})
+
+    if span_ is None:
+        body = store.get(key)
+        status = 200
+    else:
+        start, end = span_
+        body = store.get_range(key, start, end)
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    if body is None:
+        raise HTTPException(404, {"error": "MEDIA_NOT_FOUND", "message": f"对象不存在: {key}"})
+    return Response(content=body, status_code=status, media_type=info.content_type, headers=headers)
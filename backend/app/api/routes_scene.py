@@ -0,0 +1,129 @@
+# app/api/routes_scene.py
+"""
+多角色场景（一条消息同时发给多个角色，见 services/scene.py）
+
+  POST /v1/scenes                       创建场景：{"characters": ["苏格拉底", "牛顿", "福尔摩斯"]}
+  GET  /v1/scenes/{id}                  场景信息与共享发言记录
+  POST /v1/scenes/{id}/chat             一轮对话，全部角色完成后返回
+  POST /v1/scenes/{id}/chat/stream      一轮对话（SSE），各角色的 delta / sentence / audio 交错推送
+"""
+import json
+from contextlib import aclosing
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from ..core.responses import TracedJSONResponse as JSONResponse
+from ..core.session_store import Scene, create_scene, get_scene
+from ..core.usage import BudgetExceeded, usage_meter
+from ..models.schemas import SceneChatReq, SceneStartReq
+from ..presets.registry import RoleRecord, get_registry
+from ..services import scene as scenes
+
+router = APIRouter(prefix="/v1/scenes", tags=["scenes"])
+
+
+def _roles(names: List[str]) -> List[RoleRecord]:
+    roles: Dict[str, RoleRecord] = {}
+    registry = get_registry()
+    for name in names:
+        role = registry.get(name)
+        if role is None or not role.listed:
+            raise HTTPException(404, {"error": "ROLE_NOT_FOUND", "message": f"角色'{name}'不存在"})
+        roles.setdefault(role.name, role)
+    return list(roles.values())
+
+
+def _scene(scene_id: str) -> Scene:
+    scene = get_scene(scene_id)
+    if scene is None:
+        raise HTTPException(404, {"error": "SCENE_NOT_FOUND", "message": "场景不存在"})
+    return scene
+
+
+async def _speakers(scene_id: str, scene: Scene, req: SceneChatReq) -> List[RoleRecord]:
+    """本轮发言的角色（按场景里的顺序）"""
+    if not req.message.strip():
+        raise HTTPException(400, {"error": "EMPTY_MESSAGE", "message": "message 不能为空"})
+    try:
+        await usage_meter.check_budget("tokens", {"session": scene_id})
+    except BudgetExceeded as e:
+        raise HTTPException(429, e.detail())
+    roles = _roles(list(scene.characters))
+    if req.characters:
+        wanted = {r.name for r in _roles(req.characters)}
+        if not wanted <= set(scene.characters):
+            raise HTTPException(400, {"error": "NOT_IN_SCENE", "message": "只能选择场景里的角色"})
+        roles = [r for r in roles if r.name in wanted]
+    return roles
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("")
+def start_scene(req: SceneStartReq):
+    roles = _roles(req.characters)
+    if not roles:
+        raise HTTPException(400, {"error": "NO_CHARACTERS", "message": "至少选择一个角色"})
+    if len(roles) > scenes.SCENE_MAX_CHARACTERS:
+        raise HTTPException(400, {"error": "TOO_MANY_CHARACTERS",
+                                  "message": f"一个场景最多 {scenes.SCENE_MAX_CHARACTERS} 个角色"})
+    scene_id = create_scene(tuple(r.name for r in roles), req.memory_limit)
+    return JSONResponse({
+        "scene_id": scene_id,
+        "characters": [{"name": r.name, "avatar": r.avatar, "voice_type": r.voice} for r in roles],
+    })
+
+
+@router.get("/{scene_id}")
+def get_scene_info(scene_id: str):
+    scene = _scene(scene_id)
+    return JSONResponse({
+        "scene_id": scene_id,
+        "characters": list(scene.characters),
+        "turns": scene.turns,
+        "history": [{"speaker": s, "text": t} for s, t in scene.history],
+    })
+
+
+@router.post("/{scene_id}/chat")
+async def scene_chat(scene_id: str, req: SceneChatReq):
+    """一轮对话：返回各角色的完整回复、逐句文本与语音地址，以及失败的角色"""
+    scene = _scene(scene_id)
+    roles = await _speakers(scene_id, scene, req)
+    errors, done = [], None
+    # 让 run_turn 自己跑完（done 之后正常结束，span 不记为出错）；中途出错时 aclosing 保证它在返回前被关闭
+    async with aclosing(scenes.run_turn(scene_id, scene, roles, req.message, speak=req.tts)) as turn:
+        async for event, data in turn:
+            if event == "error":
+                errors.append(data)
+            elif event == "done":
+                done = data
+    return JSONResponse({**done, "errors": errors})
+
+
+@router.post("/{scene_id}/chat/stream")
+async def scene_chat_stream(scene_id: str, req: SceneChatReq):
+    """
+    一轮对话（SSE），事件都带 character 字段，按就绪顺序交错：
+    - event: delta     data: {"character", "text"}
+    - event: sentence  data: {"character", "index", "text"}
+    - event: audio     data: {"character", "index", "audio_url", "cached"}
+    - event: reply     data: {"character", "text", "sentences", "audio_urls", "elapsed_ms"}
+    - event: error     data: {"character", "status_code", "message"}
+    - event: done      data: {"scene_id", "turn", "replies", "elapsed_ms"}
+    """
+    scene = _scene(scene_id)
+    roles = await _speakers(scene_id, scene, req)
+
+    async def events():
+        # 客户端断开时 events() 被关闭，随之关闭 run_turn
+        async with aclosing(scenes.run_turn(scene_id, scene, roles, req.message, speak=req.tts)) as turn:
+            async for event, data in turn:
+                yield _sse(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,56 @@
+# app/api/routes_static.py
+"""
+测试页面与静态资源（内容来自 services/static_assets：内存中预压缩）
+
+  GET /roleplay、/asr-test           入口页：ETag + no-cache（每次协商，未变化返回 304）
+  GET /assets/<名字>.<哈希>.<后缀>     带哈希的资源：一年 immutable
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+
+from ..core.compression import negotiate
+from ..services.static_assets import Asset, registry
+
+router = APIRouter(tags=["static"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _serve(asset: Asset, cache_control: str, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if if_none_match and asset.etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate(accept_encoding, asset.encodings) if asset.encodings else None
+    body = asset.bodies[encoding or "identity"]
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, headers=headers, media_type=asset.content_type)
+
+
+def _page(name: str, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+    asset = registry.get(name)
+    if asset is None:
+        raise HTTPException(404, {"error": "PAGE_NOT_FOUND", "message": f"页面不存在: {name}"})
+    return _serve(asset, "no-cache", accept_encoding, if_none_match)
+
+
+# 可选：两个简单的静态测试页（没有文件也不影响后端接口）
+@router.get("/asr-test")
+def asr_test_page(accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    return _page("asr-test.html", accept_encoding, if_none_match)
+
+
+@router.get("/roleplay")
+def roleplay_page(accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    return _page("roleplay.html", accept_encoding, if_none_match)
+
+
+@router.api_route("/assets/{filename}", methods=["GET", "HEAD"])
+def hashed_asset(filename: str, accept_encoding: Optional[str] = Header(None),
+                 if_none_match: Optional[str] = Header(None)):
+    asset = registry.by_hashed_name(filename)
+    if asset is None:
+        raise HTTPException(404, {"error": "ASSET_NOT_FOUND", "message": f"资源不存在或已更新: {filename}"})
+    return _serve(asset, IMMUTABLE, accept_encoding, if_none_match)
@@ -0,0 +1,177 @@
+# backend/app/core/cancellation.py
+"""
+请求级截止时间 + 客户端断开检测
+
+  - RequestScopeMiddleware：每个请求在独立任务中执行；
+      客户端断开（关页面 / 打断）→ 取消处理任务，正在等待的 LLM / TTS / ASR 上游请求随之中止；
+      超过截止时间 → 取消任务，尚未开始响应时返回 504
+  - upstream_timeout(default)：上游超时取 min(默认值, 本请求剩余时间)，不会等得比请求更久
+  - 截止时间：请求头 X-Request-Timeout（秒，限制在 (0, REQUEST_TIMEOUT_MAX]，非法值忽略）或默认 REQUEST_TIMEOUT
+  - 指标：requests_cancelled_total{reason=disconnect|deadline, path}（path 为路由模板，如 /v1/scenes/{scene_id}）
+
+环境变量：
+  REQUEST_TIMEOUT=120        # 0 关闭截止时间（仍做断开检测）
+  REQUEST_TIMEOUT_MAX=300
+"""
+from __future__ import annotations
+import os
+import json
+import math
+import asyncio
+import contextvars
+from typing import Optional
+
+from .metrics import counter
+
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+REQUEST_TIMEOUT_MAX = float(os.getenv("REQUEST_TIMEOUT_MAX", "300"))
+
+REQUESTS_CANCELLED = counter("requests_cancelled_total", "因客户端断开或超时被取消的请求数", ("reason", "path"))
+
+# 事件循环时间（loop.time()）下的截止时刻；None 表示不限
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """本请求剩余秒数；不在请求内或未设置截止时间时为 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def upstream_timeout(default: float) -> float:
+    """上游调用的超时：不超过本请求剩余时间"""
+    left = remaining()
+    if left is None:
+        return default
+    return max(0.01, min(default, left))
+
+
+def _request_timeout(scope) -> Optional[float]:
+    timeout = REQUEST_TIMEOUT
+    for name, value in scope.get("headers") or []:
+        if name == b"x-request-timeout":
+            try:
+                requested = float(value.decode("latin-1"))
+            except ValueError:
+                break
+            # 客户端只能缩短截止时间，不能关掉它（0 / 负数 / nan / inf 一律忽略）
+            if math.isfinite(requested) and requested > 0:
+                timeout = min(requested, REQUEST_TIMEOUT_MAX) if REQUEST_TIMEOUT_MAX > 0 else requested
+            break
+    return timeout if timeout > 0 else None
+
+
+def _route_label(scope) -> str:
+    """指标用的路径：匹配到的路由模板（不含 id，基数有限）；没匹配到路由时为 unmatched"""
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def _has_body(scope) -> bool:
+    for name, value in scope.get("headers") or []:
+        if name == b"transfer-encoding" or (name == b"content-length" and value.strip() not in (b"", b"0")):
+            return True
+    return False
+
+
+class RequestScopeMiddleware:
+    """纯 ASGI 中间件：断开即取消、超时即取消"""
+
+    def __init__(self, app, exclude_prefixes=("/static",)):
+        self.app = app
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path", "").startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        timeout = _request_timeout(scope)
+        deadline = loop.time() + timeout if timeout else None
+        disconnected = asyncio.Event()
+        body_done = asyncio.Event()
+        state = {"started": False, "complete": False}
+        first = None
+
+        if not _has_body(scope):
+            # 无请求体：先把空 body 消息读掉，之后 receive() 只会在客户端断开时返回
+            first = await receive()
+            if first["type"] == "http.disconnect":
+                return
+            body_done.set()
+
+        async def app_receive():
+            nonlocal first
+            if first is not None:
+                msg, first = first, None
+                return msg
+            if body_done.is_set():
+                # 请求体已读完，只有 watch() 读底层 receive，这里等断开信号
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            msg = await receive()
+            if msg["type"] == "http.disconnect":
+                disconnected.set()
+            elif not msg.get("more_body", False):
+                body_done.set()
+            return msg
+
+        async def app_send(message):
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                state["complete"] = True
+            if not disconnected.is_set():
+                await send(message)
+
+        async def watch():
+            await body_done.wait()
+            while True:
+                msg = await receive()
+                if msg["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        token = _deadline.set(deadline)
+        task = asyncio.create_task(self.app(scope, app_receive, app_send))
+        watcher = asyncio.create_task(watch())
+        _deadline.reset(token)
+
+        reason = None
+        try:
+            while True:
+                waiting = {task} if watcher.done() else {task, watcher}
+                wait_for = None if deadline is None else max(0.0, deadline - loop.time())
+                done, _ = await asyncio.wait(waiting, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if task in done:
+                    task.result()   # 透传处理函数的异常
+                    return
+                if not done:
+                    reason = "deadline"
+                    break
+                if disconnected.is_set() and not state["complete"]:
+                    reason = "disconnect"
+                    break
+        except BaseException:
+            task.cancel()
+            raise
+        finally:
+            if not watcher.done():
+                watcher.cancel()
+
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        REQUESTS_CANCELLED.inc(reason=reason, path=_route_label(scope))
+
+        if reason == "deadline" and not state["started"] and not disconnected.is_set():
+            body = json.dumps({"detail": {"error": "REQUEST_TIMEOUT", "message": f"请求处理超过 {timeout:g} 秒"}},
+                              ensure_ascii=False).encode("utf-8")
+            await send({"type": "http.response.start", "status": 504,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
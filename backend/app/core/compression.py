@@ -0,0 +1,157 @@
+# backend/app/core/compression.py
+"""
+响应压缩（纯 ASGI 中间件）：按 Accept-Encoding 协商 br / gzip，只压缩
+
+  - 可压缩的类型（JSON / HTML / 文本 / JS / CSS / SVG），且响应体 >= COMPRESS_MIN_BYTES
+  - 一次性发送的响应体；流式响应（SSE、音频流）与已带 Content-Encoding 的响应（预压缩静态资源）原样透传
+
+brotli 是可选依赖（pip install brotli），没装时只协商 gzip。动态响应用较快的压缩级别，
+静态资源在构建 / 启动时用最高级别预压缩（见 services/static_assets.py）。
+大于 COMPRESS_THREAD_BYTES 的响应体放到线程里压缩（内联 base64 音频几十 KB 要压几毫秒），不占事件循环。
+
+环境变量：
+  COMPRESS=1
+  COMPRESS_MIN_BYTES=1024
+  COMPRESS_GZIP_LEVEL=5
+  COMPRESS_BROTLI_QUALITY=4
+  COMPRESS_THREAD_BYTES=32768
+"""
+from __future__ import annotations
+import os
+import gzip
+import asyncio
+from typing import Dict, Optional, Sequence
+
+from .metrics import counter
+
+try:
+    import brotli
+except Exception:
+    brotli = None  # 可选依赖
+
+COMPRESS = os.getenv("COMPRESS", "1").strip().lower() not in ("0", "false", "off", "no")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESS_THREAD_BYTES = int(os.getenv("COMPRESS_THREAD_BYTES", "32768"))
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/html", "text/plain", "text/css", "text/javascript",
+    "application/javascript", "image/svg+xml",
+)
+
+COMPRESSION_BYTES = counter("compression_bytes_total", "压缩前 / 后的响应字节数", ("encoding", "stage"))
+
+
+def supported_encodings() -> Sequence[str]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str], available: Sequence[str] = ()) -> Optional[str]:
+    """按 q 值在 available（默认 br / gzip）里选一个编码；同 q 值按 available 的顺序；都不接受返回 None"""
+    if not accept_encoding:
+        return None
+    available = available or supported_encodings()
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for enc in available:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY if level is None else level)
+    # mtime=0：相同内容得到相同字节，便于 ETag / 缓存
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for name, value in scope.get("headers") or []:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None        # 暂存的 http.response.start
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers") or []
+                content_type = ""
+                for name, value in headers:
+                    if name == b"content-encoding":
+                        passthrough = True
+                    elif name == b"content-type":
+                        content_type = value.decode("latin-1")
+                if passthrough or not _compressible(content_type):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # 流式或太小：不压缩
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= COMPRESS_THREAD_BYTES:
+                out = await asyncio.to_thread(compress, body, encoding)
+            else:
+                out = compress(body, encoding)
+            COMPRESSION_BYTES.inc(len(body), encoding=encoding, stage="in")
+            COMPRESSION_BYTES.inc(len(out), encoding=encoding, stage="out")
+            headers = [(k, v) for k, v in start.get("headers") or [] if k not in (b"content-length", b"vary")]
+            vary = [v for k, v in start.get("headers") or [] if k == b"vary"]
+            vary_value = b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(out)).encode("latin-1")),
+                (b"vary", vary_value),
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": out})
+
+        await self.app(scope, receive, send_wrapper)
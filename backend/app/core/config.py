@@ -23,6 +23,29 @@ OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
 # 是否启用 OpenAI 客户端（有 key 且安装了 SDK）
 USE_OPENAI: bool = bool(OPENAI_API_KEY) and OpenAI is not None
 
+# LLM 提供方：openai（OpenAI 兼容 HTTP 接口，七牛网关 / deepseek 均可）或 echo（本地回显，测试用）
+LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "openai").strip().lower()
+
+# 按任务路由模型：角色卡用便宜快速的模型，对话用质量更高的模型
+#   chat      -> /v1/chat、/v1/eval
+#   roleplay  -> /v1/roles/chat
+#   role_card -> 生成自定义人物的扮演卡
+LLM_MODEL_ROUTES: dict = {
+    "chat": os.getenv("LLM_MODEL_CHAT", OPENAI_CHAT_MODEL).strip(),
+    "roleplay": os.getenv("LLM_MODEL_ROLEPLAY", "deepseek-v3").strip(),
+    "role_card": os.getenv("LLM_MODEL_ROLE_CARD", "gpt-4o-mini").strip(),
+}
+
+# 各任务的上游超时（秒）
+LLM_TIMEOUT_ROUTES: dict = {
+    "chat": OPENAI_TIMEOUT,
+    "roleplay": float(os.getenv("LLM_TIMEOUT_ROLEPLAY", "30")),
+    "role_card": float(os.getenv("LLM_TIMEOUT_ROLE_CARD", "20")),
+}
+
+# 设置后，/admin/* 与按需剖析需要 X-Admin-Token 与之相同
+ADMIN_TOKEN: str = (os.getenv("ADMIN_TOKEN") or "").strip()
+
 
 def get_chat_model() -> str:
     """统一提供给 llm.py 使用的模型 ID。"""
@@ -0,0 +1,259 @@
+# backend/app/core/conversation_log.py
+"""
+对话日志：只追加的对话记录 + 停机快照（SQLite，WAL）
+
+  - 记录：每轮一条（/v1/chat、/v1/roles/chat(/stream)、场景里每个角色一条），供统计分析与回看
+  - 写入不在请求路径上：append() 只放进内存队列，后台协程攒够 CONVLOG_BATCH 条或每 CONVLOG_FLUSH_MS
+    在线程里一个事务批量写入；队列超过 CONVLOG_MAX_PENDING 时丢弃最旧的并计数
+  - 快照：停机时把内存里的会话（SESSIONS）与场景（SCENES）连同角色卡写入 snapshots 表；
+    启动时不预加载，请求访问到某个 session_id / scene_id 时才从快照取回（session_store.set_restorer）
+  - 超过 CONVLOG_SNAPSHOT_TTL_HOURS 未被访问的快照在下次停机时清理
+  - 指标：conversation_log_records_total{kind}、conversation_log_flush_seconds、
+          conversation_log_pending、conversation_log_dropped_total、conversation_restored_total{kind}
+
+环境变量：
+  CONVLOG=1
+  CONVLOG_DB=data/conversations.db
+  CONVLOG_BATCH=200
+  CONVLOG_FLUSH_MS=250
+  CONVLOG_MAX_PENDING=10000
+  CONVLOG_SNAPSHOT_TTL_HOURS=72
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import pathlib
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from . import session_store
+from .metrics import counter, gauge, histogram
+from .tracing import current_turn_id
+
+CONVLOG = os.getenv("CONVLOG", "1").strip().lower() not in ("0", "false", "off", "no")
+CONVLOG_DB = os.getenv("CONVLOG_DB", "data/conversations.db")
+CONVLOG_BATCH = int(os.getenv("CONVLOG_BATCH", "200"))
+CONVLOG_FLUSH_MS = float(os.getenv("CONVLOG_FLUSH_MS", "250"))
+CONVLOG_MAX_PENDING = int(os.getenv("CONVLOG_MAX_PENDING", "10000"))
+CONVLOG_SNAPSHOT_TTL_HOURS = float(os.getenv("CONVLOG_SNAPSHOT_TTL_HOURS", "72"))
+
+RECORDS = counter("conversation_log_records_total", "写入对话日志的记录数", ("kind",))
+DROPPED = counter("conversation_log_dropped_total", "队列满被丢弃的对话日志记录数")
+PENDING = gauge("conversation_log_pending", "等待写入的对话日志记录数")
+FLUSH_SECONDS = histogram("conversation_log_flush_seconds", "对话日志一次批量写入的耗时",
+                          buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+RESTORED = counter("conversation_restored_total", "从快照取回的会话 / 场景数", ("kind",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    conversation_id TEXT,
+    role TEXT NOT NULL,
+    skill TEXT,
+    user_text TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    turn_id TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation_id, id);
+CREATE INDEX IF NOT EXISTS turns_ts ON turns (ts);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+"""
+
+Record = Tuple[float, str, Optional[str], str, Optional[str], str, str, Optional[str]]
+
+
+class ConversationLog:
+    def __init__(self, path: str = CONVLOG_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Deque[Record] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ----- 连接 -----
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, args=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db().execute(sql, args)
+
+    # ----- 追加（请求路径：只进内存队列） -----
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def append(self, kind: str, conversation_id: Optional[str], role: str, user_text: str, reply: str,
+               skill: Optional[str] = None) -> None:
+        if not self.running:
+            return
+        if len(self._pending) >= CONVLOG_MAX_PENDING:
+            self._pending.popleft()
+            DROPPED.inc()
+        self._pending.append((time.time(), kind, conversation_id, role, skill, user_text, reply, current_turn_id()))
+        RECORDS.inc(kind=kind)
+        PENDING.set(len(self._pending))
+        if len(self._pending) >= CONVLOG_BATCH:
+            self._wakeup.set()
+
+    def _write(self, batch: List[Record]) -> None:
+        started = time.perf_counter()
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT INTO turns (ts, kind, conversation_id, role, skill, user_text, reply, turn_id) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    def _take(self) -> List[Record]:
+        batch = list(self._pending)
+        self._pending.clear()
+        PENDING.set(0)
+        return batch
+
+    async def flush(self) -> int:
+        batch = self._take()
+        if batch:
+            await asyncio.to_thread(self._write, batch)
+        return len(batch)
+
+    async def _writer(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), CONVLOG_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                print(f"[CONVLOG] 批量写入失败: {e}")
+
+    # ----- 生命周期 -----
+    async def start(self) -> None:
+        if self.running:
+            return
+        await asyncio.to_thread(self._db)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+        session_store.set_restorer(self.restore)
+
+    async def stop(self) -> None:
+        """停机：写完队列里的记录，再给内存里的会话 / 场景存快照"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        try:
+            await self.flush()
+            saved = await asyncio.to_thread(self.snapshot)
+            print(f"[CONVLOG] 快照：会话 {saved['session']} 个，场景 {saved['scene']} 个")
+        except sqlite3.Error as e:
+            print(f"[CONVLOG] 停机写入失败: {e}")
+        session_store.set_restorer(None)
+
+    # ----- 快照 -----
+    def snapshot(self) -> Dict[str, int]:
+        now = time.time()
+        rows = []
+        cards = set()
+        for sid, sess in list(session_store.SESSIONS.items()):
+            rows.append((sid, "session", json.dumps(sess.to_dict(), ensure_ascii=False), now))
+            cards.add(sess.card_id)
+        for sid, scene in list(session_store.SCENES.items()):
+            rows.append((sid, "scene", json.dumps(scene.to_dict(), ensure_ascii=False), now))
+        for cid in cards:
+            rows.append((cid, "card", json.dumps(session_store.export_card(cid), ensure_ascii=False), now))
+        cutoff = now - CONVLOG_SNAPSHOT_TTL_HOURS * 3600
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO snapshots (id, kind, data, saved_at) VALUES (?, ?, ?, ?)", rows)
+                conn.execute("DELETE FROM snapshots WHERE saved_at < ?", (cutoff,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return {"session": len(session_store.SESSIONS), "scene": len(session_store.SCENES), "card": len(cards)}
+
+    def _load(self, kind: str, item_id: str) -> Optional[Dict]:
+        row = self._execute("SELECT data FROM snapshots WHERE kind = ? AND id = ?", (kind, item_id)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def restore(self, kind: str, item_id: str) -> Any:
+        """session_store 未命中时调用：单行主键查询，在请求里同步执行"""
+        try:
+            data = self._load(kind, item_id)
+            if data is None:
+                return None
+            if kind == "session":
+                if data["card_id"] not in session_store.CARDS:
+                    card = self._load("card", data["card_id"])
+                    if card is None:
+                        return None
+                    session_store.intern_card(card)
+                obj = session_store.Session.from_dict(data)
+            else:
+                obj = session_store.Scene.from_dict(data)
+        except (sqlite3.Error, KeyError, ValueError, TypeError) as e:
+            print(f"[CONVLOG] 取回{kind} {item_id} 失败: {e}")
+            return None
+        RESTORED.inc(kind=kind)
+        return obj
+
+    # ----- 查询 -----
+    def turns(self, conversation_id: Optional[str] = None, kind: Optional[str] = None,
+              limit: int = 100) -> List[Dict]:
+        sql, args = "SELECT * FROM turns WHERE 1=1", []
+        if conversation_id:
+            sql += " AND conversation_id = ?"
+            args.append(conversation_id)
+        if kind:
+            sql += " AND kind = ?"
+            args.append(kind)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in reversed(self._execute(sql, args).fetchall())]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {r["kind"]: r["n"] for r in
+                  self._execute("SELECT kind, COUNT(*) AS n FROM turns GROUP BY kind").fetchall()}
+        snapshots = {r["kind"]: r["n"] for r in
+                     self._execute("SELECT kind, COUNT(*) AS n FROM snapshots GROUP BY kind").fetchall()}
+        return {"db": self.path, "running": self.running, "pending": len(self._pending),
+                "counts": counts, "snapshots": snapshots}
+
+
+conversation_log = ConversationLog()
@@ -0,0 +1,414 @@
+# backend/app/core/jobs.py
+"""
+异步任务：长耗时的 ASR / 批量 TTS / 评测放到后台执行，HTTP 请求只负责提交和查询
+
+  - 持久化：SQLite（WAL），进程重启后排队中的任务继续执行，执行中的任务租约过期后被重新领取
+  - worker：事件循环上的若干协程，领取任务时写租约（JOBS_LEASE 秒），执行期间定期续约；
+            多个进程共用同一个库也不会重复执行
+  - 处理函数：@register("asr") async def handler(payload, ctx) -> dict；ctx.progress(done, total, message)
+  - 取消：排队中直接取消；执行中置 cancel_requested，worker 续约时发现后取消处理协程
+  - 重试：只对“执行到一半进程退出”重试（最多 JOBS_MAX_ATTEMPTS 次），处理函数自身抛错直接失败
+  - 指标：jobs_total{kind,status}、job_duration_seconds{kind}、job_queue_wait_seconds{kind}
+
+环境变量：
+  JOBS_DB=data/jobs.db
+  JOBS_WORKERS=2
+  JOBS_LEASE=60
+  JOBS_MAX_ATTEMPTS=3
+  JOBS_RETENTION_HOURS=168      # 完成的任务保留多久
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import pathlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import counter, histogram
+from .scheduler import priority
+from .tracing import span
+
+JOBS_DB = os.getenv("JOBS_DB", "data/jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_LEASE = float(os.getenv("JOBS_LEASE", "60"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", "168"))
+POLL_INTERVAL = 0.5
+
+JOBS_TOTAL = counter("jobs_total", "后台任务数（按结束状态）", ("kind", "status"))
+JOB_DURATION = histogram("job_duration_seconds", "后台任务执行耗时", ("kind",),
+                         buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+JOB_QUEUE_WAIT = histogram("job_queue_wait_seconds", "后台任务排队等待时间", ("kind",),
+                           buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str
+    payload: Dict
+    result: Optional[Dict]
+    error: Optional[str]
+    progress_done: int
+    progress_total: int
+    message: Optional[str]
+    attempts: int
+    created_at: float
+    started_at: Optional[float]
+    updated_at: float
+    finished_at: Optional[float]
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(row["id"], row["kind"], row["status"], json.loads(row["payload"]),
+                   json.loads(row["result"]) if row["result"] else None, row["error"],
+                   row["progress_done"], row["progress_total"], row["message"], row["attempts"],
+                   row["created_at"], row["started_at"], row["updated_at"], row["finished_at"])
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self, include_result: bool = False) -> Dict:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {"done": self.progress_done, "total": self.progress_total, "message": self.message},
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobStore:
+    """SQLite 上的任务表；方法均为同步调用（单次 SQL 很快，事件循环里直接用或放线程池均可）"""
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, args=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def submit(self, kind: str, payload: Dict) -> Job:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self._execute("INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                      (job_id, kind, json.dumps(payload, ensure_ascii=False), now, now))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        sql, args = "SELECT * FROM jobs WHERE 1=1", []
+        if kind:
+            sql += " AND kind = ?"
+            args.append(kind)
+        if status:
+            sql += " AND status = ?"
+            args.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        return [Job.from_row(r) for r in self._execute(sql, args).fetchall()]
+
+    def claim(self, worker: str, kinds: List[str], lease: float = JOBS_LEASE) -> Optional[Job]:
+        """领取一个任务：排队中的，或执行中但租约已过期的（上一个进程中途退出）"""
+        if not kinds:
+            return None
+        marks = ",".join("?" * len(kinds))
+        while True:
+            now = time.time()
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        f"SELECT * FROM jobs WHERE kind IN ({marks}) AND (status = 'queued' OR "
+                        f"(status = 'running' AND lease_until < ?)) ORDER BY created_at LIMIT 1",
+                        (*kinds, now)).fetchone()
+                    abandoned = row is not None and (row["attempts"] >= JOBS_MAX_ATTEMPTS or row["cancel_requested"])
+                    if row is not None and abandoned:
+                        # 反复中断（或中断前已请求取消）的任务不再执行
+                        status = "cancelled" if row["cancel_requested"] else "failed"
+                        error = None if row["cancel_requested"] else f"执行中断超过 {JOBS_MAX_ATTEMPTS} 次"
+                        self._conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ?, "
+                                           "lease_until = NULL WHERE id = ?", (status, error, now, now, row["id"]))
+                    elif row is not None:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                            "started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                            (worker, now + lease, now, now, row["id"]))
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            if row is None:
+                return None
+            if abandoned:
+                JOBS_TOTAL.inc(kind=row["kind"], status=status)
+                continue
+            return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker: str, lease: float = JOBS_LEASE) -> bool:
+        """续约；返回是否被请求取消"""
+        self._execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                      (time.time() + lease, job_id, worker))
+        row = self._execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def progress(self, job_id: str, done: int, total: int, message: Optional[str] = None) -> None:
+        self._execute("UPDATE jobs SET progress_done = ?, progress_total = ?, message = COALESCE(?, message), "
+                      "updated_at = ? WHERE id = ?", (done, total, message, time.time(), job_id))
+
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None) -> bool:
+        """写入结果；只有仍持有租约的 worker 能写（租约过期、任务被别的 worker 重新领取后返回 False）"""
+        now = time.time()
+        cur = self._execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ?, "
+                            "lease_until = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                             now, now, job_id, worker))
+        return cur.rowcount > 0
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """排队中的直接取消；执行中的标记，由 worker 取消"""
+        now = time.time()
+        cur = self._execute("UPDATE jobs SET status = 'cancelled', finished_at = ?, updated_at = ? "
+                            "WHERE id = ? AND status = 'queued'", (now, now, job_id))
+        if cur.rowcount:
+            JOBS_TOTAL.inc(kind=self.get(job_id).kind, status="cancelled")
+        self._execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'running'",
+                      (now, job_id))
+        return self.get(job_id)
+
+    def purge(self, older_than_hours: float = JOBS_RETENTION_HOURS) -> int:
+        cutoff = time.time() - older_than_hours * 3600
+        cur = self._execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') "
+                            "AND finished_at < ?", (cutoff,))
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# —— 处理函数注册 —— #
+Handler = Callable[[Dict, "JobContext"], Awaitable[Dict]]
+_handlers: Dict[str, Handler] = {}
+
+
+def register(kind: str):
+    def deco(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+    return deco
+
+
+def registered_kinds() -> List[str]:
+    return sorted(_handlers)
+
+
+class JobContext:
+    """传给处理函数：上报进度（写库有节流，在线程里写，不阻塞事件循环）"""
+
+    def __init__(self, store: JobStore, job: Job):
+        self.store = store
+        self.job = job
+        self._last = 0.0
+        self._pending: Optional[Tuple[int, int, Optional[str]]] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def progress(self, done: int, total: int, message: Optional[str] = None) -> None:
+        now = time.monotonic()
+        if done < total and now - self._last < 0.2 and message is None:
+            return
+        self._last = now
+        if message is None and self._pending is not None:
+            message = self._pending[2]
+        # 只保留最新一次，由一个写入协程按顺序落库（不会出现旧进度覆盖新进度）
+        self._pending = (done, total, message)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self) -> None:
+        while self._pending is not None:
+            (done, total, message), self._pending = self._pending, None
+            try:
+                await asyncio.to_thread(self.store.progress, self.job.id, done, total, message)
+            except sqlite3.Error as e:
+                print(f"[JOBS] 任务 {self.job.id} 写入进度失败: {e}")
+
+    async def drain(self) -> None:
+        """等进度写完（写结果之前调用）"""
+        if self._writer is not None:
+            await self._writer
+
+
+# —— worker 池 —— #
+_store: Optional[JobStore] = None
+_workers: List[asyncio.Task] = []
+_worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        _store = JobStore()
+    return _store
+
+
+def submit(kind: str, payload: Dict) -> Job:
+    if kind not in _handlers:
+        raise ValueError(f"未知的任务类型: {kind}")
+    return get_job_store().submit(kind, payload)
+
+
+async def _run_job(store: JobStore, job: Job, worker: str) -> None:
+    handler = _handlers[job.kind]
+    ctx = JobContext(store, job)
+    JOB_QUEUE_WAIT.observe(max(0.0, (job.started_at or time.time()) - job.created_at), kind=job.kind)
+    started = time.perf_counter()
+    # 后台任务发起的上游调用一律按 batch 排队（task 创建时复制当前 context）
+    with priority("batch"):
+        task = asyncio.create_task(handler(job.payload, ctx))
+    cancelled = False
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOBS_LEASE / 3)
+            if done:
+                break
+            if await asyncio.to_thread(store.heartbeat, job.id, worker):
+                cancelled = True
+                task.cancel()
+        result = task.result()
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            # worker 自身被停止（进程退出）：不改状态，租约过期后由其他 worker / 下次启动重新执行
+            task.cancel()
+            raise
+        if cancelled:
+            status, result, error = "cancelled", None, None
+        else:
+            # 处理函数自己抛出的 CancelledError（如它等待的共享调用被取消）：按失败处理，worker 继续
+            status, result, error = "failed", None, "cancelled"
+    except Exception as e:
+        detail = getattr(e, "detail", None)
+        status, result, error = "failed", None, json.dumps(detail, ensure_ascii=False) if detail else str(e)
+    else:
+        if not isinstance(result, dict):
+            result = {"value": result}
+        status, error = "succeeded", None
+    await ctx.drain()
+    if not await asyncio.to_thread(store.finish, job.id, worker, status, result, error):
+        print(f"[JOBS] 任务 {job.id} 的租约已失效，丢弃本次结果（{status}）")
+        return
+    JOBS_TOTAL.inc(kind=job.kind, status=status)
+    JOB_DURATION.observe(time.perf_counter() - started, kind=job.kind)
+
+
+async def _worker_loop(index: int) -> None:
+    store = get_job_store()
+    worker = f"{_worker_prefix}:{index}"
+    while True:
+        try:
+            job = await asyncio.to_thread(store.claim, worker, registered_kinds())
+        except sqlite3.Error as e:
+            print(f"[JOBS] 领取任务失败: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+        try:
+            with span("job.run", kind=job.kind, job_id=job.id, attempt=job.attempts):
+                await _run_job(store, job, worker)
+        except sqlite3.Error as e:
+            # 写结果失败：任务保持 running，租约过期后重新执行
+            print(f"[JOBS] 任务 {job.id} 写入结果失败: {e}")
+
+
+def start_workers(count: int = JOBS_WORKERS) -> None:
+    if _workers or count <= 0:
+        return
+    purged = get_job_store().purge()
+    if purged:
+        print(f"[JOBS] 清理过期任务 {purged} 个")
+    loop = asyncio.get_running_loop()
+    _workers.extend(loop.create_task(_worker_loop(i)) for i in range(count))
+
+
+async def stop_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    for task in _workers:
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+    _workers.clear()
+
+
+async def wait_for_update(job_id: str, since: float, timeout: float = 15.0) -> Optional[Job]:
+    """等任务状态 / 进度变化（轮询数据库，其他进程执行的任务同样适用）；超时返回当前状态"""
+    store = get_job_store()
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None or job.updated_at > since or job.finished or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(POLL_INTERVAL / 2)
+
+
+def stats() -> Dict[str, Any]:
+    return {"workers": len(_workers), "kinds": registered_kinds(), "counts": get_job_store().counts(),
+            "jobs": JOBS_TOTAL.snapshot()}
@@ -0,0 +1,243 @@
+# backend/app/core/keypool.py
+"""
+上游密钥池：LLM / TTS / ASR 共用，多个 key（可各自绑定 base_url）分摊限流
+
+  - 选 key：跳过冷却中的 key，取在途请求最少的；并列时优先剩余配额多的
+  - 记录：每个 key 的请求数、429 次数、上游返回的剩余配额（x-ratelimit-remaining-*）
+  - 冷却：429 按 Retry-After（缺省 UPSTREAM_KEY_COOLDOWN 秒）；剩余配额为 0 时冷却到 reset；
+          连续网络错误 / 5xx 达到 3 次短暂冷却 5 秒
+  - request()：一次性请求的便捷封装，遇到 429 换一个 key 重试一次
+
+环境变量：
+  UPSTREAM_KEYS=sk-a,sk-b,sk-c@https://other-gateway/v1   # 不设则使用 OPENAI_API_KEY
+  UPSTREAM_KEY_COOLDOWN=30
+"""
+from __future__ import annotations
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from .metrics import counter, gauge
+from .tracing import inject_headers
+from .upstream import get_http_client
+
+UPSTREAM_KEY_COOLDOWN = float(os.getenv("UPSTREAM_KEY_COOLDOWN", "30"))
+FAILURE_THRESHOLD = 3
+FAILURE_COOLDOWN = 5.0
+
+KEY_REQUESTS = counter("upstream_key_requests_total", "各上游 key 的请求数（按结果）", ("key", "result"))
+KEY_INFLIGHT = gauge("upstream_key_inflight", "各上游 key 的在途请求数", ("key",))
+
+# 当前上下文最近一次租到的 key（用量按 key 归属）
+_last_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("upstream_last_key", default=None)
+
+
+def last_key() -> Optional[str]:
+    return _last_key.get()
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After / x-ratelimit-reset-*：'12'、'1.5s'、'6m0s'、'250ms'"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, matched = 0.0, False
+    for num, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(num) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Credential:
+    __slots__ = ("key", "base_url", "label", "inflight", "requests", "rate_limited", "failures",
+                 "consecutive_failures", "cooldown_until", "remaining_requests", "remaining_tokens", "last_status")
+
+    def __init__(self, key: str, base_url: Optional[str], index: int):
+        self.key = key
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.label = f"{index}:{key[:4]}…{key[-4:]}" if len(key) > 8 else f"{index}"
+        self.inflight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.last_status: Optional[int] = None
+
+    def cooling(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "key": self.label,
+            "base_url": self.base_url,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "cooldown_remaining": round(max(0.0, self.cooldown_until - now), 1),
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "last_status": self.last_status,
+        }
+
+
+class Lease:
+    """一次上游调用占用的 key；observe(resp) 记录结果（用完由 KeyPool.lease 归还）"""
+    __slots__ = ("pool", "cred", "base_url", "observed")
+
+    def __init__(self, pool: "KeyPool", cred: Credential, default_base: str):
+        self.pool = pool
+        self.cred = cred
+        self.base_url = cred.base_url or default_base.rstrip("/")
+        self.observed = False
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        return inject_headers({"Authorization": f"Bearer {self.cred.key}", **(extra or {})})
+
+    def observe(self, resp) -> None:
+        self.observed = True
+        self.pool._observe(self.cred, resp.status_code, resp.headers)
+
+
+class KeyPool:
+    def __init__(self, entries: List[str], cooldown: float = UPSTREAM_KEY_COOLDOWN):
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.credentials: List[Credential] = []
+        for i, entry in enumerate(e.strip() for e in entries):
+            if not entry:
+                continue
+            key, _, base = entry.partition("@")
+            self.credentials.append(Credential(key.strip(), base.strip() or None, i))
+
+    def __bool__(self) -> bool:
+        return bool(self.credentials)
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def _pick(self, exclude: Optional[Credential] = None) -> Credential:
+        now = time.monotonic()
+        candidates = [c for c in self.credentials if c is not exclude] or self.credentials
+        healthy = [c for c in candidates if not c.cooling(now)]
+        if not healthy:
+            # 全部在冷却：选最早恢复的，让请求自己去碰运气（上游再 429 也会如实返回）
+            return min(candidates, key=lambda c: c.cooldown_until)
+        return min(healthy, key=lambda c: (c.inflight, -(c.remaining_requests if c.remaining_requests is not None
+                                                           else 1 << 30), c.requests))
+
+    @contextmanager
+    def lease(self, default_base: str, exclude: Optional[Credential] = None) -> Iterator[Lease]:
+        if not self.credentials:
+            raise RuntimeError("未配置上游 API key（OPENAI_API_KEY / UPSTREAM_KEYS）")
+        with self._lock:
+            cred = self._pick(exclude)
+            cred.inflight += 1
+            cred.requests += 1
+        KEY_INFLIGHT.set(cred.inflight, key=cred.label)
+        _last_key.set(cred.label)
+        lease = Lease(self, cred, default_base)
+        try:
+            yield lease
+        except Exception:
+            # 没拿到响应就出错（网络错误 / 超时）记为失败；取消不计入
+            if not lease.observed:
+                self._observe(cred, None, {})
+            raise
+        finally:
+            with self._lock:
+                cred.inflight -= 1
+            KEY_INFLIGHT.set(cred.inflight, key=cred.label)
+
+    def _observe(self, cred: Credential, status: Optional[int], headers) -> None:
+        now = time.monotonic()
+        with self._lock:
+            cred.last_status = status
+            remaining = _to_int(headers.get("x-ratelimit-remaining-requests"))
+            if remaining is not None:
+                cred.remaining_requests = remaining
+            tokens = _to_int(headers.get("x-ratelimit-remaining-tokens"))
+            if tokens is not None:
+                cred.remaining_tokens = tokens
+
+            if status == 429:
+                cred.rate_limited += 1
+                wait = _parse_duration(headers.get("retry-after")) or self.cooldown
+                cred.cooldown_until = max(cred.cooldown_until, now + wait)
+                result = "rate_limited"
+            elif status is None or status >= 500:
+                cred.failures += 1
+                cred.consecutive_failures += 1
+                if cred.consecutive_failures >= FAILURE_THRESHOLD:
+                    cred.cooldown_until = max(cred.cooldown_until, now + FAILURE_COOLDOWN)
+                    cred.consecutive_failures = 0
+                result = "error"
+            else:
+                cred.consecutive_failures = 0
+                if remaining == 0:
+                    reset = _parse_duration(headers.get("x-ratelimit-reset-requests")) or self.cooldown
+                    cred.cooldown_until = max(cred.cooldown_until, now + reset)
+                result = "ok"
+        KEY_REQUESTS.inc(key=cred.label, result=result)
+
+    async def request(self, method: str, path: str, default_base: str, headers: Optional[Dict[str, str]] = None,
+                      **kwargs):
+        """发一次上游请求（httpx）；429 且还有别的 key 时换 key 重试一次"""
+        tried: Optional[Credential] = None
+        for attempt in range(2 if len(self.credentials) > 1 else 1):
+            with self.lease(default_base, exclude=tried) as lease:
+                resp = await get_http_client().request(method, lease.url(path), headers=lease.headers(headers),
+                                                       **kwargs)
+                lease.observe(resp)
+            if resp.status_code != 429:
+                return resp
+            tried = lease.cred
+        return resp
+
+    def wait_time(self) -> float:
+        """距离有 key 可用（不在冷却中）还需等待的秒数；有可用 key 时为 0"""
+        now = time.monotonic()
+        with self._lock:
+            if not self.credentials:
+                return 0.0
+            return max(0.0, min(c.cooldown_until for c in self.credentials) - now)
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [c.to_dict(now) for c in self.credentials]
+
+
+def _entries_from_env() -> List[str]:
+    raw = os.getenv("UPSTREAM_KEYS", "").strip()
+    if raw:
+        return raw.split(",")
+    return [(os.getenv("OPENAI_API_KEY") or "").strip()]
+
+
+key_pool = KeyPool(_entries_from_env())
+
+
+def has_keys() -> bool:
+    return bool(key_pool)
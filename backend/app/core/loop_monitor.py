@@ -0,0 +1,226 @@
+# backend/app/core/loop_monitor.py
+"""
+事件循环延迟监控 + 阻塞调用检测
+
+  - 延迟：循环上的探针协程每 LOOP_LAG_INTERVAL 秒 sleep 一次，实际多睡的时间即延迟，
+          记入 event_loop_lag_seconds（直方图）与最近一分钟窗口（/admin/loop 查看 p50 / p99 / max）
+  - 阻塞检测（LOOP_BLOCK_DEBUG=1）：看门狗线程检查探针心跳，超过 LOOP_BLOCK_THRESHOLD_MS 没动静时
+          抓取事件循环线程当时的调用栈（以及正在运行的 task / 请求），记入最近 LOOP_BLOCK_KEEP 条并打印日志；
+          阻塞结束后补上实际时长。event_loop_blocks_total 在非 debug 模式下也按延迟超阈值计数
+
+新接口里混进同步 IO（requests、文件读写、大块 base64）时，压测或线上就能直接看到是哪一行卡住了循环。
+
+环境变量：
+  LOOP_MONITOR=1
+  LOOP_LAG_INTERVAL=0.1
+  LOOP_BLOCK_DEBUG=0
+  LOOP_BLOCK_THRESHOLD_MS=100
+  LOOP_BLOCK_KEEP=50
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import asyncio
+import sysconfig
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .metrics import counter, gauge, histogram
+from .tracing import _current_span, _turn_id
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1").strip().lower() not in ("0", "false", "off", "no")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_BLOCK_DEBUG = os.getenv("LOOP_BLOCK_DEBUG", "0").strip().lower() in ("1", "true", "on", "yes")
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_KEEP = int(os.getenv("LOOP_BLOCK_KEEP", "50"))
+
+LOOP_LAG = histogram("event_loop_lag_seconds", "事件循环调度延迟",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_LAST = gauge("event_loop_lag_last_seconds", "最近一次测得的事件循环延迟")
+LOOP_BLOCKS = counter("event_loop_blocks_total", "事件循环阻塞超过阈值的次数")
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LIB_DIRS = tuple({os.path.realpath(sysconfig.get_paths()[k]) + os.sep for k in ("stdlib", "platstdlib", "purelib", "platlib")})
+_WINDOW_SECONDS = 60.0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _describe_task(loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+    """从其他线程读取循环上正在运行的 task（尽力而为，读不到就返回空）"""
+    try:
+        task = asyncio.tasks._current_tasks.get(loop)   # type: ignore[attr-defined]
+    except Exception:
+        return {}
+    if task is None:
+        return {}
+    info: Dict[str, Any] = {"task": task.get_name()}
+    coro = task.get_coro()
+    info["coroutine"] = getattr(coro, "__qualname__", type(coro).__name__)
+    get_context = getattr(task, "get_context", None)   # Python 3.12+
+    if get_context is not None:
+        ctx = get_context()
+        current = ctx.get(_current_span)
+        if current is not None:
+            info["span"] = current.name
+        turn = ctx.get(_turn_id)
+        if turn:
+            info["turn_id"] = turn
+    return info
+
+
+def _culprit(stack: traceback.StackSummary) -> str:
+    """最内层的业务代码帧（不在标准库 / site-packages 里），没有则取栈顶"""
+    chosen = stack[-1] if stack else None
+    for fs in reversed(stack):
+        if not fs.filename.startswith("<") and not os.path.realpath(fs.filename).startswith(_LIB_DIRS):
+            chosen = fs
+            break
+    if chosen is None:
+        return "?"
+    filename = chosen.filename
+    if filename.startswith(_APP_DIR):
+        filename = os.path.relpath(filename, os.path.dirname(_APP_DIR))
+    return f"{filename}:{chosen.lineno} {chosen.name}"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+                 debug: bool = LOOP_BLOCK_DEBUG, keep: int = LOOP_BLOCK_KEEP):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.debug = debug
+        self.blocks: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._window: Deque[Tuple[float, float]] = deque()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        # 心跳：探针每次醒来更新；看门狗据此判断循环是否卡住
+        self._beat = 0.0
+        self._beat_seq = 0
+        self._pending: Optional[Dict[str, Any]] = None   # 看门狗已抓栈、尚未结束的阻塞
+
+    # ----- 生命周期 -----
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._run(), name="loop-monitor")
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    # ----- 探针 -----
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self._record(lag)
+
+    def _record(self, lag: float) -> None:
+        now = time.monotonic()
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+        with self._lock:
+            self._beat = now
+            self._beat_seq += 1
+            self._window.append((now, lag))
+            while self._window and self._window[0][0] < now - _WINDOW_SECONDS:
+                self._window.popleft()
+            pending, self._pending = self._pending, None
+        if lag >= self.threshold:
+            LOOP_BLOCKS.inc()
+            if pending is not None:
+                pending["duration_ms"] = round(lag * 1000, 1)
+                print(f"[LOOP] 事件循环阻塞 {pending['duration_ms']}ms：{pending['culprit']}")
+            elif not self.debug:
+                self.blocks.append({"at": time.time(), "duration_ms": round(lag * 1000, 1)})
+
+    # ----- 看门狗 -----
+    def _watch(self) -> None:
+        check = max(0.005, min(self.threshold / 2, self.interval))
+        reported = -1
+        while not self._stop.wait(check):
+            with self._lock:
+                beat, seq = self._beat, self._beat_seq
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or seq == reported:
+                continue
+            reported = seq
+            self._capture(stalled, seq)
+
+    def _capture(self, stalled: float, seq: int) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=40)
+        block = {
+            "at": time.time(),
+            "stalled_ms": round(stalled * 1000, 1),
+            "duration_ms": None,        # 阻塞结束后由探针补上
+            "culprit": _culprit(stack),
+            "stack": [f"{fs.filename}:{fs.lineno} {fs.name}" + (f"  | {fs.line}" if fs.line else "") for fs in stack],
+            **_describe_task(self._loop),
+        }
+        with self._lock:
+            if self._beat_seq != seq:
+                return   # 抓栈期间循环已经恢复，栈不再可信
+            self._pending = block
+        self.blocks.append(block)
+
+    # ----- 查询 -----
+    def stats(self, include_stacks: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            lags = [lag for _, lag in self._window]
+        blocks = list(self.blocks)
+        if not include_stacks:
+            blocks = [{k: v for k, v in b.items() if k != "stack"} for b in blocks]
+        return {
+            "running": self._task is not None,
+            "debug": self.debug,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "window": {
+                "seconds": _WINDOW_SECONDS,
+                "samples": len(lags),
+                "p50_ms": round(_percentile(lags, 0.5) * 1000, 2),
+                "p99_ms": round(_percentile(lags, 0.99) * 1000, 2),
+                "max_ms": round(max(lags, default=0.0) * 1000, 2),
+            },
+            "blocks_total": int(LOOP_BLOCKS.value()),
+            "blocks": list(reversed(blocks)),
+        }
+
+    def clear(self) -> int:
+        n = len(self.blocks)
+        self.blocks.clear()
+        return n
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,158 @@
+# backend/app/core/metrics.py
+"""
+进程内指标（Counter / Gauge / Histogram），可渲染为 Prometheus 文本格式（/admin/metrics）
+
+用法：
+  CACHE_REQ = counter("response_cache_requests_total", "响应缓存查询次数", ("role", "result"))
+  CACHE_REQ.inc(role="牛顿", result="hit")
+"""
+from __future__ import annotations
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def _fmt_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{l}="{_escape(v)}"' for l, v in zip(self.labels, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._fmt_labels(k)} {v}" for k, v in items]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {",".join(k) or "_": v for k, v in self._values.items()}
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [每个桶的计数..., +Inf 计数, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[idx] += 1
+            row[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, row in items:
+            cum = 0.0
+            for b, c in zip(self.buckets, row):
+                cum += c
+                out.append(f"{self.name}_bucket{self._fmt_labels(key, ('le', repr(b)))} {cum}")
+            cum += row[len(self.buckets)]
+            out.append(f"{self.name}_bucket{self._fmt_labels(key, ('le', '+Inf'))} {cum}")
+            out.append(f"{self.name}_count{self._fmt_labels(key)} {cum}")
+            out.append(f"{self.name}_sum{self._fmt_labels(key)} {row[-1]}")
+        return out
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = {}
+        for key, row in items:
+            count = sum(row[:-1])
+            out[",".join(key) or "_"] = {"count": count, "sum": row[-1], "avg": row[-1] / count if count else 0.0}
+        return out
+
+
+def _get_or_create(cls, name: str, help: str, labels: Iterable[str], **kw):
+    with _lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = cls(name, help, labels, **kw)
+        return m
+
+
+def counter(name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+    return _get_or_create(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+    return _get_or_create(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+
+def render_prometheus() -> str:
+    with _lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.samples())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, dict]:
+    with _lock:
+        metrics = list(_registry.values())
+    return {m.name: m.snapshot() for m in metrics}
@@ -0,0 +1,423 @@
+# backend/app/core/profiler.py
+"""
+按需采样剖析（只在显式开启时工作，未开启时中间件只多一次请求头检查）
+
+两种模式：
+  - 单请求：请求带 X-Profile: 1（或查询参数 ?_profile=1）且通过管理员校验（X-Admin-Token / _profile=<token>），
+            后台线程按 PROFILE_INTERVAL_MS 采样事件循环线程；只统计“本请求的协程正在运行”的栈，
+            协程挂起时沿 await 链记录它在等什么（上游请求、to_thread 等），两类样本分别归到 on-cpu / awaiting 根节点下。
+            响应头 X-Profile-Id 返回结果 id
+  - 滚动采集：POST /admin/profiles/capture?seconds=N，对所有线程采样 N 秒（含 to_thread / 线程池里的同步代码）
+
+结果保存在内存（最近 PROFILE_KEEP 份），GET /admin/profiles/{id}?format=speedscope|collapsed|summary 取回：
+  speedscope 可直接拖进 https://www.speedscope.app ；collapsed 可交给 flamegraph.pl / inferno 生成火焰图
+
+环境变量：
+  PROFILER=1               # 0 时不挂中间件
+  PROFILE_INTERVAL_MS=5    # 默认采样间隔
+  PROFILE_KEEP=20          # 保留的结果数
+  PROFILE_MAX_ACTIVE=4     # 同时进行的采样数上限（超出时请求照常处理但不采样）
+  PROFILE_MAX_SECONDS=120  # 滚动采集时长上限
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import uuid
+import asyncio
+import threading
+from collections import Counter as TallyCounter, OrderedDict
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import ADMIN_TOKEN
+from .metrics import counter
+
+PROFILER = os.getenv("PROFILER", "1").strip().lower() not in ("0", "false", "off", "no")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "4"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+
+PROFILES = counter("profiles_total", "采样剖析次数", ("kind",))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "_profile"
+
+# 一帧用 (文件, 函数名, 首行号) 标识：同一函数不同行聚合在一起
+FrameKey = Tuple[str, str, int]
+Stack = Tuple[FrameKey, ...]   # 根在前
+
+_ON_CPU: FrameKey = ("", "on-cpu", 0)
+_AWAITING: FrameKey = ("", "awaiting", 0)
+
+
+def _key(code: CodeType) -> FrameKey:
+    return (code.co_filename, getattr(code, "co_qualname", code.co_name), code.co_firstlineno)
+
+
+def _frame_stack(frame: Optional[FrameType], stop: Optional[FrameType] = None) -> Optional[List[FrameKey]]:
+    """从栈顶往下走到 stop（含）；给了 stop 但没遇到时返回 None。结果根在前"""
+    out: List[FrameKey] = []
+    while frame is not None:
+        out.append(_key(frame.f_code))
+        if frame is stop:
+            out.reverse()
+            return out
+        frame = frame.f_back
+    if stop is not None:
+        return None
+    out.reverse()
+    return out
+
+
+def _await_stack(coro: Any) -> List[FrameKey]:
+    """挂起中的协程：沿 cr_await / gi_yieldfrom（遇到 Task 则进入它的协程）拼出逻辑调用栈，末尾是在等的对象"""
+    out: List[FrameKey] = []
+    obj = coro
+    for _ in range(256):
+        if isinstance(obj, asyncio.Task):
+            obj = obj.get_coro()
+            continue
+        frame = getattr(obj, "cr_frame", None) or getattr(obj, "gi_frame", None) or getattr(obj, "ag_frame", None)
+        if frame is None:
+            if obj is not None and obj is not coro:
+                name = type(obj).__name__
+                out.append(("", "<Future>" if name == "FutureIter" else f"<{name}>", 0))
+            break
+        out.append(_key(frame.f_code))
+        nxt = getattr(obj, "cr_await", None) or getattr(obj, "gi_yieldfrom", None) or getattr(obj, "ag_await", None)
+        if nxt is None:
+            break
+        obj = nxt
+    return out
+
+
+# =========================
+#  结果
+# =========================
+class Profile:
+    """一次采样的结果：每条“线程 / 请求”一组栈计数"""
+
+    def __init__(self, kind: str, name: str, interval_ms: float, meta: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.name = name
+        self.interval_ms = interval_ms
+        self.meta = dict(meta or {})
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.status = "running"
+        self.stacks: Dict[str, TallyCounter] = {}
+        self.sampler: Optional["_Sampler"] = None
+        self._lock = threading.Lock()
+
+    def add(self, track: str, stack: Stack) -> None:
+        with self._lock:
+            tally = self.stacks.get(track)
+            if tally is None:
+                tally = self.stacks[track] = TallyCounter()
+            tally[stack] += 1
+
+    def snapshot(self) -> Dict[str, TallyCounter]:
+        """采集进行中也可以导出：拷贝一份当前计数"""
+        with self._lock:
+            return {track: TallyCounter(tally) for track, tally in self.stacks.items()}
+
+    @property
+    def samples(self) -> int:
+        with self._lock:
+            return sum(sum(t.values()) for t in self.stacks.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "tracks": sorted(self.snapshot()),
+            **self.meta,
+        }
+
+    # ----- 导出 -----
+    @staticmethod
+    def _label(key: FrameKey) -> str:
+        filename, name, line = key
+        if not filename:
+            return name
+        return f"{name} ({_short_path(filename)}:{line})"
+
+    def collapsed(self) -> str:
+        """Brendan Gregg 折叠栈格式：track;root;…;leaf count"""
+        lines = []
+        for track, tally in sorted(self.snapshot().items()):
+            for stack, count in tally.most_common():
+                frames = ";".join(self._label(k).replace(";", ":") for k in stack)
+                lines.append(f"{track};{frames} {count}" if frames else f"{track} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self) -> Dict[str, Any]:
+        """speedscope 文件格式（sampled），每个 track 一个 profile"""
+        index: Dict[FrameKey, int] = {}
+        frames: List[Dict[str, Any]] = []
+        profiles = []
+        for track, tally in sorted(self.snapshot().items()):
+            samples, weights = [], []
+            for stack, count in tally.items():
+                ids = []
+                for key in stack:
+                    i = index.get(key)
+                    if i is None:
+                        i = index[key] = len(frames)
+                        filename, name, line = key
+                        frames.append({"name": name, "file": _short_path(filename), "line": line} if filename
+                                      else {"name": name})
+                    ids.append(i)
+                samples.append(ids)
+                weights.append(count * self.interval_ms)
+            profiles.append({
+                "type": "sampled",
+                "name": track,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "ai-voice-backend",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """按函数汇总：self（栈顶）与 total（出现在栈上）样本占比"""
+        self_counts: TallyCounter = TallyCounter()
+        total_counts: TallyCounter = TallyCounter()
+        n = 0
+        for tally in self.snapshot().values():
+            for stack, count in tally.items():
+                n += count
+                if stack:
+                    self_counts[stack[-1]] += count
+                for key in set(stack):
+                    total_counts[key] += count
+
+        def rows(c: TallyCounter):
+            return [{"frame": self._label(k), "samples": v, "ratio": round(v / n, 3)} for k, v in c.most_common(top)]
+
+        return {**self.to_dict(), "self": rows(self_counts), "total": rows(total_counts)}
+
+
+_BASE_DIRS = sorted({os.path.dirname(os.path.dirname(os.path.abspath(__file__)))} | {p for p in sys.path if p},
+                    key=len, reverse=True)
+
+
+def _short_path(filename: str) -> str:
+    for base in _BASE_DIRS:
+        if filename.startswith(base + os.sep):
+            return filename[len(base) + 1:]
+    return filename
+
+
+class _ProfileStore:
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self.keep = keep
+        self._items: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._items[profile.id] = profile
+            while len(self._items) > self.keep:
+                self._items.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._items.get(profile_id)
+
+    def list(self) -> List[Profile]:
+        with self._lock:
+            return list(reversed(self._items.values()))
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._items)
+            self._items.clear()
+            return n
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.active >= PROFILE_MAX_ACTIVE:
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+
+profile_store = _ProfileStore()
+
+
+# =========================
+#  采样线程
+# =========================
+class _Sampler(threading.Thread):
+    """每 interval 调一次 sample()；stop() 后把耗时写回 profile"""
+
+    def __init__(self, profile: Profile, sample: Callable[[], None], seconds: Optional[float] = None):
+        super().__init__(name=f"profiler-{profile.id[:6]}", daemon=True)
+        self.profile = profile
+        self._sample = sample
+        self._seconds = seconds
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        interval = self.profile.interval_ms / 1000
+        t0 = time.perf_counter()
+        deadline = t0 + self._seconds if self._seconds else None
+        next_at = t0
+        try:
+            while not self._stop_event.is_set():
+                self._sample()
+                next_at += interval
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    break
+                # 落后太多时不补采，避免 GIL 争用时连续采样
+                if next_at < now:
+                    next_at = now + interval
+                self._stop_event.wait(next_at - now)
+        except Exception as e:
+            self.profile.meta["error"] = f"{type(e).__name__}: {e}"[:300]
+        finally:
+            self.profile.duration_ms = (time.perf_counter() - t0) * 1000
+            self.profile.status = "finished"
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def capture(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS, name: str = "capture") -> Profile:
+    """滚动采集：对所有线程采样 seconds 秒（后台进行，立即返回 Profile；status 变为 finished 即完成）"""
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+    profile = Profile("capture", name, interval_ms, {"seconds": seconds})
+    names = {}
+
+    def sample():
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            track = names.get(ident)
+            if track is None:
+                names.update((t.ident, t.name) for t in threading.enumerate())
+                track = names.setdefault(ident, f"thread-{ident}")
+            profile.add(track, tuple(_frame_stack(frame)))
+
+    profile.sampler = _Sampler(profile, sample, seconds)
+    profile_store.add(profile)
+    PROFILES.inc(kind="capture")
+    profile.sampler.start()
+    return profile
+
+
+def wait_capture(profile: Profile) -> Profile:
+    if profile.sampler is not None:
+        profile.sampler.join()
+    return profile
+
+
+# =========================
+#  ASGI 中间件
+# =========================
+def _profile_requested(scope) -> Optional[bool]:
+    """None：未请求；True / False：已请求，是否通过校验"""
+    value = None
+    admin = None
+    for name, v in scope.get("headers") or []:
+        if name == PROFILE_HEADER:
+            value = v.decode("latin-1").strip()
+        elif name == b"x-admin-token":
+            admin = v.decode("latin-1").strip()
+    if value is None:
+        qs = scope.get("query_string") or b""
+        if PROFILE_QUERY.encode() not in qs:
+            return None
+        from urllib.parse import parse_qs
+        values = parse_qs(qs.decode("latin-1")).get(PROFILE_QUERY)
+        if not values:
+            return None
+        value = values[0]
+    if value.lower() in ("", "0", "false", "off"):
+        return None
+    if not ADMIN_TOKEN:
+        return True
+    return admin == ADMIN_TOKEN or value == ADMIN_TOKEN
+
+
+class ProfilerMiddleware:
+    """请求显式要求时，对这一个请求采样；其余请求直接透传"""
+
+    def __init__(self, app, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.interval_ms = interval_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = _profile_requested(scope)
+        if not requested or not profile_store.acquire():
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profiled(scope, receive, send)
+        finally:
+            profile_store.release()
+
+    async def _profiled(self, scope, receive, send):
+        method, path = scope.get("method", ""), scope.get("path", "")
+        profile = Profile("request", f"{method} {path}", self.interval_ms, {"method": method, "path": path})
+        header = (b"x-profile-id", profile.id.encode("latin-1"))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.meta["status_code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [header]}
+            await send(message)
+
+        coro = self._run(scope, receive, send_wrapper)
+        root = coro.cr_frame
+        loop_thread = threading.get_ident()
+
+        def sample():
+            frame = sys._current_frames().get(loop_thread)
+            stack = _frame_stack(frame, root)
+            if stack is not None:
+                profile.add("request", (_ON_CPU, *stack))
+            elif coro.cr_frame is not None:
+                profile.add("request", (_AWAITING, *_await_stack(coro)))
+
+        sampler = _Sampler(profile, sample)
+        profile_store.add(profile)
+        PROFILES.inc(kind="request")
+        sampler.start()
+        try:
+            await coro
+        finally:
+            sampler.stop()
+
+    async def _run(self, scope, receive, send):
+        await self.app(scope, receive, send)
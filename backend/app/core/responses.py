@@ -0,0 +1,53 @@
+# backend/app/core/responses.py
+"""
+JSON 编解码：装了 orjson 就用（比标准库快数倍，直接产出 UTF-8 bytes），否则退回 json
+
+  dumps_json(obj) -> bytes   紧凑格式、不转义中文，与 Starlette JSONResponse 的输出一致
+  loads_json(s)              str / bytes 均可
+"""
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+from .tracing import span
+
+try:
+    import orjson
+except Exception:
+    orjson = None  # 便于无 orjson 环境下导入
+
+JSON_ENCODER = "orjson" if orjson is not None else "json"
+
+
+def _dumps_std(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_json(content: Any) -> bytes:
+        try:
+            return orjson.dumps(content, option=_ORJSON_OPTS)
+        except TypeError:
+            # orjson 不认识的类型（自定义对象等）交给标准库，报错信息保持一致
+            return _dumps_std(content)
+
+    def loads_json(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return orjson.loads(data)
+else:
+    dumps_json = _dumps_std
+
+    def loads_json(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse + json.encode span，用于定位大响应体（history / raw_response）的编码耗时"""
+
+    def render(self, content: Any) -> bytes:
+        with span("json.encode", encoder=JSON_ENCODER) as s:
+            body = dumps_json(content)
+            s.set_attribute("bytes", len(body))
+            return body
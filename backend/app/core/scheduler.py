@@ -0,0 +1,186 @@
+# backend/app/core/scheduler.py
+"""
+上游调用调度：LLM / TTS 各一个带优先级的并发闸门，在线对话优先于评测 / 批量任务
+
+  优先级（contextvar，随 task 传递）：
+    interactive  在线请求（默认）：/v1/roles/chat、/v1/tts、/v1/chat ...
+    background   预热、角色卡生成等用户不直接等待的工作
+    batch        评测（/v1/eval）、批量合成、后台任务队列里的一切
+
+  - 容量：每种资源 SCHED_<RES>_SLOTS 个并发名额（默认 每个 key 4 个）
+  - 预留：SCHED_RESERVED 比例的名额只给 interactive；batch 另外最多占 SCHED_BATCH_SHARE 比例
+  - 排队：名额释放时先发给 interactive，再 background，最后 batch；
+          排队中的 batch 请求会被之后到达的高优先级请求插队（已经开始的上游调用不会被打断）
+  - 指标：scheduler_queue_wait_seconds{resource,priority}、scheduler_queued / scheduler_active{resource,priority}
+
+用法：
+  with priority("batch"):
+      ...                                  # 其中（及其创建的 task）发起的上游调用都按 batch 排队
+  async with get_scheduler("llm").slot():
+      ...                                  # 占一个名额
+
+环境变量：
+  SCHED_LLM_SLOTS / SCHED_TTS_SLOTS      # 默认 4 × key 数
+  SCHED_RESERVED=0.25
+  SCHED_BATCH_SHARE=0.5
+"""
+from __future__ import annotations
+import os
+import time
+import asyncio
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+from .keypool import key_pool
+from .metrics import counter, gauge, histogram
+
+INTERACTIVE, BACKGROUND, BATCH = "interactive", "background", "batch"
+PRIORITIES = (INTERACTIVE, BACKGROUND, BATCH)   # 从高到低
+
+SCHED_RESERVED = float(os.getenv("SCHED_RESERVED", "0.25"))
+SCHED_BATCH_SHARE = float(os.getenv("SCHED_BATCH_SHARE", "0.5"))
+SLOTS_PER_KEY = 4
+
+QUEUE_WAIT = histogram("scheduler_queue_wait_seconds", "上游调用排队等待时间", ("resource", "priority"),
+                       buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+QUEUED = gauge("scheduler_queued", "排队中的上游调用数", ("resource", "priority"))
+ACTIVE = gauge("scheduler_active", "占用名额的上游调用数", ("resource", "priority"))
+ADMITTED = counter("scheduler_admitted_total", "获得名额的上游调用数", ("resource", "priority", "queued"))
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def lower(a: str, b: str) -> str:
+    """两个优先级中较低的一个"""
+    return a if PRIORITIES.index(a) >= PRIORITIES.index(b) else b
+
+
+@contextmanager
+def priority(level: str) -> Iterator[str]:
+    """设定当前上下文的优先级（只能降低，不能把 batch 里的调用抬成 interactive）"""
+    if level not in PRIORITIES:
+        raise ValueError(f"未知优先级: {level}")
+    effective = lower(level, _priority.get())
+    token = _priority.set(effective)
+    try:
+        yield effective
+    finally:
+        _priority.reset(token)
+
+
+class Scheduler:
+    def __init__(self, resource: str, slots: int, reserved: float = SCHED_RESERVED,
+                 batch_share: float = SCHED_BATCH_SHARE):
+        self.resource = resource
+        self.configure(slots, reserved, batch_share)
+        self.active: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._queues: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+
+    def configure(self, slots: int, reserved: float = SCHED_RESERVED, batch_share: float = SCHED_BATCH_SHARE) -> None:
+        self.slots = max(1, int(slots))
+        # 至少给 interactive 留 1 个（只有 1 个名额时不预留，否则非 interactive 永远拿不到）
+        self.reserved = min(self.slots - 1, max(1 if reserved > 0 else 0, round(self.slots * reserved)))
+        self.batch_max = max(1, min(self.slots - self.reserved, round(self.slots * batch_share)))
+
+    # ----- 名额 -----
+    def _can_run(self, level: str) -> bool:
+        total = sum(self.active.values())
+        if level == INTERACTIVE:
+            return total < self.slots
+        if total >= self.slots - self.reserved:
+            return False
+        return level != BATCH or self.active[BATCH] < self.batch_max
+
+    def _grant(self, level: str) -> None:
+        self.active[level] += 1
+        ACTIVE.set(self.active[level], resource=self.resource, priority=level)
+
+    def _dispatch(self) -> None:
+        for level in PRIORITIES:
+            queue = self._queues[level]
+            while queue and self._can_run(level):
+                fut = queue.popleft()
+                if fut.done():   # 等待者已取消
+                    continue
+                self._grant(level)
+                fut.set_result(None)
+            QUEUED.set(len(queue), resource=self.resource, priority=level)
+
+    def _release(self, level: str) -> None:
+        self.active[level] -= 1
+        ACTIVE.set(self.active[level], resource=self.resource, priority=level)
+        self._dispatch()
+
+    async def acquire(self, level: str) -> float:
+        """等到有名额（返回排队秒数）；取消时不占名额"""
+        ahead = any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(level) + 1])
+        if not ahead and self._can_run(level):
+            self._grant(level)
+            ADMITTED.inc(resource=self.resource, priority=level, queued="no")
+            QUEUE_WAIT.observe(0.0, resource=self.resource, priority=level)
+            return 0.0
+
+        fut = asyncio.get_running_loop().create_future()
+        queue = self._queues[level]
+        queue.append(fut)
+        QUEUED.set(len(queue), resource=self.resource, priority=level)
+        t0 = time.perf_counter()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已经发出但调用方被取消：还回去
+                self._release(level)
+            else:
+                try:
+                    queue.remove(fut)
+                except ValueError:
+                    pass
+                QUEUED.set(len(queue), resource=self.resource, priority=level)
+            raise
+        waited = time.perf_counter() - t0
+        ADMITTED.inc(resource=self.resource, priority=level, queued="yes")
+        QUEUE_WAIT.observe(waited, resource=self.resource, priority=level)
+        return waited
+
+    @asynccontextmanager
+    async def slot(self, level: Optional[str] = None):
+        level = level or current_priority()
+        await self.acquire(level)
+        try:
+            yield level
+        finally:
+            self._release(level)
+
+    def stats(self) -> Dict:
+        return {
+            "resource": self.resource,
+            "slots": self.slots,
+            "reserved_interactive": self.reserved,
+            "batch_max": self.batch_max,
+            "active": dict(self.active),
+            "queued": {p: sum(1 for f in q if not f.done()) for p, q in self._queues.items()},
+        }
+
+
+def _default_slots(resource: str) -> int:
+    raw = os.getenv(f"SCHED_{resource.upper()}_SLOTS", "").strip()
+    if raw:
+        return int(raw)
+    return SLOTS_PER_KEY * max(1, len(key_pool))
+
+
+_schedulers: Dict[str, Scheduler] = {}
+
+
+def get_scheduler(resource: str) -> Scheduler:
+    scheduler = _schedulers.get(resource)
+    if scheduler is None:
+        scheduler = _schedulers[resource] = Scheduler(resource, _default_slots(resource))
+    return scheduler
@@ -1,18 +1,193 @@
-import time, uuid
-from typing import Dict
+# backend/app/core/session_store.py
+"""
+会话存储（进程内）
 
-SESSIONS: Dict[str, Dict] = {}
+  - 角色卡冻结后按内容去重：intern_card() 返回 card_id，所有会话共享同一份只读卡片
+  - 会话只保存 card_id + 扁平的对话缓冲区，不再每个会话复制一份角色卡、每轮一个 dict
+  - 多角色场景（Scene）保存共享的发言记录，每个角色按自己的窗口取最近的发言（services/scene.py）
+  - 重启不丢会话：停机时由 core/conversation_log 把 SESSIONS / SCENES 存快照，
+    重启后 get_session / get_scene 未命中时经 set_restorer() 注册的函数按需取回
+  - 内存对比：python -m bench.session_memory
+"""
+from __future__ import annotations
+import sys
+import time
+import uuid
+import hashlib
+import json
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Tuple
 
-def create_session(role_name: str, role_card: dict, memory_limit: int) -> str:
+
+def freeze(value: Any) -> Any:
+    """递归冻结：dict → 只读映射，list → tuple，短字符串 intern"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({sys.intern(str(k)): freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, str) and len(value) <= 64:
+        return sys.intern(value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+# card_id -> 冻结后的角色卡
+CARDS: Dict[str, Mapping] = {}
+
+
+def card_id_for(card: Mapping) -> str:
+    raw = json.dumps(_thaw(card), ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def intern_card(card: Mapping) -> str:
+    """登记角色卡，内容相同的卡只保存一份"""
+    cid = card_id_for(card)
+    if cid not in CARDS:
+        CARDS[cid] = card if isinstance(card, MappingProxyType) else freeze(card)
+    return cid
+
+
+def get_card(card_id: str) -> Mapping:
+    return CARDS[card_id]
+
+
+def export_card(card_id: str) -> Dict:
+    """角色卡的可序列化副本（快照用）"""
+    return _thaw(CARDS[card_id])
+
+
+class TurnBuffer:
+    """定长对话缓冲：[user0, assistant0, user1, assistant1, ...] 扁平存放，超出上限丢最早一轮"""
+    __slots__ = ("_items", "limit")
+
+    def __init__(self, limit: int):
+        self._items: List[str] = []
+        self.limit = limit
+
+    def append(self, user: str, assistant: str) -> None:
+        self._items += (user, assistant)
+        if len(self._items) > 2 * self.limit:
+            del self._items[:2]
+
+    def recent(self, n: int) -> List[Tuple[str, str]]:
+        items = self._items[-2 * n:] if n > 0 else []
+        return list(zip(items[::2], items[1::2]))
+
+    def __len__(self) -> int:
+        return len(self._items) // 2
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.recent(len(self)))
+
+
+class Session:
+    __slots__ = ("role_name", "card_id", "history", "created_at")
+
+    def __init__(self, role_name: str, card_id: str, limit: int):
+        self.role_name = sys.intern(role_name)
+        self.card_id = card_id
+        self.history = TurnBuffer(limit)
+        self.created_at = time.time()
+
+    @property
+    def role_card(self) -> Mapping:
+        return CARDS[self.card_id]
+
+    @property
+    def limit(self) -> int:
+        return self.history.limit
+
+    def to_dict(self) -> Dict:
+        return {"role_name": self.role_name, "card_id": self.card_id, "limit": self.limit,
+                "history": list(self.history._items), "created_at": self.created_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Session":
+        sess = cls(data["role_name"], data["card_id"], data["limit"])
+        sess.history._items = list(data["history"])
+        sess.created_at = data["created_at"]
+        return sess
+
+
+SESSIONS: Dict[str, Session] = {}
+
+# (kind, id) -> 对象 / None；kind 为 "session" / "scene"
+_restorer: Optional[Callable[[str, str], Any]] = None
+
+
+def set_restorer(fn: Optional[Callable[[str, str], Any]]) -> None:
+    global _restorer
+    _restorer = fn
+
+
+def create_session(role_name: str, role_card: Mapping, memory_limit: int) -> str:
     sid = str(uuid.uuid4())
-    SESSIONS[sid] = {
-        "role_name": role_name,
-        "role_card": role_card,
-        "history": [],
-        "limit": max(2, min(20, memory_limit)),
-        "created_at": time.time(),
-    }
+    SESSIONS[sid] = Session(role_name, intern_card(role_card), max(2, min(20, memory_limit)))
     return sid
 
-def get_session(session_id: str) -> dict | None:
-    return SESSIONS.get(session_id)
+
+def get_session(session_id: str) -> Optional[Session]:
+    sess = SESSIONS.get(session_id)
+    if sess is None and _restorer is not None:
+        sess = _restorer("session", session_id)
+        if sess is not None:
+            SESSIONS[session_id] = sess
+    return sess
+
+
+class Scene:
+    """多角色场景：一份共享的发言记录 [(发言者, 内容)]，发言者为 "user" 或角色名"""
+    __slots__ = ("characters", "history", "turns", "created_at")
+
+    def __init__(self, characters: Tuple[str, ...], limit: int):
+        self.characters = tuple(sys.intern(c) for c in characters)
+        self.history: Deque[Tuple[str, str]] = deque(maxlen=limit * (1 + len(characters)))
+        self.turns = 0
+        self.created_at = time.time()
+
+    def append(self, speaker: str, text: str) -> None:
+        self.history.append((sys.intern(speaker), text))
+
+    def recent(self, n: int) -> List[Tuple[str, str]]:
+        return list(self.history)[-n:] if n > 0 else []
+
+    def to_dict(self) -> Dict:
+        return {"characters": list(self.characters), "limit": self.history.maxlen // (1 + len(self.characters)),
+                "history": [list(item) for item in self.history], "turns": self.turns,
+                "created_at": self.created_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Scene":
+        scene = cls(tuple(data["characters"]), data["limit"])
+        for speaker, text in data["history"]:
+            scene.append(speaker, text)
+        scene.turns = data["turns"]
+        scene.created_at = data["created_at"]
+        return scene
+
+
+SCENES: Dict[str, Scene] = {}
+
+
+def create_scene(characters: Tuple[str, ...], memory_limit: int) -> str:
+    sid = str(uuid.uuid4())
+    SCENES[sid] = Scene(characters, max(2, min(20, memory_limit)))
+    return sid
+
+
+def get_scene(scene_id: str) -> Optional[Scene]:
+    scene = SCENES.get(scene_id)
+    if scene is None and _restorer is not None:
+        scene = _restorer("scene", scene_id)
+        if scene is not None:
+            SCENES[scene_id] = scene
+    return scene
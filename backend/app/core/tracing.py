@@ -0,0 +1,373 @@
+# backend/app/core/tracing.py
+"""
+轻量链路追踪（兼容 OpenTelemetry / W3C Trace Context）
+
+一次语音对话 = /v1/asr → /v1/roles/chat → /v1/tts 三个请求，
+通过同一个 turn id（请求头 X-Turn-Id）串成一条 trace：
+  - 入站：解析 traceparent / X-Turn-Id；只有 turn id 时由它派生 trace_id
+  - 进程内：contextvars 传递当前 span，span() 既可用于同步也可用于协程
+  - 出站：inject_headers() 给上游请求带上 traceparent
+  - 导出：memory（默认，环形缓冲，测试与 /admin/traces 使用）/ console / otlp / none
+
+环境变量：
+  TRACE_EXPORTER=memory        # memory / console / otlp / none
+  TRACE_BUFFER_SIZE=5000       # memory 导出器保留的 span 数
+  TRACE_OTLP_ENDPOINT=http://localhost:4318/v1/traces
+  TRACE_SERVICE_NAME=ai-voice-backend
+"""
+from __future__ import annotations
+import os
+import re
+import time
+import uuid
+import hashlib
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory").strip().lower()
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces").strip()
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ai-voice-backend").strip()
+
+TURN_HEADER = "x-turn-id"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """一个已开始/已结束的 span；字段与 OTel 数据模型一一对应"""
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "turn_id",
+        "start_ns", "end_ns", "attributes", "status", "error",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], turn_id: Optional[str]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.turn_id = turn_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "turn_id": self.turn_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": dict(self.attributes),
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+# =========================
+#  导出器
+# =========================
+class InMemoryExporter:
+    """进程内导出器：环形缓冲保存已结束的 span，供测试与 /admin/traces 查询"""
+
+    def __init__(self, max_spans: int = TRACE_BUFFER_SIZE):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None, turn_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        if turn_id:
+            spans = [s for s in spans if s.turn_id == turn_id]
+        return spans
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class ConsoleExporter:
+    """打印到标准输出，风格与项目其它 [TAG] 日志一致"""
+
+    def export(self, span: Span) -> None:
+        print(f"[TRACE] turn={span.turn_id} trace={span.trace_id[:8]} {span.name} "
+              f"{span.duration_ms:.1f}ms {span.status}")
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp_json(spans: List[Span]) -> Dict[str, Any]:
+    """把 span 列表编码为 OTLP/HTTP JSON（可直接 POST 给 OTel Collector）"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or "",
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                    "attributes": [
+                        {"key": k, "value": _otlp_value(v)}
+                        for k, v in {**s.attributes, "turn.id": s.turn_id or ""}.items()
+                    ],
+                    "status": {"code": 2, "message": s.error or ""} if s.status == "error" else {"code": 1},
+                } for s in spans],
+            }],
+        }],
+    }
+
+
+class OTLPHttpExporter:
+    """后台线程批量 POST 到 OTLP/HTTP 端点，不阻塞请求路径"""
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, batch_size: int = 256, interval: float = 2.0):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: Deque[Span] = deque(maxlen=10000)
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span: Span) -> None:
+        self._queue.append(span)
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def _run(self) -> None:
+        import requests
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            batch: List[Span] = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            if not batch:
+                continue
+            try:
+                requests.post(self.endpoint, json=to_otlp_json(batch), timeout=5)
+            except Exception as e:
+                print("[TRACE] OTLP 导出失败：", e)
+
+
+def _make_exporter(kind: str):
+    if kind == "console":
+        return ConsoleExporter()
+    if kind == "otlp":
+        return OTLPHttpExporter()
+    if kind in ("none", "off", "0"):
+        return None
+    return InMemoryExporter()
+
+
+_exporter = _make_exporter(TRACE_EXPORTER)
+
+
+def get_exporter():
+    return _exporter
+
+
+def set_exporter(exporter) -> None:
+    """替换导出器（测试中传入 InMemoryExporter()）"""
+    global _exporter
+    _exporter = exporter
+
+
+# =========================
+#  上下文
+# =========================
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_turn_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("turn_id", default=None)
+# 没有活动 span 时使用的远端父节点（来自入站 traceparent）
+_remote_parent: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("remote_parent", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_turn_id() -> Optional[str]:
+    return _turn_id.get()
+
+
+def trace_id_for_turn(turn_id: str) -> str:
+    """同一 turn id 的多个请求落在同一条 trace 上"""
+    return hashlib.md5(turn_id.encode("utf-8")).hexdigest()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple]:
+    m = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not m or m.group(1) == "0" * 32 or m.group(2) == "0" * 16:
+        return None
+    return m.group(1), m.group(2)
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def inject_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """给出站请求追加 traceparent / X-Turn-Id，原地修改并返回"""
+    span = current_span()
+    if span is not None:
+        headers["traceparent"] = format_traceparent(span)
+    turn = current_turn_id()
+    if turn:
+        headers["X-Turn-Id"] = turn
+    return headers
+
+
+@contextmanager
+def activate(traceparent: Optional[str] = None, turn_id: Optional[str] = None) -> Iterator[str]:
+    """入站请求入口：建立远端父节点与 turn id，产出本请求的 turn id"""
+    turn = (turn_id or "").strip()[:64] or uuid.uuid4().hex
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        parent = (trace_id_for_turn(turn), None)
+    t1 = _turn_id.set(turn)
+    t2 = _remote_parent.set(parent)
+    try:
+        yield turn
+    finally:
+        _remote_parent.reset(t2)
+        _turn_id.reset(t1)
+
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """创建 span 但不设为当前 span；用于跨 yield 的异步生成器，需配合 end_span()"""
+    parent = current_span()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        remote = _remote_parent.get()
+        if remote is not None:
+            trace_id, parent_id = remote
+        else:
+            trace_id, parent_id = uuid.uuid4().hex, None
+
+    s = Span(name, trace_id, parent_id, current_turn_id())
+    if attributes:
+        s.attributes.update(attributes)
+    return s
+
+
+def end_span(s: Span, error: Optional[BaseException] = None) -> None:
+    if error is not None:
+        s.status = "error"
+        s.error = f"{type(error).__name__}: {error}"[:300]
+    s.end_ns = time.time_ns()
+    exporter = _exporter
+    if exporter is not None:
+        exporter.export(s)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """开启一个子 span；异常会标记为 error 并继续抛出"""
+    s = start_span(name, **attributes)
+    token = _current_span.set(s)
+    error: Optional[BaseException] = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        end_span(s, error)
+
+
+def traced(name: str):
+    """装饰器版本，同时支持普通函数与协程函数"""
+    def deco(fn):
+        import asyncio
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def summarize(spans: List[Span]) -> Dict[str, Any]:
+    """按耗时排序并指出最慢阶段（根 span 除外）"""
+    ordered = sorted(spans, key=lambda s: s.start_ns)
+    stages = [s for s in ordered if s.parent_id is not None and not s.name.startswith("http ")]
+    slowest = max(stages, key=lambda s: s.duration_ms, default=None)
+    return {
+        "spans": [s.to_dict() for s in ordered],
+        "slowest_stage": slowest.to_dict() if slowest else None,
+    }
+
+
+# =========================
+#  ASGI 中间件
+# =========================
+class TracingMiddleware:
+    """为每个 HTTP 请求开根 span，并在响应头回写 traceparent / X-Turn-Id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        with activate(headers.get("traceparent"), headers.get(TURN_HEADER)) as turn:
+            with span(f"http {scope.get('method', '')} {scope.get('path', '')}") as root:
+                async def send_wrapper(message):
+                    if message["type"] == "http.response.start":
+                        root.set_attribute("http.status_code", message["status"])
+                        extra = [
+                            (b"traceparent", format_traceparent(root).encode("latin-1")),
+                            (b"x-turn-id", turn.encode("latin-1")),
+                        ]
+                        message = {**message, "headers": list(message.get("headers", [])) + extra}
+                    await send(message)
+
+                await self.app(scope, receive, send_wrapper)
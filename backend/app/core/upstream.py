@@ -0,0 +1,71 @@
+# backend/app/core/upstream.py
+"""
+上游 HTTP 连接池：所有对七牛网关 / deepseek 的调用共用一个 httpx.AsyncClient，
+复用 TCP/TLS 连接，避免每个请求都重新握手。
+
+环境变量：
+  UPSTREAM_MAX_CONNECTIONS=100
+  UPSTREAM_MAX_KEEPALIVE=20
+  UPSTREAM_KEEPALIVE_EXPIRY=30
+"""
+from __future__ import annotations
+import os
+import asyncio
+import weakref
+
+try:
+    import httpx
+except Exception:
+    httpx = None  # 便于无 httpx 环境下导入
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+
+# httpx.AsyncClient 绑定创建它的事件循环；测试里每个 TestClient 各有一个循环，所以按循环缓存
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _new_client() -> "httpx.AsyncClient":
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """返回当前事件循环上的共享客户端（懒创建）"""
+    if httpx is None:
+        raise RuntimeError("未安装 httpx，无法调用上游接口")
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _new_client()
+        _clients[loop] = client
+    return client
+
+
+async def open_http_client() -> None:
+    """启动时在线程里建好客户端：加载 CA 证书要上百毫秒，留到首个请求里做会卡住事件循环"""
+    if httpx is None:
+        return
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = await asyncio.to_thread(_new_client)
+        _clients.setdefault(loop, client)
+
+
+async def aclose_http_client() -> None:
+    """关闭当前事件循环上的共享客户端（应用关闭时调用）"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    client = _clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
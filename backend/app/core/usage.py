@@ -0,0 +1,367 @@
+# backend/app/core/usage.py
+"""
+用量计量：每次 LLM / TTS / ASR 上游调用的 token、合成字符与音频秒数，按维度汇总
+
+  - 维度：role、skill、session（会话 session_id / 场景 scene_id）、task、model、key（上游 key 标签）
+    role / skill / session 由路由用 scope(...) 设定（contextvar，随 task 传递）；task / model / key 由调用处给出
+  - 记录在请求路径上只做内存累加；后台协程每 USAGE_FLUSH_SECONDS 把增量按小时桶
+    累加写入 SQLite（usage 表，主键 bucket + dim + value）
+  - 会话预算：USAGE_SESSION_TOKEN_BUDGET / USAGE_SESSION_TTS_CHAR_BUDGET（0 为不限）；
+    超出后该会话的 LLM / TTS 调用抛 BudgetExceeded（路由返回 429 SESSION_BUDGET_EXCEEDED）。
+    会话累计值常驻内存（LRU，最多 USAGE_MAX_SESSIONS 个），未命中时 await check_budget() 在线程里
+    从库里取回（每个线程一个只读连接，WAL 下不等写入）
+  - 调参数据：按 task 统计平均 prompt / completion token、消息条数与被 max_tokens 截断的比例
+    （finish_reason=length），见 tuning() 与 /admin/usage
+  - 流式调用没拿到上游 usage（客户端中途断开）时按字符数估算，记 estimated
+  - 指标：usage_llm_tokens_total{task,kind}、usage_tts_chars_total、usage_audio_seconds_total{kind}、
+          llm_prompt_tokens / llm_completion_tokens{task}、llm_truncated_total{task}、
+          usage_budget_rejected_total{kind}
+
+环境变量：
+  USAGE=1
+  USAGE_DB=data/usage.db
+  USAGE_FLUSH_SECONDS=30
+  USAGE_SESSION_TOKEN_BUDGET=0
+  USAGE_SESSION_TTS_CHAR_BUDGET=0
+  USAGE_MAX_SESSIONS=10000
+"""
+from __future__ import annotations
+import os
+import time
+import logging
+import asyncio
+import sqlite3
+import pathlib
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .metrics import counter, histogram
+
+USAGE = os.getenv("USAGE", "1").strip().lower() not in ("0", "false", "off", "no")
+USAGE_DB = os.getenv("USAGE_DB", "data/usage.db")
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "30"))
+USAGE_SESSION_TOKEN_BUDGET = int(os.getenv("USAGE_SESSION_TOKEN_BUDGET", "0"))
+USAGE_SESSION_TTS_CHAR_BUDGET = int(os.getenv("USAGE_SESSION_TTS_CHAR_BUDGET", "0"))
+USAGE_MAX_SESSIONS = int(os.getenv("USAGE_MAX_SESSIONS", "10000"))
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+DIMENSIONS = ("role", "skill", "session", "task", "model", "key")
+FIELDS = ("llm_calls", "prompt_tokens", "completion_tokens", "messages", "truncated", "estimated",
+          "tts_calls", "tts_chars", "tts_seconds", "asr_calls", "asr_seconds")
+_INDEX = {f: i for i, f in enumerate(FIELDS)}
+
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+LLM_TOKENS = counter("usage_llm_tokens_total", "LLM 消耗的 token 数", ("task", "kind"))
+TTS_CHARS = counter("usage_tts_chars_total", "送去合成的字符数")
+AUDIO_SECONDS = counter("usage_audio_seconds_total", "合成 / 识别的音频秒数", ("kind",))
+PROMPT_TOKENS = histogram("llm_prompt_tokens", "每次 LLM 调用的 prompt token 数", ("task",), buckets=_TOKEN_BUCKETS)
+COMPLETION_TOKENS = histogram("llm_completion_tokens", "每次 LLM 调用的 completion token 数", ("task",),
+                              buckets=_TOKEN_BUCKETS)
+TRUNCATED = counter("llm_truncated_total", "被 max_tokens 截断的 LLM 回复数", ("task",))
+REJECTED = counter("usage_budget_rejected_total", "超出会话预算被拒绝的调用数", ("kind",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    bucket INTEGER NOT NULL,
+    dim TEXT NOT NULL,
+    value TEXT NOT NULL,
+    {columns},
+    PRIMARY KEY (bucket, dim, value)
+);
+CREATE INDEX IF NOT EXISTS usage_dim ON usage (dim, value);
+""".format(columns=",\n    ".join(f"{f} REAL NOT NULL DEFAULT 0" for f in FIELDS))
+
+_UPSERT = "INSERT INTO usage (bucket, dim, value, {cols}) VALUES (?, ?, ?, {marks}) " \
+          "ON CONFLICT (bucket, dim, value) DO UPDATE SET {sets}".format(
+              cols=", ".join(FIELDS), marks=", ".join("?" for _ in FIELDS),
+              sets=", ".join(f"{f} = {f} + excluded.{f}" for f in FIELDS))
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, session: str, kind: str, used: int, budget: int):
+        super().__init__(f"会话 {session} 的{'token' if kind == 'tokens' else '合成字符'}用量 {used} 已达预算 {budget}")
+        self.session = session
+        self.kind = kind
+        self.used = used
+        self.budget = budget
+
+    @property
+    def message(self) -> str:
+        return str(self)
+
+    def detail(self) -> Dict[str, Any]:
+        return {"error": "SESSION_BUDGET_EXCEEDED", "message": self.message,
+                "kind": self.kind, "used": self.used, "budget": self.budget}
+
+
+# ----- 归属（contextvar） -----
+Scope = Mapping[str, Optional[str]]
+_EMPTY: Scope = {}
+_scope: contextvars.ContextVar[Scope] = contextvars.ContextVar("usage_scope", default=_EMPTY)
+
+
+def current_scope() -> Scope:
+    return _scope.get()
+
+
+@contextmanager
+def scope(**dims: Optional[str]) -> Iterator[Scope]:
+    """设定当前上下文的 role / skill / session（None 的维度沿用外层）"""
+    merged = {**_scope.get(), **{k: v for k, v in dims.items() if v is not None}}
+    token = _scope.set(merged)
+    try:
+        yield merged
+    finally:
+        _scope.reset(token)
+
+
+class UsageMeter:
+    def __init__(self, path: str = USAGE_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, str, str], List[float]] = {}
+        # 会话累计 [tokens, tts_chars]，用于预算
+        self._sessions: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._readers = threading.local()
+        # flush 换出增量时 +1、写完后再 +1（奇数 = 正在写）；取回会话累计时据此判断是否与写入交错
+        self._flushes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # ----- 连接 -----
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _read(self, sql: str, args=()) -> List[sqlite3.Row]:
+        """只读查询：每个线程一个连接，不占写入锁（WAL 下读写互不阻塞）"""
+        if self.path == ":memory:":
+            with self._lock:
+                return self._db().execute(sql, args).fetchall()
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            self._db()   # 建表
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._readers.conn = conn
+        return conn.execute(sql, args).fetchall()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ----- 累加（请求路径：只动内存） -----
+    def _add(self, dims: Mapping[str, Optional[str]], **values: float) -> None:
+        if not self.running:
+            return
+        bucket = int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS
+        for dim in DIMENSIONS:
+            value = dims.get(dim)
+            if not value:
+                continue
+            row = self._pending.get((bucket, dim, value))
+            if row is None:
+                row = self._pending[(bucket, dim, value)] = [0.0] * len(FIELDS)
+            for name, amount in values.items():
+                row[_INDEX[name]] += amount
+        # 总计行（dim=all）便于对账
+        row = self._pending.setdefault((bucket, "all", "all"), [0.0] * len(FIELDS))
+        for name, amount in values.items():
+            row[_INDEX[name]] += amount
+
+    def _cached(self, session: str) -> Optional[List[int]]:
+        totals = self._sessions.get(session)
+        if totals is not None:
+            self._sessions.move_to_end(session)
+        return totals
+
+    def _read_session(self, session: str) -> Tuple[int, int]:
+        """库里的会话累计（同步，放在线程里调用）"""
+        try:
+            rows = self._read("SELECT SUM(prompt_tokens + completion_tokens) AS tokens, SUM(tts_chars) AS chars "
+                              "FROM usage WHERE dim = 'session' AND value = ?", (session,))
+        except sqlite3.Error as e:
+            logger.warning("读取会话 %s 用量失败: %s", session, e)
+            return 0, 0
+        row = rows[0] if rows else None
+        return (int(row["tokens"] or 0), int(row["chars"] or 0)) if row else (0, 0)
+
+    async def _session(self, session: str) -> List[int]:
+        """会话累计 [tokens, tts_chars]；内存里没有的（重启后 / 被挤出）：库里的累计 + 尚未写入的增量"""
+        totals = self._cached(session)
+        if totals is not None:
+            return totals
+        while True:
+            flushes = self._flushes
+            tokens, chars = await asyncio.to_thread(self._read_session, session) if self.running else (0, 0)
+            totals = self._cached(session)   # 等待期间别的请求已经取回
+            if totals is not None:
+                return totals
+            # 读库期间有增量被换出写库：读到的可能不含它们，重读
+            if flushes == self._flushes and not flushes % 2:
+                break
+        for (_, dim, value), pending in self._pending.items():
+            if dim == "session" and value == session:
+                tokens += int(pending[_INDEX["prompt_tokens"]] + pending[_INDEX["completion_tokens"]])
+                chars += int(pending[_INDEX["tts_chars"]])
+        totals = self._sessions[session] = [tokens, chars]
+        while len(self._sessions) > USAGE_MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+        return totals
+
+    async def check_budget(self, kind: str = "tokens", dims: Optional[Scope] = None) -> None:
+        """当前会话超出预算时抛 BudgetExceeded（kind=tokens / tts_chars；没有会话或未设预算时不检查）"""
+        budget = USAGE_SESSION_TOKEN_BUDGET if kind == "tokens" else USAGE_SESSION_TTS_CHAR_BUDGET
+        session = (dims if dims is not None else _scope.get()).get("session")
+        if budget <= 0 or not session:
+            return
+        used = (await self._session(session))[0 if kind == "tokens" else 1]
+        if used >= budget:
+            REJECTED.inc(kind=kind)
+            raise BudgetExceeded(session, kind, used, budget)
+
+    def record_llm(self, task: str, model: str, usage: Mapping[str, Any], messages: List[Dict],
+                   text: str = "", finish_reason: Optional[str] = None, key: Optional[str] = None,
+                   dims: Optional[Scope] = None) -> None:
+        dims = dims if dims is not None else _scope.get()
+        estimated = not usage
+        if estimated:
+            usage = {"prompt_tokens": sum(len(m.get("content") or "") for m in messages),
+                     "completion_tokens": len(text)}
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        truncated = finish_reason == "length"
+        # 只更新内存里已有的会话累计；不在内存的，下次取回时会把这次的增量一起算上
+        totals = self._cached(dims["session"]) if dims.get("session") else None
+        self._add({**dims, "task": task, "model": model, "key": key}, llm_calls=1, prompt_tokens=prompt,
+                  completion_tokens=completion, messages=len(messages), truncated=int(truncated),
+                  estimated=int(estimated))
+        LLM_TOKENS.inc(prompt, task=task, kind="prompt")
+        LLM_TOKENS.inc(completion, task=task, kind="completion")
+        PROMPT_TOKENS.observe(prompt, task=task)
+        COMPLETION_TOKENS.observe(completion, task=task)
+        if truncated:
+            TRUNCATED.inc(task=task)
+        if totals is not None:
+            totals[0] += prompt + completion
+
+    def record_tts(self, chars: int, audio_seconds: float = 0.0, key: Optional[str] = None) -> None:
+        dims = _scope.get()
+        totals = self._cached(dims["session"]) if dims.get("session") else None
+        self._add({**dims, "task": "tts", "key": key}, tts_calls=1, tts_chars=chars, tts_seconds=audio_seconds)
+        TTS_CHARS.inc(chars)
+        AUDIO_SECONDS.inc(audio_seconds, kind="tts")
+        if totals is not None:
+            totals[1] += chars
+
+    def record_asr(self, audio_seconds: float, key: Optional[str] = None) -> None:
+        self._add({**_scope.get(), "task": "asr", "key": key}, asr_calls=1, asr_seconds=audio_seconds)
+        AUDIO_SECONDS.inc(audio_seconds, kind="asr")
+
+    async def session_usage(self, session: str) -> Dict[str, int]:
+        tokens, chars = await self._session(session)
+        return {"tokens": tokens, "tts_chars": chars,
+                "token_budget": USAGE_SESSION_TOKEN_BUDGET, "tts_char_budget": USAGE_SESSION_TTS_CHAR_BUDGET}
+
+    # ----- 落库 -----
+    def _write(self, pending: Dict[Tuple[int, str, str], List[float]]) -> None:
+        rows = [(bucket, dim, value, *values) for (bucket, dim, value), values in pending.items()]
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(_UPSERT, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._flushes += 1
+            try:
+                await asyncio.to_thread(self._write, pending)
+            except sqlite3.Error:
+                # 写失败：增量放回去，下次再写
+                for k, values in pending.items():
+                    row = self._pending.setdefault(k, [0.0] * len(FIELDS))
+                    for i, v in enumerate(values):
+                        row[i] += v
+                raise
+            finally:
+                self._flushes += 1
+        return len(pending)
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.warning("用量写入失败: %s", e)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        await asyncio.to_thread(self._db)
+        self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except sqlite3.Error as e:
+            logger.warning("停机时用量写入失败: %s", e)
+
+    # ----- 查询 -----
+    def summary(self, dim: str = "role", hours: float = 24, limit: int = 50) -> List[Dict]:
+        """某个维度最近 hours 小时的汇总，按 token 总数从高到低"""
+        since = int(time.time() - hours * 3600) // BUCKET_SECONDS * BUCKET_SECONDS
+        sums = ", ".join(f"SUM({f}) AS {f}" for f in FIELDS)
+        rows = self._read(f"SELECT value, {sums} FROM usage WHERE dim = ? AND bucket >= ? GROUP BY value "
+                          "ORDER BY SUM(prompt_tokens + completion_tokens) DESC, SUM(tts_chars) DESC LIMIT ?",
+                          (dim, since, limit))
+        return [{"value": r["value"], **{f: round(r[f], 2) if f.endswith("seconds") else int(r[f]) for f in FIELDS}}
+                for r in rows]
+
+    def tuning(self, hours: float = 24) -> Dict[str, Dict]:
+        """按 task：平均 prompt / completion token、平均消息条数、截断率（调 max_tokens 与历史窗口用）"""
+        out = {}
+        for row in self.summary("task", hours, limit=100):
+            calls = row["llm_calls"]
+            if not calls:
+                continue
+            out[row["value"]] = {
+                "calls": calls,
+                "avg_prompt_tokens": round(row["prompt_tokens"] / calls, 1),
+                "avg_completion_tokens": round(row["completion_tokens"] / calls, 1),
+                "avg_messages": round(row["messages"] / calls, 1),
+                "prompt_tokens_per_message": round(row["prompt_tokens"] / max(1, row["messages"]), 1),
+                "truncated_rate": round(row["truncated"] / calls, 4),
+                "estimated_rate": round(row["estimated"] / calls, 4),
+            }
+        return out
+
+
+usage_meter = UsageMeter()
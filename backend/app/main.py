@@ -3,18 +3,76 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from pathlib import Path
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse  # 需要用到测试页面
+import asyncio
 
 from .api.routes_chat import router as chat_router
 from .api.routes_audio import router as audio_router
 from .api.routes_eval import router as eval_router
 from .api.routes_roles import router as roles_router   # 若没有该文件，可先注释掉
-from .core.config import USE_OPENAI, OPENAI_BASE_URL
+from .api.routes_admin import router as admin_router
+from .api.routes_media import router as media_router
+from .api.routes_jobs import router as jobs_router
+from .api.routes_static import router as static_router
+from .api.routes_scene import router as scene_router
+from .core.config import USE_OPENAI, OPENAI_BASE_URL, LLM_PROVIDER, LLM_MODEL_ROUTES
+from .core.responses import TracedJSONResponse
+from .core.cancellation import RequestScopeMiddleware
+from .core.conversation_log import CONVLOG, conversation_log
+from .core.compression import COMPRESS, CompressionMiddleware
+from .core.profiler import PROFILER, ProfilerMiddleware
+from .core.jobs import JOBS_WORKERS, start_workers, stop_workers
+from .core.loop_monitor import LOOP_MONITOR, loop_monitor
+from .core.tracing import TracingMiddleware
+from .core.usage import USAGE, usage_meter
+from .core.upstream import aclose_http_client, open_http_client
+from .services import audio_cache, static_assets
+from .services.storage import get_store
+from .services.warmup import TTS_WARMUP, start_background_warmup, stop_background_warmup
+from .presets.registry import ROLE_REGISTRY_POLL, watch_registry
 
-app = FastAPI(title="AI 角色扮演平台 - 后端")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 事件循环延迟 / 阻塞检测
+    if LOOP_MONITOR:
+        loop_monitor.start()
+    await open_http_client()
+    # 对话日志（后台批量写入）；上次停机时的会话快照在被访问到时才取回
+    if CONVLOG:
+        await conversation_log.start()
+    # 用量计量（内存累加，定期按小时桶写库）
+    if USAGE:
+        await usage_meter.start()
+    # 测试页面等静态资源：算哈希并预压缩（最高压缩级别，放在线程里）
+    await asyncio.to_thread(static_assets.registry.load_all)
+    # 列举已缓存的 TTS 音频（S3 下是网络请求，放在线程里；之后的 lookup 只查内存）
+    await asyncio.to_thread(audio_cache.warm)
+    # 后台预热预置角色的问候语 / 技能示例语音，不阻塞启动
+    if TTS_WARMUP:
+        start_background_warmup()
+    # 角色数据热更新（ROLE_REGISTRY_POLL>0 时轮询 presets/data）
+    watcher = asyncio.create_task(watch_registry(ROLE_REGISTRY_POLL)) if ROLE_REGISTRY_POLL > 0 else None
+    # 后台任务 worker（ASR / 批量 TTS / 评测；JOBS_WORKERS=0 时本进程只提交不执行）
+    start_workers(JOBS_WORKERS)
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    # 执行中的任务不改状态，租约过期后由其他进程或下次启动继续
+    await stop_workers()
+    await stop_background_warmup()
+    # 写完对话日志并给内存里的会话 / 场景存快照
+    await conversation_log.stop()
+    await usage_meter.stop()
+    # 关闭上游连接池
+    await aclose_http_client()
+    await loop_monitor.stop()
+
+
+app = FastAPI(title="AI 角色扮演平台 - 后端", default_response_class=TracedJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,7 +80,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Turn-Id"],
 )
+# 按需采样剖析（请求带 X-Profile 时才工作）
+if PROFILER:
+    app.add_middleware(ProfilerMiddleware)
+# 客户端断开 / 超过截止时间时取消请求处理（及其上游调用）
+app.add_middleware(RequestScopeMiddleware, exclude_prefixes=("/static", "/media", "/v1/jobs"))
+# 大 JSON / 文本响应按 Accept-Encoding 压缩（流式与已压缩的响应透传）
+if COMPRESS:
+    app.add_middleware(CompressionMiddleware)
+# 链路追踪放在最外层，CORS 预检等也有根 span
+app.add_middleware(TracingMiddleware)
 
 # ----- 挂载静态目录 -----
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -37,20 +106,19 @@ def healthz():
         "ok": True,
         "use_openai": USE_OPENAI,
         "base_url": OPENAI_BASE_URL or "official",
+        "llm_provider": LLM_PROVIDER,
+        "llm_models": LLM_MODEL_ROUTES,
         "static_dir": str(STATIC_DIR),
+        "storage_backend": get_store().name,
     }
 
-# 可选：两个简单的静态测试页（没有文件也不影响后端接口）
-@app.get("/asr-test")
-async def asr_test_page():
-    return FileResponse(STATIC_DIR / "asr-test.html")
-
-@app.get("/roleplay")
-async def roleplay_page():
-    return FileResponse(STATIC_DIR / "roleplay.html")
-
 # ----- 路由 -----
 app.include_router(chat_router)
 app.include_router(audio_router)
 app.include_router(eval_router)
 app.include_router(roles_router)  # 若没有 routes_roles.py，可注释掉
+app.include_router(admin_router)
+app.include_router(media_router)
+app.include_router(jobs_router)
+app.include_router(static_router)
+app.include_router(scene_router)
@@ -29,6 +29,23 @@ class TTSReq(BaseModel):
 class TTSResp(BaseModel):
     audio_b64: str
 
+class BulkTTSReq(BaseModel):
+    items: List[dict]               # {"id", "text", "role" | "voice", "speed"}
+    concurrency: Optional[int] = None
+
+class TTSJoinReq(BaseModel):
+    keys: List[str] = []            # 音频缓存 key（tts_key）
+    audio_urls: List[str] = []      # 或者本服务返回的 audio_url
+
+class SceneStartReq(BaseModel):
+    characters: List[str]           # 角色名 / id / 别名
+    memory_limit: int = 8           # 保留的轮数
+
+class SceneChatReq(BaseModel):
+    message: str
+    characters: List[str] = []      # 本轮只让其中几位发言；空表示全部
+    tts: bool = True                # 是否逐句合成语音
+
 class EvalReq(BaseModel):
     role_name: str
     cases: List[str]
@@ -0,0 +1,207 @@
+# app/presets/registry.py
+"""
+角色注册表：唯一的角色数据来源
+
+  - 数据：presets/data/<id>.json（一个角色一个文件，新增角色只需加文件）
+  - 加载后编译为不可变结构：slots 冻结记录 + intern 字符串，按 id / 名称 / 别名 O(1) 查找
+  - 热更新：reload_registry() 重新读取并整体替换（读方拿到的始终是完整的一版）；
+    ROLE_REGISTRY_POLL>0 时后台按间隔检查文件变化自动重载，请求路径上没有额外开销
+
+环境变量：
+  ROLE_DATA_DIR=app/presets/data
+  ROLE_REGISTRY_POLL=0          # 秒；0 关闭自动重载（仍可 POST /admin/roles/reload）
+"""
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import pathlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+ROLE_DATA_DIR = pathlib.Path(os.getenv("ROLE_DATA_DIR") or pathlib.Path(__file__).resolve().parent / "data")
+ROLE_REGISTRY_POLL = float(os.getenv("ROLE_REGISTRY_POLL", "0"))
+
+DEFAULT_VOICE = "qiniu_zh_female_wwxkjx"
+
+_SEP_RE = re.compile(r"[·•・\s\._．-]+")
+
+
+def norm_key(name: str) -> str:
+    """规范化角色名：去空白/中点/下划线/点号，统一小写"""
+    return _SEP_RE.sub("", (name or "").strip().lower())
+
+
+@dataclass(frozen=True, slots=True)
+class SkillRecord:
+    name: str
+    description: str
+    example: str
+
+
+@dataclass(frozen=True, slots=True)
+class RoleRecord:
+    id: str
+    order: int
+    name: str                   # 接口里使用的角色名（如“哈利波特”）
+    display_name: str           # 展示用全名（如“哈利·波特”）
+    aliases: Tuple[str, ...]
+    description: str
+    avatar: str
+    voice: str                  # 前端朗读使用的音色
+    tts_voice: str              # services.tts.pick_voice 使用的七牛音色
+    personality: str
+    background: str
+    speaking_style: str
+    system_prompt: str
+    taboo: Tuple[str, ...]      # 角色不该说的词（services.persona_guard 在流式输出上拦截）
+    skills: Tuple[SkillRecord, ...]
+    listed: bool                # False：只用于搜索/选音，不出现在角色列表
+    search_keys: Tuple[str, ...]
+
+    @property
+    def skill_names(self) -> Tuple[str, ...]:
+        return tuple(s.name for s in self.skills)
+
+    def skill(self, name: str) -> Optional[SkillRecord]:
+        return next((s for s in self.skills if s.name == name), None)
+
+    def to_dict(self) -> Dict:
+        """预置角色卡字典（build_role_card 的返回格式，每次返回新对象）"""
+        return {
+            "id": self.id,
+            "name": self.display_name,
+            "description": self.description,
+            "avatar": self.avatar,
+            "voice": self.voice,
+            "personality": self.personality,
+            "background": self.background,
+            "speaking_style": self.speaking_style,
+            "skills": list(self.skill_names),
+            "system_prompt": self.system_prompt,
+            "taboo": list(self.taboo),
+            "skill_examples": {s.name: s.example for s in self.skills},
+        }
+
+
+_i = sys.intern
+
+
+def _record_from_json(data: Dict) -> RoleRecord:
+    rid = data.get("id")
+    name = data.get("name")
+    if not rid or not name:
+        raise ValueError("角色数据缺少 id 或 name")
+    aliases = tuple(dict.fromkeys(_i(a) for a in [*data.get("aliases", []), name]))
+    skills = tuple(
+        SkillRecord(_i(s["name"]), s.get("description", ""), s.get("example", ""))
+        for s in data.get("skills", [])
+    )
+    return RoleRecord(
+        id=_i(rid),
+        order=int(data.get("order", 0)),
+        name=_i(name),
+        display_name=_i(data.get("display_name") or name),
+        aliases=aliases,
+        description=data.get("description") or f"{name}是一位充满智慧的历史人物",
+        avatar=data.get("avatar") or "🎭",
+        voice=_i(data.get("voice") or DEFAULT_VOICE),
+        tts_voice=_i(data.get("tts_voice") or ""),
+        personality=data.get("personality") or f"拥有{name}独特的智慧和魅力",
+        background=data.get("background", ""),
+        speaking_style=data.get("speaking_style", ""),
+        system_prompt=data.get("system_prompt") or f"你是{name}，请以这个角色的身份回答问题。",
+        taboo=tuple(dict.fromkeys(_i(t) for t in data.get("taboo", []) if t.strip())),
+        skills=skills,
+        listed=bool(data.get("listed", True)),
+        search_keys=tuple(dict.fromkeys(_i(norm_key(a)) for a in (name, *aliases) if norm_key(a))),
+    )
+
+
+class RoleRegistry:
+    """一次加载的完整快照；构建后不再修改"""
+    __slots__ = ("roles", "listed_roles", "_index", "signature", "loaded_at")
+
+    def __init__(self, roles: Tuple[RoleRecord, ...], signature: Tuple = ()):
+        self.roles = tuple(sorted(roles, key=lambda r: (r.order, r.id)))
+        self.listed_roles = tuple(r for r in self.roles if r.listed)
+        index: Dict[str, RoleRecord] = {}
+        for r in self.roles:
+            for key in (r.id, r.name, *r.aliases):
+                for k in {key, norm_key(key)}:
+                    other = index.get(k)
+                    if other is not None and other is not r:
+                        raise ValueError(f"角色键冲突: {k!r} 同时属于 {other.id} 与 {r.id}")
+                    index[_i(k)] = r
+        self._index = index
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    def get(self, key: Optional[str]) -> Optional[RoleRecord]:
+        """按 id / 名称 / 别名查找（先原样，再规范化）"""
+        if not key:
+            return None
+        return self._index.get(key) or self._index.get(norm_key(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[RoleRecord]:
+        return iter(self.roles)
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+
+def _signature(data_dir: pathlib.Path) -> Tuple:
+    return tuple(sorted((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in data_dir.glob("*.json")))
+
+
+def load_registry(data_dir: pathlib.Path = ROLE_DATA_DIR) -> RoleRegistry:
+    sig = _signature(data_dir)
+    roles = []
+    for path in sorted(data_dir.glob("*.json")):
+        try:
+            roles.append(_record_from_json(json.loads(path.read_text(encoding="utf-8"))))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"{path.name}: {e}") from e
+    return RoleRegistry(tuple(roles), sig)
+
+
+_registry: RoleRegistry = load_registry()
+
+
+def get_registry() -> RoleRegistry:
+    return _registry
+
+
+def get_role(key: Optional[str]) -> Optional[RoleRecord]:
+    return _registry.get(key)
+
+
+def reload_registry(force: bool = False) -> bool:
+    """文件有变化（或 force）时重新加载并整体替换；数据有误（ValueError）或读取失败时保留旧版本并抛出"""
+    global _registry
+    if not force and _signature(ROLE_DATA_DIR) == _registry.signature:
+        return False
+    _registry = load_registry()
+    print(f"[ROLES] 已重新加载 {len(_registry)} 个角色")
+    return True
+
+
+async def watch_registry(interval: float = ROLE_REGISTRY_POLL) -> None:
+    """后台轮询数据目录，变化时热更新；任何加载错误都保留旧数据并继续轮询（同一错误只打印一次）"""
+    last_error = None
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(reload_registry)
+            last_error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != last_error:
+                print(f"[ROLES] 重新加载失败，继续使用旧数据：{error}")
+            last_error = error
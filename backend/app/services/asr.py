@@ -1,13 +1,21 @@
-import io
-from ..core.config import USE_OPENAI, get_openai_client
+from ..core.config import OPENAI_BASE_URL
+from ..core.cancellation import upstream_timeout
+from ..core.keypool import key_pool, has_keys
+from ..core.tracing import span
 
 async def transcribe(wav_bytes: bytes) -> str:
-    if USE_OPENAI:
+    if has_keys():
         try:
-            client = get_openai_client()
-            f = io.BytesIO(wav_bytes); f.name = "audio.wav"
-            r = client.audio.transcriptions.create(model="whisper-1", file=f)
-            return r.text
+            # 走共享异步连接池：请求被取消（客户端断开 / 超时）时上游调用随之中止
+            with span("upstream.whisper", bytes=len(wav_bytes)):
+                resp = await key_pool.request(
+                    "POST", "/audio/transcriptions", OPENAI_BASE_URL,
+                    data={"model": "whisper-1"},
+                    files={"file": ("audio.wav", wav_bytes, "audio/wav")},
+                    timeout=upstream_timeout(60),
+                )
+            resp.raise_for_status()
+            return resp.json().get("text", "")
         except Exception as e:
             print("[WARN] Whisper 失败：", e)
     return "请用哈利波特的口吻教我一个咒语"
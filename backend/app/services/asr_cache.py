@@ -0,0 +1,206 @@
+# backend/app/services/asr_cache.py
+"""
+ASR 上传去重 + 识别结果缓存
+
+  - 上传按内容寻址：key = sha256(音频) 前 32 位 → 对象存储 uploads/<key>.<格式>，同一段音频只写一次
+  - 识别结果按 (key, language) 缓存（LRU + TTL），重复音频不再调用上游 ASR
+  - 上传对象的进程内引用计数（upload_refs）：请求失败 / 断开时，只有本次新写入、没有其他请求引用、
+    没有进行中的识别且未交给后台任务时才删除；删除在线程里执行，期间同内容的新上传会等它删完再写
+  - 同一段音频的并发请求（浏览器重试）共享一次上游调用：上游调用跑在独立的 task 里，不属于任何一个请求；
+    发起它的请求断开不影响其他等待者，最后一个等待者离开时才取消
+  - 指标：asr_cache_requests_total{result=hit|miss|shared}、asr_uploads_total{result=written|deduplicated}
+
+环境变量：
+  ASR_CACHE_TTL=86400
+  ASR_CACHE_MAX_ENTRIES=2000
+"""
+from __future__ import annotations
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.metrics import counter
+from .storage import get_store
+
+ASR_CACHE_TTL = float(os.getenv("ASR_CACHE_TTL", "86400"))
+ASR_CACHE_MAX_ENTRIES = int(os.getenv("ASR_CACHE_MAX_ENTRIES", "2000"))
+
+
+ASR_CACHE_REQUESTS = counter("asr_cache_requests_total", "ASR 识别结果缓存查询次数", ("result",))
+ASR_UPLOADS = counter("asr_uploads_total", "ASR 上传落盘次数", ("result",))
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def upload_url(object_key: str) -> str:
+    return get_store().url(object_key)
+
+
+def store_upload(data: bytes, audio_format: str, key: Optional[str] = None) -> Tuple[str, str, bool]:
+    """按内容写入存储，返回 (key, 对象 key, 是否新写入)；已存在相同内容时不再写（同步，S3 下请放线程池）"""
+    key = key or content_key(data)
+    object_key = f"uploads/{key}.{audio_format}"
+    store = get_store()
+    if store.exists(object_key):
+        ASR_UPLOADS.inc(result="deduplicated")
+        return key, object_key, False
+    store.put(object_key, data)
+    ASR_UPLOADS.inc(result="written")
+    return key, object_key, True
+
+
+class _Flight:
+    """一次进行中的上游识别及其等待者数"""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[dict]"):
+        self.task = task
+        self.waiters = 0
+
+
+class TranscriptCache:
+    """(音频 key, language) -> 上游 ASR 原始结果"""
+
+    def __init__(self, max_entries: int = ASR_CACHE_MAX_ENTRIES, ttl: float = ASR_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, language: str) -> Optional[dict]:
+        with self._lock:
+            item = self._entries.get((key, language))
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._entries[(key, language)]
+                return None
+            self._entries.move_to_end((key, language))
+            return item[1]
+
+    def put(self, key: str, language: str, result: dict) -> None:
+        with self._lock:
+            self._entries[(key, language)] = (time.time() + self.ttl, result)
+            self._entries.move_to_end((key, language))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _compute(self, flight_key: Tuple[str, str], compute: Callable[[], Awaitable[dict]]) -> dict:
+        try:
+            result = await compute()
+            self.put(*flight_key, result)
+            return result
+        finally:
+            flight = self._inflight.get(flight_key)
+            if flight is not None and flight.task is asyncio.current_task():
+                del self._inflight[flight_key]
+
+    async def get_or_compute(self, key: str, language: str,
+                             compute: Callable[[], Awaitable[dict]]) -> Tuple[dict, bool]:
+        """返回 (识别结果, 是否来自缓存)；同 key 的并发请求只有一个真正调用 compute"""
+        cached = self.get(key, language)
+        if cached is not None:
+            ASR_CACHE_REQUESTS.inc(result="hit")
+            return cached, True
+
+        flight_key = (key, language)
+        flight = self._inflight.get(flight_key)
+        shared = flight is not None
+        if flight is None:
+            ASR_CACHE_REQUESTS.inc(result="miss")
+            flight = self._inflight[flight_key] = _Flight(asyncio.ensure_future(self._compute(flight_key, compute)))
+        else:
+            ASR_CACHE_REQUESTS.inc(result="shared")
+
+        flight.waiters += 1
+        try:
+            # shield：某个等待者断开不取消共享的那次上游调用
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # 最后一个等待者也走了：取消上游调用，之后的新请求重新发起
+                if self._inflight.get(flight_key) is flight:
+                    del self._inflight[flight_key]
+                flight.task.cancel()
+
+    def busy(self, key: str) -> bool:
+        """这段音频（任意 language）是否有进行中的上游识别"""
+        return any(k[0] == key for k in self._inflight)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._entries)
+            self._entries.clear()
+            return n
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "requests": ASR_CACHE_REQUESTS.snapshot(), "uploads": ASR_UPLOADS.snapshot()}
+
+
+transcript_cache = TranscriptCache()
+
+
+class UploadRefs:
+    """上传对象的引用计数（只在事件循环上调用）"""
+
+    def __init__(self, keep_max: int = ASR_CACHE_MAX_ENTRIES):
+        self.keep_max = keep_max
+        self._refs: Dict[str, int] = {}
+        self._deleting: Dict[str, asyncio.Future] = {}
+        self._kept: "OrderedDict[str, None]" = OrderedDict()
+
+    async def save(self, data: bytes, audio_format: str) -> Tuple[str, str, bool]:
+        """store_upload 的异步版本，并记一次引用；之后必须调用 release()"""
+        key = await asyncio.to_thread(content_key, data)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        try:
+            pending = self._deleting.get(key)
+            if pending is not None:
+                await asyncio.wait({pending})
+            return await asyncio.to_thread(store_upload, data, audio_format, key)
+        except BaseException:
+            self._unref(key)
+            raise
+
+    def keep(self, key: str) -> None:
+        """交给后台任务等稍后还要用的对象：本进程内不再删除"""
+        self._kept[key] = None
+        self._kept.move_to_end(key)
+        while len(self._kept) > self.keep_max:
+            self._kept.popitem(last=False)
+
+    def _unref(self, key: str) -> None:
+        n = self._refs.get(key, 0) - 1
+        if n > 0:
+            self._refs[key] = n
+        else:
+            self._refs.pop(key, None)
+
+    def release(self, key: str, object_key: str, written: bool, failed: bool) -> None:
+        """释放引用；失败且满足删除条件时在线程里删除对象（不等待）"""
+        self._unref(key)
+        if not (failed and written) or key in self._refs or key in self._kept or transcript_cache.busy(key):
+            return
+        task = asyncio.ensure_future(asyncio.to_thread(get_store().delete, object_key))
+        self._deleting[key] = task
+        task.add_done_callback(partial(self._deleted, key))
+
+    def _deleted(self, key: str, task: asyncio.Future) -> None:
+        if self._deleting.get(key) is task:
+            del self._deleting[key]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[ASR] 清理上传文件失败: {task.exception()}")
+
+
+upload_refs = UploadRefs()
@@ -0,0 +1,76 @@
+# backend/app/services/audio_cache.py
+"""
+TTS 音频缓存：同一 (文本, 音色, 语速) 只合成一次
+
+  key = sha256(voice | speed | text) 前 32 位 → 对象存储 audio/<key>.mp3（见 services/storage.py）
+  - lookup(key) 命中返回可播放 URL，不访问上游
+  - store(key, mp3_bytes) 写入存储并返回 URL
+  - 进程内记录已知 key，避免每次访问存储；本地存储命中时顺带校验文件仍在
+  - 已知 key 来自一次列举 audio/（S3 下是多次网络请求）：warm() 在启动时放到线程里跑，
+    事件循环上的 lookup() 不再触发列举；没预热过的进程（脚本）在第一次 lookup 时同步列举
+"""
+from __future__ import annotations
+import hashlib
+import threading
+from typing import Optional, Set
+
+from .storage import get_store
+
+_known: Set[str] = set()
+_scanned = False
+_lock = threading.Lock()
+
+
+def tts_key(text: str, voice: str, speed: float) -> str:
+    raw = f"{voice}|{float(speed):.2f}|{text}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def object_key(key: str) -> str:
+    return f"audio/{key}.mp3"
+
+
+def url_for(key: str) -> str:
+    return get_store().url(object_key(key))
+
+
+def warm() -> None:
+    """列举存储里已有的音频（同步；异步代码里用 asyncio.to_thread(warm)），已列举过时直接返回"""
+    global _scanned
+    with _lock:
+        if _scanned:
+            return
+        for info in get_store().list("audio/"):
+            stem = info.key.rsplit("/", 1)[-1][:-4] if info.key.endswith(".mp3") else ""
+            if len(stem) == 32:
+                _known.add(stem)
+        _scanned = True
+
+
+def lookup(key: str) -> Optional[str]:
+    if not _scanned:
+        warm()
+    if key in _known:
+        store_ = get_store()
+        if not store_.cheap_exists or store_.exists(object_key(key)):
+            return url_for(key)
+        _known.discard(key)   # 被 /v1/cleanup 等外部删除
+    return None
+
+
+def read(key: str) -> Optional[bytes]:
+    return get_store().get(object_key(key))
+
+
+def store(key: str, audio: bytes) -> str:
+    get_store().put(object_key(key), audio, "audio/mpeg")
+    _known.add(key)
+    return url_for(key)
+
+
+def reset() -> None:
+    """切换存储后端后清空已知 key"""
+    global _scanned
+    with _lock:
+        _known.clear()
+        _scanned = False
@@ -0,0 +1,253 @@
+# backend/app/services/bulk_tts.py
+"""
+批量 TTS：课程内容成千上万句台词一次性预合成
+
+输入 JSONL，每行一个条目：
+  {"id": "l1-003", "text": "……", "role": "孔子"}               # 按角色选音色
+  {"text": "……", "voice": "qiniu_zh_female_wwxkjx", "speed": 1.1}   # 直接指定音色
+  id 缺省为行号；speed 缺省 1.0
+  text 先按 tts.synthesize 的方式规范化（tts_text.normalize，截到 800 字）再算缓存 key，与在线合成共用缓存
+
+  - 去重：(文本, 音色, 语速) 相同的行只合成一次，其余标记 duplicate，共用同一个音频 URL
+  - 续跑：结果写入音频缓存（内容寻址），中断后重跑命中缓存直接跳过；
+          指定 manifest 时已记录为成功的行不再查询
+  - 限流：并发上限默认 BULK_TTS_CONCURRENCY_PER_KEY × key 数；全部 key 冷却时先等到最早恢复的那个，
+          429 / 5xx 按 Retry-After（或指数退避）重试，最多 BULK_TTS_RETRIES 次
+  - manifest：每个输入行一条 JSON（id、key、voice、speed、audio_url、status、error），边合成边追加
+
+后台任务：POST /v1/tts/bulk/jobs 提交（kind=tts_bulk，不受 BULK_TTS_MAX_ITEMS 限制），进度按唯一条目计
+
+命令行：
+  python -m app.services.bulk_tts lines.jsonl --manifest manifest.jsonl --concurrency 8
+
+环境变量：
+  BULK_TTS_CONCURRENCY_PER_KEY=4
+  BULK_TTS_RETRIES=4
+  BULK_TTS_MAX_ITEMS=50           # /v1/tts/bulk 同步接口单次上限（须在请求截止时间 REQUEST_TIMEOUT 内合成完）
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import base64
+import time
+import random
+import asyncio
+import pathlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+if __name__ == "__main__":
+    # 命令行运行时先加载 .env，下面的模块在导入时读取配置
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from ..core import jobs
+from ..core.keypool import key_pool, has_keys
+from ..core.metrics import counter
+from ..core.tracing import span
+from . import audio_cache, tts
+from .tts_text import normalize as normalize_text
+
+BULK_TTS_CONCURRENCY_PER_KEY = int(os.getenv("BULK_TTS_CONCURRENCY_PER_KEY", "4"))
+BULK_TTS_RETRIES = int(os.getenv("BULK_TTS_RETRIES", "4"))
+BULK_TTS_MAX_ITEMS = int(os.getenv("BULK_TTS_MAX_ITEMS", "50"))
+DEFAULT_SPEED = 1.0
+
+BULK_TTS_ITEMS = counter("bulk_tts_items_total", "批量 TTS 条目数（按结果）", ("status",))
+
+
+@dataclass
+class BulkItem:
+    id: str
+    text: str
+    voice: str
+    speed: float
+    role: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return audio_cache.tts_key(self.text, self.voice, self.speed)
+
+
+def parse_item(raw: Dict, default_id: str) -> BulkItem:
+    """把一行输入转成 BulkItem；缺 text 或规范化后为空抛 ValueError"""
+    raw_text = str(raw.get("text") or "").strip()
+    if not raw_text:
+        raise ValueError(f"条目 {raw.get('id', default_id)} 缺少 text")
+    text = normalize_text(raw_text)[:800]
+    if not text:
+        raise ValueError(f"条目 {raw.get('id', default_id)} 规范化后没有可合成的文本")
+    role = raw.get("role") or raw.get("role_name")
+    voice = tts.pick_voice(role, raw_text, raw.get("voice") or None)
+    return BulkItem(str(raw.get("id") or default_id), text, voice, float(raw.get("speed") or DEFAULT_SPEED), role)
+
+
+def default_concurrency() -> int:
+    return max(1, BULK_TTS_CONCURRENCY_PER_KEY * max(1, len(key_pool)))
+
+
+def _load_manifest(path: pathlib.Path) -> Dict[str, Dict]:
+    """已完成的条目：id -> manifest 记录（只认成功的）"""
+    done: Dict[str, Dict] = {}
+    if not path.exists():
+        return done
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue   # 中断时写了半行
+        if entry.get("audio_url"):
+            done[entry["id"]] = entry
+    return done
+
+
+async def _render_one(item: BulkItem, retries: int) -> Dict:
+    """合成一个唯一条目（已确认不在缓存中），按 Retry-After / 指数退避重试可重试的错误"""
+    attempt = 0
+    while True:
+        # 所有 key 都在冷却：等最早恢复的那个，而不是继续打 429
+        wait = key_pool.wait_time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            b64 = await tts._qiniu_tts_fetch(item.text, item.voice, item.speed)
+        except tts.TTSUpstreamError as e:
+            attempt += 1
+            if not e.retryable or attempt > retries:
+                return {"status": "failed", "error": str(e)}
+            await asyncio.sleep(e.retry_after or min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+            continue
+        except Exception as e:
+            attempt += 1
+            if attempt > retries:
+                return {"status": "failed", "error": str(e)}
+            await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+            continue
+        url = await asyncio.to_thread(audio_cache.store, item.key, base64.b64decode(b64))
+        return {"status": "synthesized", "audio_url": url}
+
+
+async def render_bulk(
+    items: List[BulkItem],
+    concurrency: Optional[int] = None,
+    manifest: Optional[pathlib.Path] = None,
+    retries: int = BULK_TTS_RETRIES,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict:
+    """
+    合成全部条目，返回汇总 + 每个输入条目的 manifest 记录（顺序与输入一致）
+    progress(done, total) 在每个唯一条目完成时回调
+    """
+    if not has_keys():
+        raise RuntimeError("未配置上游 API key（OPENAI_API_KEY / UPSTREAM_KEYS）")
+    started = time.perf_counter()
+    # 命令行 / 未经 lifespan 启动时，先在线程里列举已缓存的音频，下面的 lookup 不再阻塞事件循环
+    await asyncio.to_thread(audio_cache.warm)
+    done_before = _load_manifest(manifest) if manifest else {}
+    results: List[Optional[Dict]] = [None] * len(items)
+
+    # 同 key 的条目只合成第一个
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        prev = done_before.get(item.id)
+        if prev is not None and prev.get("key") == item.key:
+            results[i] = {**prev, "status": "resumed"}
+            continue
+        groups.setdefault(item.key, []).append(i)
+
+    sem = asyncio.Semaphore(max(1, concurrency or default_concurrency()))
+    total, finished = len(groups), 0
+    out = manifest.open("a", encoding="utf-8") if manifest else None
+
+    def record(index: int, outcome: Dict) -> None:
+        item = items[index]
+        entry = {"id": item.id, "key": item.key, "text": item.text, "role": item.role, "voice": item.voice,
+                 "speed": item.speed, "audio_url": outcome.get("audio_url"), "status": outcome["status"]}
+        if outcome.get("error"):
+            entry["error"] = outcome["error"]
+        results[index] = entry
+        BULK_TTS_ITEMS.inc(status=entry["status"])
+        if out is not None:
+            out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            out.flush()
+
+    async def render(key: str, indexes: List[int]) -> None:
+        nonlocal finished
+        async with sem:
+            item = items[indexes[0]]
+            url = audio_cache.lookup(key)
+            outcome = {"status": "cached", "audio_url": url} if url else await _render_one(item, retries)
+        record(indexes[0], outcome)
+        for j in indexes[1:]:
+            record(j, {**outcome, "status": "duplicate" if outcome.get("audio_url") else outcome["status"]})
+        finished += 1
+        if progress is not None:
+            progress(finished, total)
+
+    try:
+        with span("tts.bulk", items=len(items), unique=total):
+            await asyncio.gather(*(render(k, idx) for k, idx in groups.items()))
+    finally:
+        if out is not None:
+            out.close()
+
+    counts: Dict[str, int] = {}
+    for entry in results:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return {"total": len(items), "unique": total, "counts": counts,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1), "items": results}
+
+
+@jobs.register("tts_bulk")
+async def _bulk_job(payload: Dict, ctx: jobs.JobContext) -> Dict:
+    items = [parse_item(raw, str(i)) for i, raw in enumerate(payload["items"], 1)]
+    concurrency = min(payload.get("concurrency") or default_concurrency(), default_concurrency())
+    return await render_bulk(items, concurrency, progress=ctx.progress)
+
+
+def read_jsonl(lines: Iterable[str]) -> List[BulkItem]:
+    items = []
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if line:
+            items.append(parse_item(json.loads(line), str(n)))
+    return items
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    from ..core.upstream import aclose_http_client
+
+    parser = argparse.ArgumentParser(description="批量预合成 TTS 音频")
+    parser.add_argument("input", help="JSONL 文件（- 表示标准输入）")
+    parser.add_argument("--manifest", default=None, help="manifest 输出（JSONL，追加写入；重跑时据此续跑）")
+    parser.add_argument("--concurrency", type=int, default=None, help="并发上限（默认按 key 数计算）")
+    parser.add_argument("--retries", type=int, default=BULK_TTS_RETRIES)
+    args = parser.parse_args(argv)
+
+    with (sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")) as f:
+        items = read_jsonl(f)
+    manifest = pathlib.Path(args.manifest) if args.manifest else None
+
+    def progress(done: int, total: int) -> None:
+        if done == total or done % 50 == 0:
+            print(f"[BULK-TTS] {done}/{total}", file=sys.stderr)
+
+    async def run() -> Dict:
+        try:
+            return await render_bulk(items, args.concurrency, manifest, args.retries, progress)
+        finally:
+            await aclose_http_client()
+
+    summary = asyncio.run(run())
+    if manifest is None:
+        for entry in summary["items"]:
+            print(json.dumps(entry, ensure_ascii=False))
+    print(f"[BULK-TTS] 共 {summary['total']} 条，唯一 {summary['unique']} 条，{summary['counts']}，"
+          f"耗时 {summary['elapsed_ms'] / 1000:.1f}s", file=sys.stderr)
+    return 1 if summary["counts"].get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
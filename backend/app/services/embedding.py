@@ -0,0 +1,170 @@
+# backend/app/services/embedding.py
+"""
+文本向量化 + 小型向量索引
+
+  - HashingEmbedder：本地特征哈希（字 unigram/bigram + 英文词），无需模型服务，中文短问句效果足够
+  - RemoteEmbedder：调用 OpenAI 兼容的 /embeddings 接口（EMBEDDING_PROVIDER=openai）
+  - VectorIndex：归一化向量的余弦 top-k；有 NumPy 时用矩阵乘，否则纯 Python
+
+环境变量：
+  EMBEDDING_PROVIDER=hash        # hash / openai
+  EMBEDDING_MODEL=text-embedding-3-small
+  EMBEDDING_DIM=256              # hash 维度
+"""
+from __future__ import annotations
+import os
+import re
+import math
+import hashlib
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except Exception:
+    np = None  # 便于无 NumPy 环境下导入
+
+from ..core.config import OPENAI_BASE_URL
+from ..core.keypool import key_pool, has_keys
+from ..core.tracing import span
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "hash").strip().lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small").strip()
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+
+_WORD_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+def _l2_normalize(vec: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec))
+    return [x / norm for x in vec] if norm else vec
+
+
+class HashingEmbedder:
+    """特征哈希：token → blake2b → (下标, 符号)；结果 L2 归一化"""
+    name = "hash"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self._slot_cache: Dict[str, Tuple[int, float]] = {}
+
+    def _slot(self, token: str) -> Tuple[int, float]:
+        hit = self._slot_cache.get(token)
+        if hit is None:
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            hit = (h % self.dim, 1.0 if (h >> 63) & 1 else -1.0)
+            if len(self._slot_cache) < 200_000:
+                self._slot_cache[token] = hit
+        return hit
+
+    def tokens(self, text: str) -> List[str]:
+        units = _WORD_RE.findall(unicodedata.normalize("NFKC", text or "").lower())
+        # unigram + bigram；中文按字，英文按词
+        return units + [a + "\x1f" + b for a, b in zip(units, units[1:])]
+
+    def embed_one(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for tok in self.tokens(text):
+            idx, sign = self._slot(tok)
+            vec[idx] += sign
+        return _l2_normalize(vec)
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.embed_one(t) for t in texts]
+
+
+class RemoteEmbedder:
+    """OpenAI 兼容 /embeddings；失败时由调用方决定是否回退到 HashingEmbedder"""
+    name = "openai"
+
+    def __init__(self, model: str = EMBEDDING_MODEL, base_url: str = OPENAI_BASE_URL):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        with span("upstream.embeddings", model=self.model, inputs=len(texts)):
+            resp = await key_pool.request(
+                "POST", "/embeddings", self.base_url, headers={"Content-Type": "application/json"},
+                json={"model": self.model, "input": list(texts)}, timeout=15,
+            )
+        resp.raise_for_status()
+        rows = sorted(resp.json()["data"], key=lambda r: r["index"])
+        return [_l2_normalize(r["embedding"]) for r in rows]
+
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = RemoteEmbedder() if EMBEDDING_PROVIDER == "openai" and has_keys() else HashingEmbedder()
+    return _embedder
+
+
+def set_embedder(embedder) -> None:
+    global _embedder
+    _embedder = embedder
+
+
+class VectorIndex:
+    """
+    小型内存向量索引（向量需已归一化），支持增删与余弦 top-k。
+    有 NumPy 时把向量堆成矩阵一次 matmul；删除只打墓碑，超过一半墓碑时压缩。
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self._ids: List[Any] = []
+        self._vecs: List[List[float]] = []
+        self._alive: List[bool] = []
+        self._pos: Dict[Any, int] = {}
+        self._matrix = None  # NumPy 缓存，增删后失效
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def add(self, item_id: Any, vec: List[float]) -> None:
+        if item_id in self._pos:
+            self.remove(item_id)
+        self._pos[item_id] = len(self._ids)
+        self._ids.append(item_id)
+        self._vecs.append(vec)
+        self._alive.append(True)
+        self._matrix = None
+
+    def remove(self, item_id: Any) -> None:
+        i = self._pos.pop(item_id, None)
+        if i is None:
+            return
+        self._alive[i] = False
+        self._matrix = None
+        if len(self._ids) > 32 and len(self._pos) * 2 < len(self._ids):
+            self._compact()
+
+    def _compact(self) -> None:
+        keep = [i for i, ok in enumerate(self._alive) if ok]
+        self._ids = [self._ids[i] for i in keep]
+        self._vecs = [self._vecs[i] for i in keep]
+        self._alive = [True] * len(keep)
+        self._pos = {item: i for i, item in enumerate(self._ids)}
+
+    def search(self, vec: List[float], k: int = 1) -> List[Tuple[Any, float]]:
+        if not self._pos:
+            return []
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.asarray(self._vecs, dtype=np.float32)
+            scores = self._matrix @ np.asarray(vec, dtype=np.float32)
+            scores[~np.asarray(self._alive)] = -2.0
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if self._alive[i]]
+
+        scored = [
+            (self._ids[i], sum(a * b for a, b in zip(v, vec)))
+            for i, v in enumerate(self._vecs) if self._alive[i]
+        ]
+        scored.sort(key=lambda x: -x[1])
+        return scored[:k]
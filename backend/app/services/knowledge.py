@@ -0,0 +1,347 @@
+# backend/app/services/knowledge.py
+"""
+角色知识检索：长篇背景资料不再塞进系统提示词，每轮只插入与问题相关的几段
+
+  资料：presets/knowledge/<角色 id>/*.md|*.txt（按空行分段；Markdown 标题作为其下各段的前缀）
+  索引：离线构建，每个角色一个目录
+        <KNOWLEDGE_INDEX_DIR>/<角色 id>/vectors.npy     float32 [段数, 维度]，已 L2 归一化，运行时 mmap 只读
+                                       passages.jsonl  段落文本与出处
+                                       meta.json       向量化方式 / 维度 / 资料签名
+  检索：问题向量与整个矩阵一次 matmul 得到余弦，argpartition 取 top-k，低于阈值的丢弃
+  向量化：与 services/embedding 相同；索引记录了用哪种方式构建，查询时用同一种（hash 方式总能本地重建）
+
+  cd backend
+  python -m app.services.knowledge build                # 全部角色
+  python -m app.services.knowledge build --role newton
+  python -m app.services.knowledge search newton "苹果为什么会落地"
+
+环境变量：
+  KNOWLEDGE=1
+  KNOWLEDGE_DIR=app/presets/knowledge
+  KNOWLEDGE_INDEX_DIR=data/knowledge
+  KNOWLEDGE_TOP_K=3
+  KNOWLEDGE_MIN_SCORE=0.2
+  KNOWLEDGE_MAX_CHARS=900          # 插入提示词的资料总字数上限
+  KNOWLEDGE_CHUNK_CHARS=300        # 单段最长字数（更长的段落按句切开）
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import pathlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..core.metrics import counter, histogram
+from ..core.tracing import span
+from .embedding import HashingEmbedder, get_embedder, np
+
+KNOWLEDGE = os.getenv("KNOWLEDGE", "1").strip().lower() not in ("0", "false", "off", "no")
+KNOWLEDGE_DIR = pathlib.Path(os.getenv("KNOWLEDGE_DIR")
+                             or pathlib.Path(__file__).resolve().parent.parent / "presets" / "knowledge")
+KNOWLEDGE_INDEX_DIR = pathlib.Path(os.getenv("KNOWLEDGE_INDEX_DIR", "data/knowledge"))
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+KNOWLEDGE_MIN_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.2"))
+KNOWLEDGE_MAX_CHARS = int(os.getenv("KNOWLEDGE_MAX_CHARS", "900"))
+KNOWLEDGE_CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "300"))
+
+SOURCE_SUFFIXES = (".md", ".txt")
+
+RETRIEVAL_SECONDS = histogram("knowledge_retrieval_seconds", "知识检索耗时（含问题向量化）", ("embedder",),
+                              buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+INSERTED_CHARS = counter("knowledge_inserted_chars_total", "插入提示词的资料字数", ("role",))
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s+")
+
+
+@dataclass(frozen=True)
+class Passage:
+    text: str
+    source: str          # 文件名#段号
+
+
+@dataclass(frozen=True)
+class Hit:
+    passage: Passage
+    score: float
+
+
+# =========================
+#  资料切分
+# =========================
+def _split_long(text: str, limit: int) -> List[str]:
+    if len(text) <= limit:
+        return [text]
+    out, buf = [], ""
+    for sentence in (s for s in _SENTENCE_END.split(text) if s and s.strip()):
+        if buf and len(buf) + len(sentence) > limit:
+            out.append(buf.strip())
+            buf = ""
+        buf += sentence
+    if buf.strip():
+        out.append(buf.strip())
+    # 没有句末标点的超长段：硬切
+    return [piece[i:i + limit] for piece in out for i in range(0, len(piece), limit)]
+
+
+def chunk_text(text: str, source: str, limit: int = KNOWLEDGE_CHUNK_CHARS) -> List[Passage]:
+    """按空行分段；Markdown 标题不单独成段，而是作为其下各段的前缀"""
+    passages: List[Passage] = []
+    heading = ""
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n")):
+        lines = [ln.strip() for ln in block.strip().splitlines() if ln.strip()]
+        while lines and lines[0].startswith("#"):
+            heading = lines.pop(0).lstrip("#").strip()
+        if not lines:
+            continue
+        body = (" " if lines[0][:1].isascii() else "").join(lines)
+        for piece in _split_long(body, limit):
+            passages.append(Passage(f"{heading}：{piece}" if heading else piece, f"{source}#{len(passages)}"))
+    return passages
+
+
+def _source_files(role_id: str, root: pathlib.Path = KNOWLEDGE_DIR) -> List[pathlib.Path]:
+    folder = root / role_id
+    if not folder.is_dir():
+        return []
+    return sorted(p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in SOURCE_SUFFIXES)
+
+
+def _signature(files: Sequence[pathlib.Path]) -> str:
+    h = hashlib.sha256()
+    for p in files:
+        h.update(p.name.encode("utf-8"))
+        h.update(p.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def role_ids(root: pathlib.Path = KNOWLEDGE_DIR) -> List[str]:
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if p.is_dir() and _source_files(p.name, root))
+
+
+# =========================
+#  离线构建
+# =========================
+async def build_role_index(role_id: str, embedder=None, root: pathlib.Path = KNOWLEDGE_DIR,
+                           out_root: pathlib.Path = KNOWLEDGE_INDEX_DIR, force: bool = False) -> Dict:
+    """切分 + 向量化 + 写盘（先写临时目录再整体替换，运行中的进程不会读到半个索引）"""
+    if np is None:
+        raise RuntimeError("构建知识索引需要 NumPy")
+    embedder = embedder or get_embedder()
+    files = _source_files(role_id, root)
+    if not files:
+        raise FileNotFoundError(f"没有资料: {root / role_id}")
+    signature = _signature(files)
+    target = pathlib.Path(out_root) / role_id
+    meta_path = target / "meta.json"
+    if not force and meta_path.exists():
+        old = json.loads(meta_path.read_text(encoding="utf-8"))
+        if old.get("signature") == signature and old.get("embedder") == embedder.name:
+            return {**old, "skipped": True}
+
+    passages = [p for f in files for p in chunk_text(f.read_text(encoding="utf-8"), f.name)]
+    vectors = []
+    for i in range(0, len(passages), 64):
+        vectors.extend(await embedder.embed([p.text for p in passages[i:i + 64]]))
+    matrix = np.asarray(vectors, dtype=np.float32)
+
+    meta = {
+        "role_id": role_id,
+        "embedder": embedder.name,
+        "model": getattr(embedder, "model", None),
+        "dim": int(matrix.shape[1]),
+        "passages": len(passages),
+        "signature": signature,
+        "built_at": time.time(),
+    }
+    tmp = target.with_name(f".{role_id}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "vectors.npy", matrix)
+    with open(tmp / "passages.jsonl", "w", encoding="utf-8") as f:
+        for p in passages:
+            f.write(json.dumps({"text": p.text, "source": p.source}, ensure_ascii=False) + "\n")
+    (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    old_dir = target.with_name(f".{role_id}.old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if target.exists():
+        target.rename(old_dir)
+    tmp.rename(target)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+
+# =========================
+#  运行时索引
+# =========================
+class KnowledgeIndex:
+    """一个角色的只读索引：矩阵 mmap 在磁盘上，只有被访问的页才进内存"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        self.mtime_ns = (path / "meta.json").stat().st_mtime_ns
+        self.matrix = np.load(path / "vectors.npy", mmap_mode="r")
+        with open(path / "passages.jsonl", encoding="utf-8") as f:
+            self.passages = [Passage(**json.loads(line)) for line in f if line.strip()]
+        if len(self.passages) != self.matrix.shape[0]:
+            raise ValueError(f"索引损坏: {path}（段落数与向量数不一致）")
+        self.embedder = self._embedder()
+
+    def _embedder(self):
+        current = get_embedder()
+        if current.name == self.meta["embedder"] and getattr(current, "dim", self.meta["dim"]) == self.meta["dim"]:
+            return current
+        if self.meta["embedder"] == "hash":
+            return HashingEmbedder(self.meta["dim"])
+        return None   # 远程向量构建的索引，但当前没有可用的远程向量服务
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def search(self, vec, k: int = KNOWLEDGE_TOP_K, min_score: float = KNOWLEDGE_MIN_SCORE) -> List[Hit]:
+        if not self.passages:
+            return []
+        scores = self.matrix @ np.asarray(vec, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Hit(self.passages[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+class KnowledgeBase:
+    """按角色懒加载索引；索引目录被重新构建（meta.json 变化）后下次检索自动换新"""
+
+    def __init__(self, index_root: pathlib.Path = KNOWLEDGE_INDEX_DIR):
+        self.index_root = pathlib.Path(index_root)
+        self._indexes: Dict[str, Optional[KnowledgeIndex]] = {}
+        self._checked: Dict[str, Tuple[float, int]] = {}   # role_id -> (上次检查时间, meta mtime)
+        self._lock = threading.Lock()
+
+    def _current_mtime(self, role_id: str) -> int:
+        try:
+            return (self.index_root / role_id / "meta.json").stat().st_mtime_ns
+        except OSError:
+            return 0
+
+    def _load(self, role_id: str) -> Optional[KnowledgeIndex]:
+        with self._lock:
+            mtime = self._current_mtime(role_id)
+            cached = self._indexes.get(role_id)
+            if cached is not None and cached.mtime_ns == mtime:
+                return cached
+            index = None
+            if mtime:
+                try:
+                    index = KnowledgeIndex(self.index_root / role_id)
+                except Exception as e:
+                    print(f"[KNOWLEDGE] 加载 {role_id} 失败: {e}")
+                else:
+                    if index.embedder is None:
+                        print(f"[KNOWLEDGE] {role_id} 的索引用 {index.meta['embedder']} 构建，当前不可用，跳过")
+                        index = None
+            self._indexes[role_id] = index
+            self._checked[role_id] = (time.monotonic(), mtime)
+            return index
+
+    async def get(self, role_id: str) -> Optional[KnowledgeIndex]:
+        checked = self._checked.get(role_id)
+        # 5 秒内不重复 stat；首次加载放到线程里（读 passages.jsonl / 打开 mmap）
+        if checked is not None and time.monotonic() - checked[0] < 5.0:
+            return self._indexes.get(role_id)
+        if checked is not None and self._current_mtime(role_id) == checked[1]:
+            self._checked[role_id] = (time.monotonic(), checked[1])
+            return self._indexes.get(role_id)
+        return await asyncio.to_thread(self._load, role_id)
+
+    async def retrieve(self, role_id: str, query: str, k: int = KNOWLEDGE_TOP_K,
+                       min_score: float = KNOWLEDGE_MIN_SCORE) -> List[Hit]:
+        if np is None or not query.strip():
+            return []
+        index = await self.get(role_id)
+        if index is None:
+            return []
+        started = time.perf_counter()
+        with span("knowledge.retrieve", role=role_id, passages=len(index)) as s:
+            vec = (await index.embedder.embed([query]))[0]
+            hits = index.search(vec, k, min_score)
+            s.set_attribute("hits", len(hits))
+        RETRIEVAL_SECONDS.observe(time.perf_counter() - started, embedder=index.embedder.name)
+        return hits
+
+    def stats(self) -> Dict:
+        return {
+            "index_root": str(self.index_root),
+            "loaded": {rid: ({k: idx.meta[k] for k in ("embedder", "dim", "passages", "built_at")}
+                             if idx is not None else None) for rid, idx in self._indexes.items()},
+        }
+
+
+knowledge_base = KnowledgeBase()
+
+
+def format_passages(hits: Sequence[Hit], max_chars: int = KNOWLEDGE_MAX_CHARS) -> str:
+    lines, used = [], 0
+    for hit in hits:
+        if used and used + len(hit.passage.text) > max_chars:
+            break
+        lines.append(f"- {hit.passage.text}")
+        used += len(hit.passage.text)
+    return "\n".join(lines)
+
+
+async def augment_prompt(role_id: Optional[str], system_prompt: str, query: str) -> str:
+    """在系统提示词后附上与本轮问题相关的资料；没有索引 / 没有相关段落时原样返回"""
+    if not KNOWLEDGE or not role_id:
+        return system_prompt
+    try:
+        hits = await knowledge_base.retrieve(role_id, query)
+    except Exception as e:
+        print(f"[KNOWLEDGE] 检索失败（{role_id}）: {e}")
+        return system_prompt
+    block = format_passages(hits)
+    if not block:
+        return system_prompt
+    INSERTED_CHARS.inc(len(block), role=role_id)
+    return (system_prompt + "\n\n以下是与当前话题相关的背景资料，仅在相关时以你自己的口吻自然运用，"
+            "不要照抄，也不要提到“资料”：\n" + block)
+
+
+# =========================
+#  命令行
+# =========================
+def main(argv=None) -> int:
+    import argparse
+    p = argparse.ArgumentParser(description="角色知识索引")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="构建（资料未变化的角色跳过）")
+    b.add_argument("--role", action="append", help="角色 id，可重复；默认全部")
+    b.add_argument("--force", action="store_true")
+    s = sub.add_parser("search", help="检索调试")
+    s.add_argument("role")
+    s.add_argument("query")
+    s.add_argument("-k", type=int, default=KNOWLEDGE_TOP_K)
+    args = p.parse_args(argv)
+
+    if args.cmd == "build":
+        for role_id in args.role or role_ids():
+            meta = asyncio.run(build_role_index(role_id, force=args.force))
+            state = "未变化，跳过" if meta.get("skipped") else "已构建"
+            print(f"{role_id:<14} {state}  {meta['passages']} 段  {meta['embedder']}/{meta['dim']}")
+        return 0
+
+    hits = asyncio.run(knowledge_base.retrieve(args.role, args.query, k=args.k, min_score=-1.0))
+    for hit in hits:
+        print(f"{hit.score:.3f}  [{hit.passage.source}] {hit.passage.text}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,10 @@
 # backend/app/services/llm.py
-from typing import List, Dict
-from ..core.config import USE_OPENAI, get_openai_client, get_chat_model
+from typing import Mapping, Sequence, Tuple
 from ..models.skills import SKILL_TEMPLATES, SYSTEM_BASE, SkillName
+from . import knowledge, llm_provider, persona_guard
 
 
-def build_system_prompt(role_name: str, role_card: Dict, skill: SkillName) -> str:
+def build_system_prompt(role_name: str, role_card: Mapping, skill: SkillName) -> str:
     """
     根据角色卡与技能拼接系统提示词，限制输出风格，避免元信息。
     """
@@ -21,8 +21,8 @@ def build_system_prompt(role_name: str, role_card: Dict, skill: SkillName) -> st
 
 async def chat(
     role_name: str,
-    role_card: Dict,
-    history: List[Dict],
+    role_card: Mapping,
+    history: Sequence[Tuple[str, str]],
     user_text: str,
     skill: SkillName,
 ) -> str:
@@ -31,33 +31,29 @@ async def chat(
     """
     # 1) 组系统提示
     system_prompt = build_system_prompt(role_name, role_card, skill)
+    # 预置角色（角色卡带 id）附上与本轮问题相关的资料
+    system_prompt = await knowledge.augment_prompt(role_card.get("id"), system_prompt, user_text)
 
-    # 2) 组消息历史（截取最近 8 轮）
+    # 2) 组消息历史（截取最近 8 轮，每轮为 (用户, 角色) 二元组）
     messages = [{"role": "system", "content": system_prompt}]
-    for turn in history[-8:]:
-        if turn.get("user"):
-            messages.append({"role": "user", "content": turn["user"]})
-        if turn.get("assistant"):
-            messages.append({"role": "assistant", "content": turn["assistant"]})
+    for user, assistant in history[-8:]:
+        if user:
+            messages.append({"role": "user", "content": user})
+        if assistant:
+            messages.append({"role": "assistant", "content": assistant})
     messages.append({"role": "user", "content": user_text})
 
-    # 3) 调用 LLM（来自 .env 的网关与模型）
-    if USE_OPENAI:
-        client = get_openai_client()
-        if client is not None:
-            try:
-                resp = client.chat.completions.create(
-                    model=get_chat_model(),        # 从 .env 读取 OPENAI_CHAT_MODEL
-                    messages=messages,
-                    temperature=0.6,
-                    max_tokens=320,
-                )
-                text = (resp.choices[0].message.content or "").strip()
-                if text:
-                    return text
-            except Exception as e:
-                # 不中断链路，落回占位文案
-                print("[WARN] LLM 调用失败，使用占位：", e)
+    # 3) 调用 LLM（task=chat，模型由 LLM_MODEL_CHAT / OPENAI_CHAT_MODEL 决定）
+    try:
+        # 角色卡的 taboo 由人设守卫执行（命中时重新生成 / 删掉出戏的分句）
+        resp = await persona_guard.complete("chat", messages, persona_guard.card_matcher(role_card),
+                                            persona=role_name, temperature=0.6, max_tokens=320)
+        text = resp.text.strip()
+        if text:
+            return text
+    except llm_provider.LLMError as e:
+        # 不中断链路，落回占位文案
+        print("[WARN] LLM 调用失败，使用占位：", e.message[:200])
 
     # 4) 兜底占位回答（LLM 未配置或异常）
     hint = ",".join(role_card.get("lexicon", [])[:2])
@@ -0,0 +1,285 @@
+# backend/app/services/llm_provider.py
+"""
+统一的异步 LLM 提供层
+
+  - complete(task, messages)  一次性补全，返回 Completion（文本 + usage）
+  - stream(task, messages)    流式补全，逐段产出文本；迭代结束后 .text / .usage 可用
+  - task 决定模型与超时（见 core.config.LLM_MODEL_ROUTES / LLM_TIMEOUT_ROUTES），超时不超过本请求剩余时间
+  - 客户端断开时处理任务被取消，httpx 请求随之中止并释放连接
+  - 每次调用的 token 用量记入 core.usage（按 role / skill / session / task / model / key）；
+    当前会话超出 token 预算时抛 LLMError(429)
+
+提供方：
+  - OpenAICompatProvider：POST {OPENAI_BASE_URL}/chat/completions，走 core.upstream 的共享连接池，
+    key 由 core.keypool 按负载 / 限流状态分配
+  - EchoProvider：不访问网络，回显最后一条用户消息（测试 / 离线联调）
+"""
+from __future__ import annotations
+import json
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from ..core.config import (
+    OPENAI_BASE_URL, LLM_PROVIDER,
+    LLM_MODEL_ROUTES, LLM_TIMEOUT_ROUTES, OPENAI_TIMEOUT,
+)
+from ..core.cancellation import upstream_timeout
+from ..core.keypool import KeyPool, key_pool, last_key
+from ..core.scheduler import current_priority, get_scheduler, lower
+from ..core.tracing import span, start_span, end_span
+from ..core.upstream import get_http_client
+from ..core.usage import BudgetExceeded, current_scope, usage_meter
+
+
+class LLMError(Exception):
+    """上游 LLM 调用失败；status_code 与上游 HTTP 状态一致（网络错误为 500）"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    finish_reason: Optional[str] = None
+
+
+def route_model(task: str) -> str:
+    return LLM_MODEL_ROUTES.get(task) or LLM_MODEL_ROUTES["chat"]
+
+
+# 用户不直接等待的任务：即使在在线请求里触发也按低优先级排队
+TASK_PRIORITY: Dict[str, str] = {"role_card": "background"}
+
+
+def route_priority(task: str) -> str:
+    return lower(TASK_PRIORITY.get(task, "interactive"), current_priority())
+
+
+def route_timeout(task: str) -> float:
+    return LLM_TIMEOUT_ROUTES.get(task, OPENAI_TIMEOUT)
+
+
+class ChatStream:
+    """流式结果：async for 逐段取文本；结束后 text / usage / finish_reason 可用"""
+
+    def __init__(self, chunks: AsyncIterator[str], model: str):
+        self._chunks = chunks
+        self.model = model
+        self.parts: List[str] = []
+        self.usage: Dict[str, int] = {}
+        self.finish_reason: Optional[str] = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for piece in self._chunks:
+            self.parts.append(piece)
+            yield piece
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    async def aclose(self) -> None:
+        """提前结束：关闭底层流（释放调度名额与上游连接）"""
+        await self._chunks.aclose()
+
+
+# =========================
+#  提供方实现
+# =========================
+class OpenAICompatProvider:
+    name = "openai"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, pool: Optional[KeyPool] = None):
+        self.base_url = base_url.rstrip("/")
+        self.pool = pool or key_pool
+
+    def _check(self) -> None:
+        if not self.pool:
+            raise LLMError(500, "LLM服务未配置")
+
+    async def complete(self, model: str, messages: List[Dict], timeout: float, **params) -> Completion:
+        self._check()
+        payload = {"model": model, "messages": messages, **params}
+        try:
+            resp = await self.pool.request(
+                "POST", "/chat/completions", self.base_url,
+                headers={"Content-Type": "application/json"}, json=payload, timeout=timeout,
+            )
+        except Exception as e:
+            raise LLMError(500, f"LLM请求失败: {e}")
+        if resp.status_code != 200:
+            raise LLMError(resp.status_code, f"LLM API错误: {resp.text}")
+        data = resp.json()
+        choice = (data.get("choices") or [{}])[0]
+        return Completion(
+            text=(choice.get("message") or {}).get("content") or "",
+            model=data.get("model") or model,
+            usage=data.get("usage") or {},
+            finish_reason=choice.get("finish_reason"),
+        )
+
+    async def stream(self, model: str, messages: List[Dict], timeout: float, stream: "ChatStream", **params):
+        self._check()
+        payload = {"model": model, "messages": messages, "stream": True,
+                   "stream_options": {"include_usage": True}, **params}
+        try:
+            with self.pool.lease(self.base_url) as lease:
+                async with get_http_client().stream(
+                    "POST", lease.url("/chat/completions"), json=payload, timeout=timeout,
+                    headers=lease.headers({"Content-Type": "application/json"}),
+                ) as resp:
+                    lease.observe(resp)
+                    if resp.status_code != 200:
+                        body = (await resp.aread()).decode("utf-8", "replace")
+                        raise LLMError(resp.status_code, f"LLM API错误: {body}")
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            continue
+                        if chunk.get("usage"):
+                            stream.usage = chunk["usage"]
+                        for choice in chunk.get("choices") or []:
+                            if choice.get("finish_reason"):
+                                stream.finish_reason = choice["finish_reason"]
+                            piece = (choice.get("delta") or {}).get("content")
+                            if piece:
+                                yield piece
+        except LLMError:
+            raise
+        except Exception as e:
+            raise LLMError(500, f"LLM流式请求失败: {e}")
+
+
+class EchoProvider:
+    """本地回显：不访问网络，回复内容可预测，适合测试与压测"""
+    name = "echo"
+
+    def __init__(self, delay: float = 0.0, chunk_size: int = 8):
+        self.delay = delay
+        self.chunk_size = chunk_size
+
+    def _reply(self, model: str, messages: List[Dict]) -> str:
+        last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        return f"[echo:{model}] {last}"
+
+    @staticmethod
+    def _usage(messages: List[Dict], text: str) -> Dict[str, int]:
+        prompt = sum(len(m.get("content") or "") for m in messages)
+        return {"prompt_tokens": prompt, "completion_tokens": len(text), "total_tokens": prompt + len(text)}
+
+    async def complete(self, model: str, messages: List[Dict], timeout: float, **params) -> Completion:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self._reply(model, messages)
+        return Completion(text=text, model=model, usage=self._usage(messages, text), finish_reason="stop")
+
+    async def stream(self, model: str, messages: List[Dict], timeout: float, stream: "ChatStream", **params):
+        text = self._reply(model, messages)
+        for i in range(0, len(text), self.chunk_size):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield text[i:i + self.chunk_size]
+        stream.usage = self._usage(messages, text)
+        stream.finish_reason = "stop"
+
+
+def _make_provider(kind: str):
+    if kind == "echo":
+        return EchoProvider()
+    return OpenAICompatProvider()
+
+
+_provider = _make_provider(LLM_PROVIDER)
+
+
+def get_provider():
+    return _provider
+
+
+def set_provider(provider) -> None:
+    """替换提供方（测试中传入 EchoProvider()）"""
+    global _provider
+    _provider = provider
+
+
+# =========================
+#  对外接口
+# =========================
+async def _check_budget(dims=None) -> None:
+    try:
+        await usage_meter.check_budget("tokens", dims)
+    except BudgetExceeded as e:
+        raise LLMError(429, e.message)
+
+
+async def complete(task: str, messages: List[Dict], model: Optional[str] = None,
+                   timeout: Optional[float] = None, **params) -> Completion:
+    """按 task 路由模型与超时并调用；params 透传（temperature / max_tokens / top_p ...）"""
+    model = model or route_model(task)
+    provider = _provider
+    level = route_priority(task)
+    await _check_budget()
+    with span(f"upstream.llm.{task}", provider=provider.name, model=model, messages=len(messages),
+              priority=level) as s:
+        async with get_scheduler("llm").slot(level):
+            result = await provider.complete(model, messages,
+                                             timeout=upstream_timeout(timeout or route_timeout(task)), **params)
+        if result.usage:
+            s.set_attribute("tokens", result.usage.get("total_tokens", 0))
+        usage_meter.record_llm(task, result.model, result.usage, messages, result.text, result.finish_reason,
+                               key=last_key() if provider.name == "openai" else None)
+        return result
+
+
+def stream(task: str, messages: List[Dict], model: Optional[str] = None,
+           timeout: Optional[float] = None, **params) -> ChatStream:
+    """流式版本：返回 ChatStream，调用方 async for 取增量文本"""
+    model = model or route_model(task)
+    provider = _provider
+    # 流在路由返回之后才被迭代，归属在创建时取
+    dims = current_scope()
+
+    async def _chunks():
+        # 异步生成器会跨 yield 挂起，不能把 span 设为当前 span，手动开/关
+        level = route_priority(task)
+        s = start_span(f"upstream.llm.{task}.stream", provider=provider.name, model=model, messages=len(messages),
+                       priority=level)
+        error = None
+        started = False
+        try:
+            await _check_budget(dims)
+            # 名额一直占到流结束
+            async with get_scheduler("llm").slot(level):
+                async for piece in provider.stream(model, messages,
+                                                   timeout=upstream_timeout(timeout or route_timeout(task)),
+                                                   stream=result, **params):
+                    started = True
+                    yield piece
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            s.set_attribute("chars", len(result.text))
+            end_span(s, error)
+            # 中途断开也已经产生了费用；没拿到 usage 时按字符数估算
+            if started or result.usage:
+                usage_meter.record_llm(task, model, result.usage, messages, result.text, result.finish_reason,
+                                       key=last_key() if provider.name == "openai" else None, dims=dims)
+
+    result = ChatStream(_chunks(), model)
+    return result
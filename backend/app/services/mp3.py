@@ -0,0 +1,306 @@
+# backend/app/services/mp3.py
+"""
+MP3 帧级拼接（不解码、不重编码）：一条回复分句合成的多段音频合成一个可拖动的 mp3
+
+  - parse(data)：校验帧头（版本 / 层 / 码率 / 采样率），跳过 ID3v2、ID3v1、APE 标签与各段自带的 Xing/Info/VBRI 帧，
+                 记录连续音频帧的区间（memoryview 切片，不复制）
+  - plan_join(segments)：检查各段采样率 / 声道一致，生成新的 Xing 帧（总帧数、总字节数、100 点 TOC），
+                    之后逐段输出音频帧区间 —— 播放器据此得到正确的总时长与拖动位置
+  - iter_join() 逐块产出 memoryview，可直接作为 StreamingResponse 的 body；join_bytes() 得到完整文件
+
+只依赖标准库；Layer I/II/III，MPEG-1/2/2.5 均支持（TTS 输出通常是 MPEG-2 Layer III）。
+"""
+from __future__ import annotations
+import struct
+from array import array
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# 版本位：0=MPEG-2.5，2=MPEG-2，3=MPEG-1（1 保留）
+_V1, _V2, _V25 = 3, 2, 0
+_SAMPLE_RATES = {_V1: (44100, 48000, 32000), _V2: (22050, 24000, 16000), _V25: (11025, 12000, 8000)}
+# (MPEG-1?, 层) → 码率表（kbps），层位：3=I、2=II、1=III
+_BITRATES = {
+    (True, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MONO = 3
+_COMPAT_MASK = 0x001E0C00   # 版本 / 层 / 采样率 位
+_XING_FLAGS = 0x0F   # frames | bytes | TOC | quality
+
+
+class Mp3Error(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class FrameHeader:
+    version: int
+    layer: int
+    bitrate_index: int
+    sample_rate_index: int
+    padding: int
+    channel_mode: int
+    raw: int
+
+    @property
+    def mpeg1(self) -> bool:
+        return self.version == _V1
+
+    @property
+    def bitrate(self) -> int:
+        return _BITRATES[(self.mpeg1, self.layer)][self.bitrate_index] * 1000
+
+    @property
+    def sample_rate(self) -> int:
+        return _SAMPLE_RATES[self.version][self.sample_rate_index]
+
+    @property
+    def samples(self) -> int:
+        if self.layer == 3:
+            return 384
+        if self.layer == 2 or self.mpeg1:
+            return 1152
+        return 576
+
+    @cached_property
+    def length(self) -> int:
+        if self.layer == 3:
+            return (12 * self.bitrate // self.sample_rate + self.padding) * 4
+        return self.samples // 8 * self.bitrate // self.sample_rate + self.padding
+
+    @property
+    def side_info(self) -> int:
+        """Xing / Info 标签在帧内的偏移（帧头 4 字节 + side info）"""
+        if self.mpeg1:
+            return 4 + (17 if self.channel_mode == _MONO else 32)
+        return 4 + (9 if self.channel_mode == _MONO else 17)
+
+    def compatible(self, other: "FrameHeader") -> bool:
+        return (self.raw ^ other.raw) & _COMPAT_MASK == 0
+
+
+# 一个流里不同的帧头只有寥寥几种，按 32 位原值缓存解析结果（逐帧扫描的主要开销）
+_HEADER_CACHE: Dict[int, Optional[FrameHeader]] = {}
+_HEADER_CACHE_MAX = 4096
+
+
+def parse_header(data: Buffer, offset: int) -> Optional[FrameHeader]:
+    """offset 处是合法帧头则返回 FrameHeader（不合法 / 数据不足返回 None）"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    raw = struct.unpack_from(">I", data, offset)[0]
+    try:
+        return _HEADER_CACHE[raw]
+    except KeyError:
+        pass
+    header = _decode_header(raw)
+    if len(_HEADER_CACHE) < _HEADER_CACHE_MAX:
+        _HEADER_CACHE[raw] = header
+    return header
+
+
+def _decode_header(raw: int) -> Optional[FrameHeader]:
+    version = (raw >> 19) & 3
+    layer = (raw >> 17) & 3
+    bitrate_index = (raw >> 12) & 0xF
+    sample_rate_index = (raw >> 10) & 3
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None   # 保留值；free format（码率 0）无法确定帧长，也不支持
+    return FrameHeader(version, layer, bitrate_index, sample_rate_index, (raw >> 9) & 1, (raw >> 6) & 3, raw)
+
+
+def _id3v2_size(data: Buffer, offset: int) -> int:
+    if len(data) - offset < 10 or bytes(data[offset:offset + 3]) != b"ID3":
+        return 0
+    b = data[offset + 6:offset + 10]
+    size = (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+    footer = 10 if data[offset + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _trailing_tags(data: Buffer) -> int:
+    """文件末尾 ID3v1 / APEv2 标签的起点"""
+    end = len(data)
+    if end >= 128 and bytes(data[end - 128:end - 125]) == b"TAG":
+        end -= 128
+    if end >= 32 and bytes(data[end - 32:end - 24]) == b"APETAGEX":
+        size = struct.unpack_from("<I", data, end - 20)[0]
+        flags = struct.unpack_from("<I", data, end - 12)[0]
+        end -= size + (32 if flags & 0x80000000 else 0)
+    return max(end, 0)
+
+
+def _is_info_frame(data: Buffer, offset: int, header: FrameHeader) -> bool:
+    pos = offset + header.side_info
+    tag = bytes(data[pos:pos + 4])
+    return tag in (b"Xing", b"Info") or bytes(data[offset + 36:offset + 40]) == b"VBRI"
+
+
+@dataclass
+class Mp3Segment:
+    data: memoryview
+    spans: List[Tuple[int, int]] = field(default_factory=list)   # 连续音频帧区间 [start, end)
+    frame_sizes: array = field(default_factory=lambda: array("I"))
+    first: Optional[FrameHeader] = None
+    bitrates: set = field(default_factory=set)
+    skipped_bytes: int = 0
+
+    @property
+    def frames(self) -> int:
+        return len(self.frame_sizes)
+
+    @property
+    def audio_bytes(self) -> int:
+        return sum(e - s for s, e in self.spans)
+
+    @property
+    def samples(self) -> int:
+        return self.frames * self.first.samples if self.first else 0
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.first.sample_rate if self.first else 0.0
+
+
+def parse(data: Buffer) -> Mp3Segment:
+    """
+    扫描帧：跳过标签与 Xing/Info 帧，遇到坏字节时重新同步（要求下一帧也能对上，避免把数据误认为帧头）
+    没有任何音频帧时抛 Mp3Error
+    """
+    mv = memoryview(data).cast("B") if not isinstance(data, memoryview) else data
+    seg = Mp3Segment(mv)
+    pos = _id3v2_size(mv, 0)
+    end = _trailing_tags(mv)
+    span_start = None
+    expect: Optional[FrameHeader] = None
+    find = None
+
+    while pos + 4 <= end:
+        header = parse_header(mv, pos)
+        if header is not None and (expect is None or (header.raw ^ expect.raw) & _COMPAT_MASK == 0):
+            nxt = pos + header.length
+            confirmed = expect is not None or nxt >= end or (
+                (h2 := parse_header(mv, nxt)) is not None and h2.compatible(header))
+            if confirmed and nxt <= end:
+                if expect is None and seg.frames == 0 and _is_info_frame(mv, pos, header):
+                    pos = nxt   # 各段自带的 Xing/Info 帧不计入音频
+                    continue
+                if span_start is None:
+                    span_start = pos
+                seg.frame_sizes.append(header.length)
+                seg.bitrates.add(header.bitrate_index)
+                if seg.first is None:
+                    seg.first = header
+                expect = header
+                pos = nxt
+                continue
+        # 失步：结束当前区间，向后找下一个同步字
+        if span_start is not None:
+            seg.spans.append((span_start, pos))
+            span_start = None
+        expect = None
+        if find is None:
+            find = (data if isinstance(data, (bytes, bytearray)) else mv.tobytes()).find
+        nxt = find(b"\xff", pos + 1, end)
+        skip = (end - pos) if nxt < 0 else nxt - pos
+        seg.skipped_bytes += skip
+        pos += skip
+
+    if span_start is not None:
+        seg.spans.append((span_start, pos))
+    if seg.first is None:
+        raise Mp3Error("没有找到有效的 MP3 帧")
+    return seg
+
+
+def _xing_frame(first: FrameHeader, frames: int, audio_bytes: int, sizes: Sequence[int], vbr: bool) -> bytes:
+    """按首帧参数生成一个 Xing / Info 帧（码率选能放下标签的最小值）"""
+    need = first.side_info + 4 + 4 + 4 + 4 + 100 + 4
+    for index in range(1, 15):
+        header = FrameHeader(first.version, first.layer, index, first.sample_rate_index, 0, first.channel_mode, 0)
+        if header.length >= need:
+            break
+    else:
+        raise Mp3Error("无法生成 Xing 帧")
+    raw = (0xFFE00000 | (first.version << 19) | (first.layer << 17) | (1 << 16)   # 无 CRC
+           | (index << 12) | (first.sample_rate_index << 10) | (first.raw & 0xFF))
+    frame = bytearray(header.length)
+    struct.pack_into(">I", frame, 0, raw)
+
+    total = header.length + audio_bytes
+    toc = bytearray(100)
+    if frames:
+        # TOC[i]：播放到 i% 时对应的字节位置（占全文件的 1/256）
+        cumulative, acc = array("Q"), header.length
+        for size in sizes:
+            cumulative.append(acc)
+            acc += size
+        for i in range(100):
+            toc[i] = min(255, cumulative[min(frames - 1, i * frames // 100)] * 256 // total)
+    pos = header.side_info
+    frame[pos:pos + 4] = b"Xing" if vbr else b"Info"
+    struct.pack_into(">III", frame, pos + 4, _XING_FLAGS, frames, total)
+    frame[pos + 16:pos + 116] = toc
+    struct.pack_into(">I", frame, pos + 116, 0)   # quality
+    return bytes(frame)
+
+
+@dataclass
+class JoinPlan:
+    header: bytes
+    segments: List[Mp3Segment]
+    frames: int
+    duration: float
+    size: int
+
+    def chunks(self) -> Iterator[memoryview]:
+        """Xing 帧 + 各段音频帧区间（memoryview，不复制）"""
+        yield memoryview(self.header)
+        for seg in self.segments:
+            for start, end in seg.spans:
+                yield seg.data[start:end]
+
+
+def plan_join(segments: Sequence[Buffer]) -> JoinPlan:
+    parsed = [s if isinstance(s, Mp3Segment) else parse(s) for s in segments]
+    if not parsed:
+        raise Mp3Error("没有音频段")
+    first = parsed[0].first
+    for seg in parsed[1:]:
+        if not seg.first.compatible(first) or (seg.first.channel_mode == _MONO) != (first.channel_mode == _MONO):
+            raise Mp3Error("各段的 MPEG 版本 / 层 / 采样率 / 声道不一致，无法直接拼接")
+    sizes = array("I")
+    for seg in parsed:
+        sizes.extend(seg.frame_sizes)
+    frames = len(sizes)
+    audio_bytes = sum(seg.audio_bytes for seg in parsed)
+    vbr = len(set().union(*(seg.bitrates for seg in parsed))) > 1
+    header = _xing_frame(first, frames, audio_bytes, sizes, vbr)
+    return JoinPlan(header, parsed, frames, frames * first.samples / first.sample_rate, len(header) + audio_bytes)
+
+
+def iter_join(segments: Sequence[Buffer]) -> Iterator[memoryview]:
+    return plan_join(segments).chunks()
+
+
+def join_bytes(segments: Sequence[Buffer]) -> bytes:
+    plan = plan_join(segments)
+    out = bytearray(plan.size)
+    pos = 0
+    for chunk in plan.chunks():
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return bytes(out)
+
+
+def duration(data: Buffer) -> float:
+    """按帧数计算时长（秒）"""
+    return parse(data).duration
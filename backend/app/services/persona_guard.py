@@ -0,0 +1,333 @@
+# backend/app/services/persona_guard.py
+"""
+人设守卫：拦截 LLM 输出里与角色身份不符的表述（“作为AI”、“语言模型”、角色卡 taboo 里的词）
+
+  - 匹配：每个角色的禁用词（DEFAULT_TABOO + 预置角色 / 角色卡的 taboo）编译成一个 Aho-Corasick 自动机，
+    按词表缓存；流式输出逐段喂入，状态跨 chunk 保留，总耗时与输出长度成线性，与词数无关。
+    ASCII 词按单词边界匹配（AI 不会命中 MAIL），大小写不敏感
+  - 放行：输出按分句（，。！？；… 以及后跟空白的 .）暂存，一个分句结束后没有命中才向下游放出；
+    下游的 delta / 切句 / 句级 TTS 都只看到放行后的文本，出戏的句子不会送去合成
+  - 处理（PERSONA_GUARD_ACTION）：
+      regenerate  还没放出任何文本时命中：中止这次生成，在系统提示词后追加提醒重新生成
+                  （最多 PERSONA_GUARD_RETRIES 次）；之后的命中退化为 rewrite
+      rewrite     删掉命中的分句，其余照常输出
+  - 指标：persona_guard_hits_total{action}
+
+用法：
+  stream = persona_guard.stream("roleplay", messages, role_matcher(role), persona=role.name, max_tokens=...)
+  result = await persona_guard.complete("chat", messages, card_matcher(card), persona=name, ...)
+
+环境变量：
+  PERSONA_GUARD=1
+  PERSONA_GUARD_ACTION=regenerate      # regenerate / rewrite
+  PERSONA_GUARD_RETRIES=1
+"""
+from __future__ import annotations
+import os
+import re
+from collections import deque
+from dataclasses import replace
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from ..core.metrics import counter
+from ..core.usage import current_scope, scope as usage_scope
+from ..presets.registry import RoleRecord
+from . import llm_provider
+
+PERSONA_GUARD = os.getenv("PERSONA_GUARD", "1").strip().lower() not in ("0", "false", "off", "no")
+PERSONA_GUARD_ACTION = os.getenv("PERSONA_GUARD_ACTION", "regenerate").strip().lower()
+PERSONA_GUARD_RETRIES = int(os.getenv("PERSONA_GUARD_RETRIES", "1"))
+
+# 所有角色共用的出戏表述
+DEFAULT_TABOO = (
+    "作为AI", "作为一个AI", "作为人工智能", "作为一个人工智能", "AI助手", "人工智能助手",
+    "语言模型", "大模型", "ChatGPT", "OpenAI", "as an AI", "language model",
+)
+
+# 英文句号只在后面跟空白时算分句结束（与 tts_text 切句一致，不拆 3.14 / e.g.）
+_CLAUSE_END = re.compile(r"[，。！？；：,!?;\n…]|\.(?=\s)")
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+HITS = counter("persona_guard_hits_total", "人设守卫命中的分句数（按处理方式）", ("action",))
+
+Hit = Tuple[int, int, int]   # (起点, 终点, 词序号)，偏移是整条输出里的绝对位置
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class Matcher:
+    """Aho-Corasick 自动机；scan() 可从上次的状态继续（跨 chunk）"""
+    __slots__ = ("patterns", "words", "_goto", "_fail", "_out", "_bounded")
+
+    def __init__(self, patterns: Iterable[str]):
+        folded: Dict[str, str] = {}
+        for p in patterns:
+            if p and p.strip():
+                folded.setdefault(p.strip().translate(_ASCII_LOWER), p.strip())
+        self.patterns: Tuple[str, ...] = tuple(folded)          # 小写后的词（匹配用）
+        self.words: Tuple[str, ...] = tuple(folded.values())    # 原样（日志 / 提醒用）
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = goto[node][ch] = len(goto)
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            out[node] += (index,)
+
+        # 按层（BFS）求失败指针，并把失败链上的输出并进来
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+        # 首 / 尾是 ASCII 字母数字的词需要单词边界
+        self._bounded = tuple((_is_word(p[0]), _is_word(p[-1])) for p in self.patterns)
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def scan(self, text: str, state: int = 0, offset: int = 0) -> Tuple[int, List[Hit]]:
+        """扫描 text（其首字符在整条输出中的位置为 offset），返回 (新状态, 命中)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: List[Hit] = []
+        for i, ch in enumerate(text.translate(_ASCII_LOWER)):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                end = offset + i + 1
+                hits.extend((end - len(self.patterns[p]), end, p) for p in out[state])
+        return state, hits
+
+    def confirmed(self, hit: Hit, text: str, base: int) -> bool:
+        """单词边界检查；text 是从绝对位置 base 开始、包含命中前后各一个字符（若有）的文本"""
+        start, end, index = hit
+        head, tail = self._bounded[index]
+        if head and start > base and _is_word(text[start - base - 1]):
+            return False
+        if tail and end - base < len(text) and _is_word(text[end - base]):
+            return False
+        return True
+
+    def find(self, text: str) -> List[str]:
+        """整段文本里命中的词（非流式检查用）"""
+        _, hits = self.scan(text)
+        return list(dict.fromkeys(self.words[h[2]] for h in hits if self.confirmed(h, text, 0)))
+
+
+@lru_cache(maxsize=512)
+def _compile(patterns: Tuple[str, ...]) -> Matcher:
+    return Matcher(patterns)
+
+
+def matcher_for(taboo: Iterable[str] = ()) -> Optional[Matcher]:
+    """DEFAULT_TABOO + taboo 的自动机（同一词表只编译一次）；守卫关闭时返回 None"""
+    if not PERSONA_GUARD:
+        return None
+    return _compile(tuple(sorted({*DEFAULT_TABOO, *(t for t in taboo if isinstance(t, str))})))
+
+
+def role_matcher(role: RoleRecord) -> Optional[Matcher]:
+    return matcher_for(role.taboo)
+
+
+def card_matcher(card: Mapping) -> Optional[Matcher]:
+    return matcher_for(card.get("taboo") or ())
+
+
+def reinforce(messages: Sequence[Dict], persona: str, words: Iterable[str]) -> List[Dict]:
+    """重新生成用：在系统提示词后追加一句提醒（不修改原 messages）"""
+    note = (f"\n\n注意：始终以{persona}的身份说话，不要提到"
+            f"{'、'.join(f'“{w}”' for w in words)}等与人物身份不符的内容。")
+    out = [dict(m) for m in messages]
+    if out and out[0].get("role") == "system":
+        out[0]["content"] = (out[0].get("content") or "") + note
+    else:
+        out.insert(0, {"role": "system", "content": note.strip()})
+    return out
+
+
+class ClauseFilter:
+    """增量扫描 + 按分句放行；feed() / flush() 返回可以放出的文本"""
+
+    def __init__(self, matcher: Matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.offset = 0          # 已喂入的字符数
+        self.buffer = ""         # 当前未结束的分句
+        self.base = 0            # buffer 首字符的绝对位置
+        self.hits: List[Hit] = []
+        self.blocked: List[str] = []   # 被拦下的分句命中的词
+
+    def _words(self, hits: List[Hit]) -> List[str]:
+        return list(dict.fromkeys(self.matcher.words[h[2]] for h in hits))
+
+    def _take(self, clause: str, end: int) -> Tuple[str, List[str]]:
+        """结束一个分句：返回 (放出的文本, 命中的词)"""
+        hits = [h for h in self.hits if h[1] <= end and self.matcher.confirmed(h, self.buffer, self.base)]
+        self.hits = [h for h in self.hits if h[1] > end]
+        self.buffer = self.buffer[len(clause):]
+        self.base = end
+        if hits:
+            words = self._words(hits)
+            self.blocked.extend(words)
+            return "", words
+        return clause, []
+
+    def feed(self, piece: str) -> Tuple[str, List[str]]:
+        """喂入一段输出，返回 (放行的文本, 本次拦下的分句命中的词)"""
+        self.state, hits = self.matcher.scan(piece, self.state, self.offset)
+        self.offset += len(piece)
+        self.hits.extend(hits)
+        held = len(self.buffer)
+        self.buffer += piece
+        passed, words = [], []
+        buffer, cut = self.buffer, 0
+        # 只看新来的字符；往前多看一个：上一段末尾的 "." 要等到这一段的首字符才能判断
+        for m in _CLAUSE_END.finditer(buffer, max(held - 1, 0)):
+            # 分句带上结尾标点（buffer 里还留着后面的字符，供单词边界检查）
+            end = m.end()
+            clause = buffer[cut:end]
+            cut = end
+            text, hit = self._take(clause, self.base + len(clause))
+            passed.append(text)
+            words.extend(hit)
+        return "".join(passed), words
+
+    def flush(self) -> Tuple[str, List[str]]:
+        if not self.buffer:
+            return "", []
+        return self._take(self.buffer, self.base + len(self.buffer))
+
+
+def _act(action: str, words: List[str]) -> None:
+    HITS.inc(action=action)
+    print(f"[GUARD] {action}: {'、'.join(words)}")
+
+
+class GuardedStream:
+    """与 llm_provider.ChatStream 相同的用法：async for 取放行后的文本；结束后 text / usage / finish_reason 可用"""
+
+    def __init__(self, task: str, messages: List[Dict], matcher: Matcher, persona: str,
+                 action: str = PERSONA_GUARD_ACTION, retries: int = PERSONA_GUARD_RETRIES, **params):
+        self.task = task
+        self.messages = messages
+        self.matcher = matcher
+        self.persona = persona
+        self.retries = retries if action == "regenerate" else 0
+        self.params = params
+        self.parts: List[str] = []
+        self.blocked: List[str] = []
+        self.regenerated = 0
+        self._inner: Optional[llm_provider.ChatStream] = None
+        # 上游流在首次迭代时才创建，那时路由的 usage scope 可能已退出：在这里先记下归属
+        self._dims = dict(current_scope())
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return self._inner.usage if self._inner else {}
+
+    @property
+    def finish_reason(self) -> Optional[str]:
+        return self._inner.finish_reason if self._inner else None
+
+    @property
+    def model(self) -> Optional[str]:
+        return self._inner.model if self._inner else None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        messages = self.messages
+        while True:
+            with usage_scope(**self._dims):
+                inner = self._inner = llm_provider.stream(self.task, messages, **self.params)
+            flt = ClauseFilter(self.matcher)
+            restart = None
+            try:
+                async for piece in inner:
+                    text, words = flt.feed(piece)
+                    if words and not self.parts and not text and self.regenerated < self.retries:
+                        restart = words
+                        break
+                    if words:
+                        _act("rewrite", words)
+                    if text:
+                        self.parts.append(text)
+                        yield text
+            finally:
+                # 提前结束（重新生成 / 调用方中止）时关掉上游流，释放名额与连接
+                await inner.aclose()
+            if restart is None:
+                text, words = flt.flush()
+                if words and not self.parts and self.regenerated < self.retries:
+                    restart = words
+                else:
+                    if words:
+                        _act("rewrite", words)
+                    if text:
+                        self.parts.append(text)
+                        yield text
+                    self.blocked.extend(flt.blocked)
+                    return
+            self.blocked.extend(restart)
+            self.regenerated += 1
+            _act("regenerate", restart)
+            messages = reinforce(self.messages, self.persona, restart)
+
+
+def stream(task: str, messages: List[Dict], matcher: Optional[Matcher], persona: str, **params):
+    """带守卫的 llm_provider.stream；没有词表（或守卫关闭）时直接返回原始流"""
+    if not matcher:
+        return llm_provider.stream(task, messages, **params)
+    return GuardedStream(task, messages, matcher, persona, **params)
+
+
+def filter_text(matcher: Matcher, text: str) -> Tuple[str, List[str]]:
+    """整段文本按分句过滤，返回 (放行的文本, 命中的词)"""
+    flt = ClauseFilter(matcher)
+    passed, words = flt.feed(text)
+    tail, more = flt.flush()
+    return passed + tail, words + more
+
+
+async def complete(task: str, messages: List[Dict], matcher: Optional[Matcher], persona: str,
+                   action: str = PERSONA_GUARD_ACTION, retries: int = PERSONA_GUARD_RETRIES,
+                   **params) -> llm_provider.Completion:
+    """带守卫的 llm_provider.complete：命中时先按 action 重新生成，仍命中则删掉出戏的分句"""
+    result = await llm_provider.complete(task, messages, **params)
+    if not matcher:
+        return result
+    for attempt in range(retries + 1 if action == "regenerate" else 1):
+        words = matcher.find(result.text)
+        if not words:
+            return result
+        if attempt < retries and action == "regenerate":
+            _act("regenerate", words)
+            result = await llm_provider.complete(task, reinforce(messages, persona, words), **params)
+    text, words = filter_text(matcher, result.text)
+    if words:
+        _act("rewrite", words)
+    return replace(result, text=text)
@@ -0,0 +1,212 @@
+# backend/app/services/response_cache.py
+"""
+角色对话响应缓存（默认关闭，RESPONSE_CACHE=1 开启）
+
+key = (角色, 技能, 规范化问题, 最近几轮历史指纹)
+  1) 精确匹配：规范化后完全相同直接命中
+  2) 语义匹配（RESPONSE_CACHE_SEMANTIC=1）：同 (角色, 技能, 历史指纹) 下做向量相似度查找，
+     余弦 ≥ RESPONSE_CACHE_THRESHOLD 视为同一问题；向量用原始问题算（规范化会去掉空白，英文会粘成一个词）
+  - 每个角色可单独设置 TTL；总条目数超过上限时按 LRU 淘汰
+  - 指标：response_cache_requests_total{role,result=hit_exact|hit_semantic|miss}
+
+环境变量：
+  RESPONSE_CACHE=0
+  RESPONSE_CACHE_SEMANTIC=0
+  RESPONSE_CACHE_THRESHOLD=0.92
+  RESPONSE_CACHE_TTL=600                    # 默认 TTL（秒）
+  RESPONSE_CACHE_ROLE_TTLS=苏格拉底=86400,牛顿=3600
+  RESPONSE_CACHE_MAX_ENTRIES=5000
+  RESPONSE_CACHE_HISTORY_TURNS=2            # 参与指纹的最近消息条数
+"""
+from __future__ import annotations
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ..core.metrics import counter
+from ..core.tracing import span
+from .embedding import VectorIndex, get_embedder
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_HISTORY_TURNS = int(os.getenv("RESPONSE_CACHE_HISTORY_TURNS", "2"))
+
+
+def _parse_role_ttls(raw: str) -> Dict[str, float]:
+    out = {}
+    for item in (raw or "").split(","):
+        name, _, ttl = item.partition("=")
+        if name.strip() and ttl.strip():
+            out[name.strip()] = float(ttl)
+    return out
+
+
+RESPONSE_CACHE_ROLE_TTLS = _parse_role_ttls(os.getenv("RESPONSE_CACHE_ROLE_TTLS", ""))
+
+CACHE_REQUESTS = counter("response_cache_requests_total", "角色对话响应缓存查询次数", ("role", "result"))
+
+# 去掉标点、空白和常见语气词，"你是谁？" / "你是谁呀" 归一到同一个 key
+_STRIP_RE = re.compile(r"[\s\W_]+|[呀啊吗呢吧哦哈嘛]+$", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    s = unicodedata.normalize("NFKC", text or "").lower()
+    s = _STRIP_RE.sub("", s)
+    return _STRIP_RE.sub("", s)
+
+
+def history_fingerprint(history: List[Dict], turns: int = RESPONSE_CACHE_HISTORY_TURNS) -> str:
+    """最近 turns 条消息的短指纹；空历史为 ''"""
+    recent = history[-turns:] if turns > 0 else []
+    if not recent:
+        return ""
+    h = hashlib.blake2b(digest_size=8)
+    for m in recent:
+        h.update((m.get("role") or "").encode("utf-8"))
+        h.update(b"\x1f")
+        h.update(normalize_question(m.get("content") or "").encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    role: str
+    skill: str
+    question: str
+    fingerprint: str
+    response: str
+    expires_at: float
+    hits: int = 0
+
+
+@dataclass
+class CacheHit:
+    response: str
+    kind: str           # exact / semantic
+    score: float = 1.0
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, default_ttl: float = RESPONSE_CACHE_TTL,
+                 role_ttls: Optional[Dict[str, float]] = None, semantic: bool = RESPONSE_CACHE_SEMANTIC,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.role_ttls = dict(RESPONSE_CACHE_ROLE_TTLS if role_ttls is None else role_ttls)
+        self.semantic = semantic
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple[str, str, str, str], CacheEntry]" = OrderedDict()
+        # (role, skill, fingerprint) -> 该分组下问题的向量索引
+        self._indexes: Dict[Tuple[str, str, str], VectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, role: str) -> float:
+        return self.role_ttls.get(role, self.default_ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Tuple[str, str, str, str]) -> None:
+        self._entries.pop(key, None)
+        group = key[:2] + key[3:]
+        index = self._indexes.get(group)
+        if index is not None:
+            index.remove(key)
+            if not len(index):
+                del self._indexes[group]
+
+    def _get_exact(self, key, now: float) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def lookup(self, role: str, skill: Optional[str], question: str, history: List[Dict]) -> Optional[CacheHit]:
+        skill = skill or ""
+        q = normalize_question(question)
+        fp = history_fingerprint(history)
+        key = (role, skill, q, fp)
+        now = time.time()
+
+        with self._lock:
+            entry = self._get_exact(key, now)
+            if entry is not None:
+                entry.hits += 1
+                CACHE_REQUESTS.inc(role=role, result="hit_exact")
+                return CacheHit(entry.response, "exact")
+            index = self._indexes.get((role, skill, fp)) if self.semantic else None
+
+        if index is not None and len(index):
+            with span("response_cache.semantic_lookup", role=role):
+                vec = (await get_embedder().embed([question.strip()]))[0]
+                with self._lock:
+                    for cand_key, score in index.search(vec, k=3):
+                        if score < self.threshold:
+                            break
+                        entry = self._get_exact(cand_key, now)
+                        if entry is not None:
+                            entry.hits += 1
+                            CACHE_REQUESTS.inc(role=role, result="hit_semantic")
+                            return CacheHit(entry.response, "semantic", score)
+
+        CACHE_REQUESTS.inc(role=role, result="miss")
+        return None
+
+    async def store(self, role: str, skill: Optional[str], question: str, history: List[Dict], response: str) -> None:
+        skill = skill or ""
+        q = normalize_question(question)
+        if not q or not response:
+            return
+        fp = history_fingerprint(history)
+        key = (role, skill, q, fp)
+        vec = (await get_embedder().embed([question.strip()]))[0] if self.semantic else None
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = CacheEntry(role, skill, q, fp, response, time.time() + self.ttl_for(role))
+            if vec is not None:
+                self._indexes.setdefault((role, skill, fp), VectorIndex()).add(key, vec)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self, role: Optional[str] = None) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if role is None or k[0] == role]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_role: Dict[str, int] = {}
+            for k in self._entries:
+                by_role[k[0]] = by_role.get(k[0], 0) + 1
+        return {
+            "enabled": RESPONSE_CACHE,
+            "semantic": self.semantic,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "entries_by_role": by_role,
+            "requests": CACHE_REQUESTS.snapshot(),
+        }
+
+
+response_cache = ResponseCache()
+
+
+def cache_enabled() -> bool:
+    return RESPONSE_CACHE
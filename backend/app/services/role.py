@@ -1,32 +1,57 @@
 import json
-from typing import Dict
-from ..core.config import USE_OPENAI, get_openai_client
-from ..presets.roles import PRESET_ROLES
-
-def build_role_card(role_name: str) -> Dict:
-    if role_name in PRESET_ROLES:
-        return PRESET_ROLES[role_name]
-
-    if USE_OPENAI:
-        client = get_openai_client()
-        try:
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role":"system","content":"仅输出 JSON；包含 style, backstory(list), lexicon(list), taboo(list)。"},
-                    {"role":"user","content": f"为人物『{role_name}』生成扮演卡；避免暴露AI身份。"}
-                ],
-                temperature=0.4
-            )
-            data = json.loads(resp.choices[0].message.content)
-            return {
-                "style": data.get("style",""),
-                "backstory": data.get("backstory",[]),
-                "lexicon": data.get("lexicon",[]),
-                "taboo": data.get("taboo",["AI","模型"]),
-            }
-        except Exception as e:
-            print("[WARN] 生成角色卡失败:", e)
-
-    return {"style": f"你是{role_name}，保持该人物常见口吻与价值观。",
-            "backstory": [], "lexicon": [], "taboo": ["AI","语言模型"]}
+from typing import Dict, Mapping, Tuple
+from ..core.session_store import freeze
+from ..presets.registry import RoleRecord, get_role
+from . import llm_provider
+
+ROLE_CARD_PROMPT = "仅输出 JSON；包含 style, backstory(list), lexicon(list), taboo(list)。"
+
+
+def _parse_json(text: str) -> Dict:
+    """兼容模型把 JSON 包在 ```json 代码块里的情况"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    return json.loads(text)
+
+
+# 角色 id -> (注册表记录, 冻结后的角色卡)；注册表热更新换了记录时重新生成
+_PRESET_CARDS: Dict[str, Tuple[RoleRecord, Mapping]] = {}
+
+
+def _preset_card(record: RoleRecord) -> Mapping:
+    cached = _PRESET_CARDS.get(record.id)
+    if cached is None or cached[0] is not record:
+        cached = _PRESET_CARDS[record.id] = (record, freeze(record.to_dict()))
+    return cached[1]
+
+
+async def build_role_card(role_name: str) -> Mapping:
+    """返回只读角色卡：预置角色所有调用方共享同一个对象"""
+    preset = get_role(role_name)
+    if preset is not None and preset.listed:
+        return _preset_card(preset)
+
+    # task=role_card：路由到便宜快速的模型（LLM_MODEL_ROLE_CARD）
+    try:
+        resp = await llm_provider.complete(
+            "role_card",
+            [
+                {"role":"system","content":ROLE_CARD_PROMPT},
+                {"role":"user","content": f"为人物『{role_name}』生成扮演卡；避免暴露AI身份。"}
+            ],
+            temperature=0.4,
+        )
+        data = _parse_json(resp.text)
+        return freeze({
+            "style": data.get("style",""),
+            "backstory": data.get("backstory",[]),
+            "lexicon": data.get("lexicon",[]),
+            "taboo": data.get("taboo",["AI","语言模型"]),
+        })
+    except (llm_provider.LLMError, ValueError, AttributeError) as e:
+        print("[WARN] 生成角色卡失败:", e)
+
+    return freeze({"style": f"你是{role_name}，保持该人物常见口吻与价值观。",
+                   "backstory": [], "lexicon": [], "taboo": ["AI","语言模型"]})
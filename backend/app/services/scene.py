@@ -0,0 +1,186 @@
+# backend/app/services/scene.py
+"""
+多角色场景：一条用户消息同时发给场景里的 N 个角色
+
+  - 每个角色一个任务，并发流式生成回复；切出完整句子后立即并发合成语音（句级 TTS）
+  - 各角色的增量文本 / 句子 / 语音按就绪顺序交错产出，一轮的耗时接近最慢的那个角色，而不是各角色之和
+  - 场景共享一份发言记录；每个角色只取最近 SCENE_WINDOW 条，自己的发言作为 assistant，
+    用户与其他角色的发言以「名字：内容」作为 user 消息
+  - 一轮结束后按场景里的角色顺序写回记录（同一轮里角色之间互相看不到对方的回复）
+  - 输出先经人设守卫（services/persona_guard.py）按分句放行，出戏的句子不会送去合成
+  - 用量按 session=scene_id、role=角色名 计入 core.usage（场景共享一份会话预算）
+
+环境变量：
+  SCENE_MAX_CHARACTERS=4
+  SCENE_WINDOW=12
+"""
+from __future__ import annotations
+import os
+import time
+import asyncio
+from typing import AsyncIterator, Dict, List, Tuple
+
+from ..core.conversation_log import conversation_log
+from ..core.metrics import histogram
+from ..core.session_store import Scene
+from ..core.usage import scope as usage_scope
+from ..core.tracing import end_span, start_span
+from ..presets.registry import RoleRecord
+from . import knowledge, llm_provider, persona_guard, tts
+from .tts_text import StreamingNormalizer
+from .warmup import DEFAULT_SPEED
+
+SCENE_MAX_CHARACTERS = int(os.getenv("SCENE_MAX_CHARACTERS", "4"))
+SCENE_WINDOW = int(os.getenv("SCENE_WINDOW", "12"))
+
+USER = "user"
+_END = object()   # 某个角色的事件结束
+
+SCENE_TURN = histogram("scene_turn_seconds", "多角色场景一轮的耗时", ("stage",))
+
+Event = Tuple[str, Dict]
+
+
+def scene_prompt(role: RoleRecord, others: List[str]) -> str:
+    """角色自己的系统提示词 + 场景说明"""
+    if not others:
+        return role.system_prompt
+    return (role.system_prompt + f"\n\n现在你和{'、'.join(others)}一起与用户对话。"
+            f"其他人的发言会以「名字：内容」的形式给出；你只以{role.name}的身份回应，"
+            "不要替其他角色说话，回复简短口语化，可以回应或反驳其他角色的观点。")
+
+
+def character_messages(scene: Scene, role: RoleRecord, message: str, window: int = SCENE_WINDOW) -> List[Dict]:
+    """按角色视角取最近的发言窗口，拼成 chat messages（连续的 user 消息合并为一条）"""
+    others = [c for c in scene.characters if c != role.name]
+    messages = [{"role": "system", "content": scene_prompt(role, others)}]
+    for speaker, text in [*scene.recent(window), (USER, message)]:
+        if speaker == role.name:
+            if len(messages) == 1:
+                continue   # 窗口不以 assistant 开头
+            messages.append({"role": "assistant", "content": text})
+            continue
+        line = f"用户：{text}" if speaker == USER else f"{speaker}：{text}"
+        if messages[-1]["role"] == "user":
+            messages[-1]["content"] += "\n" + line
+        else:
+            messages.append({"role": "user", "content": line})
+    return messages
+
+
+async def _character_turn(scene: Scene, role: RoleRecord, message: str, speak: bool,
+                          out: asyncio.Queue, replies: Dict[str, Dict]) -> None:
+    """一个角色：流式生成 → 切句 → 每句并发合成；事件写入 out"""
+    started = time.perf_counter()
+    name = role.name
+    reply = {"character": name, "voice_type": role.voice, "text": "", "sentences": [], "audio_urls": []}
+    speaking: List[asyncio.Task] = []
+
+    async def say(index: int, text: str) -> None:
+        try:
+            url, cached = await tts.render_cached(text, role.voice, DEFAULT_SPEED)
+        except Exception as e:
+            print(f"[SCENE] {name} 第 {index} 句合成失败: {e}")
+            url, cached = None, False
+        reply["audio_urls"][index] = url
+        await out.put(("audio", {"character": name, "index": index, "audio_url": url, "cached": cached}))
+
+    async def sentence(text: str) -> None:
+        index = len(reply["sentences"])
+        reply["sentences"].append(text)
+        reply["audio_urls"].append(None)
+        await out.put(("sentence", {"character": name, "index": index, "text": text}))
+        if speak:
+            speaking.append(asyncio.create_task(say(index, text)))
+
+    messages = character_messages(scene, role, message)
+    messages[0]["content"] = await knowledge.augment_prompt(role.id, messages[0]["content"], message)
+    stream = persona_guard.stream("roleplay", messages, persona_guard.role_matcher(role), persona=name,
+                                  max_tokens=600, temperature=0.8, top_p=0.9)
+    normalizer = StreamingNormalizer()
+    try:
+        async for piece in stream:
+            await out.put(("delta", {"character": name, "text": piece}))
+            text = normalizer.feed(piece)
+            if text:
+                await sentence(text)
+        tail = normalizer.flush()
+        if tail:
+            await sentence(tail)
+        if speaking:
+            await asyncio.gather(*speaking)
+    except llm_provider.LLMError as e:
+        await out.put(("error", {"character": name, "status_code": e.status_code, "message": e.message}))
+        return
+    finally:
+        for task in speaking:
+            task.cancel()
+    reply["text"] = stream.text
+    reply["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    replies[name] = reply
+    await out.put(("reply", reply))
+
+
+async def run_turn(scene_id: str, scene: Scene, roles: List[RoleRecord], message: str,
+                   speak: bool = True) -> AsyncIterator[Event]:
+    """
+    产出 (event, data)：
+      delta     {"character", "text"}                    增量文本
+      sentence  {"character", "index", "text"}           完整的一句（已规范化）
+      audio     {"character", "index", "audio_url"}      该句语音（失败时 audio_url 为 null）
+      reply     {"character", "text", "sentences", "audio_urls", "elapsed_ms"}   该角色完成
+      error     {"character", "status_code", "message"} 该角色失败（其余角色照常）
+      done      {"scene_id", "turn", "replies", "elapsed_ms"}
+    """
+    started = time.perf_counter()
+    span = start_span("scene.turn", characters=len(roles), speak=speak)
+    out: asyncio.Queue = asyncio.Queue()
+    replies: Dict[str, Dict] = {}
+
+    async def run(role: RoleRecord) -> None:
+        try:
+            with usage_scope(session=scene_id, role=role.name):
+                await _character_turn(scene, role, message, speak, out, replies)
+        finally:
+            out.put_nowait(_END)
+
+    tasks = [asyncio.create_task(run(role)) for role in roles]
+    error = None
+    first = False
+    try:
+        pending = len(tasks)
+        while pending:
+            event = await out.get()
+            if event is _END:
+                pending -= 1
+                continue
+            if not first and event[0] == "delta":
+                first = True
+                SCENE_TURN.observe(time.perf_counter() - started, stage="first_delta")
+            yield event
+        await asyncio.gather(*tasks)   # 非上游错误（bug）照常抛出
+
+        # 按场景里的角色顺序写回共享记录
+        scene.append(USER, message)
+        for name in scene.characters:
+            if name in replies and replies[name]["text"]:
+                scene.append(name, replies[name]["text"])
+                conversation_log.append("scene", scene_id, name, message, replies[name]["text"])
+        scene.turns += 1
+        elapsed = time.perf_counter() - started
+        SCENE_TURN.observe(elapsed, stage="turn")
+        span.set_attribute("slowest_ms", max((r["elapsed_ms"] for r in replies.values()), default=0.0))
+        yield "done", {
+            "scene_id": scene_id,
+            "turn": scene.turns,
+            "replies": [replies[r.name] for r in roles if r.name in replies],
+            "elapsed_ms": round(elapsed * 1000, 1),
+        }
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        # 客户端断开 / 出错：停掉还在生成的角色
+        for task in tasks:
+            task.cancel()
+        end_span(span, error)
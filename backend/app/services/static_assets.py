@@ -0,0 +1,178 @@
+# backend/app/services/static_assets.py
+"""
+静态页面 / 资源：内容哈希 + 预压缩
+
+  - static/ 顶层的 html / js / css / svg / json 读入内存，按内容算 12 位哈希，
+    同时用最高压缩级别预先生成 gzip（与 brotli，若已安装），请求时不再压缩
+  - 带哈希的地址 /assets/<名字>.<哈希>.<后缀> 可永久缓存（immutable）；入口页（/roleplay 等）用 ETag 协商缓存
+  - HTML 里引用的 /static/<资源> 会改写为带哈希的地址，资源更新后浏览器自动取新版本
+  - 源文件修改后（mtime / 大小变化）下次访问自动重建，无需重启
+
+也可以在部署前生成到磁盘，交给 nginx / CDN 直接分发：
+  cd backend
+  python -m app.services.static_assets build            # 输出到 static/dist（含 .gz / .br 与 manifest.json）
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..core.compression import brotli
+
+STATIC_DIR = Path(__file__).resolve().parent.parent.parent / "static"
+ASSET_SUFFIXES = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+HASH_LEN = 12
+
+_STATIC_REF = re.compile(r"""(?P<attr>(?:src|href)\s*=\s*["'])/static/(?P<name>[^"'?#]+)""")
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<suffix>\.[A-Za-z0-9]+)$" % HASH_LEN)
+
+
+@dataclass
+class Asset:
+    name: str
+    content_type: str
+    hash: str
+    mtime_ns: int
+    size: int
+    bodies: Dict[str, bytes] = field(default_factory=dict)   # identity / gzip / br
+
+    @property
+    def url(self) -> str:
+        p = Path(self.name)
+        return f"/assets/{p.stem}.{self.hash}{p.suffix}"
+
+    @property
+    def hashed_name(self) -> str:
+        return self.url.rsplit("/", 1)[1]
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.hash}"'
+
+    @property
+    def encodings(self) -> List[str]:
+        """可协商的压缩编码，优先级从高到低"""
+        return [enc for enc in ("br", "gzip") if enc in self.bodies]
+
+
+class AssetRegistry:
+    def __init__(self, root: Path = STATIC_DIR):
+        self.root = Path(root)
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.RLock()
+
+    def names(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_file() and p.suffix.lower() in ASSET_SUFFIXES)
+
+    def get(self, name: str) -> Optional[Asset]:
+        """按文件名取资源；源文件变了就重建"""
+        path = self.root / name
+        if "/" in name or "\\" in name or path.suffix.lower() not in ASSET_SUFFIXES:
+            return None
+        try:
+            st = path.stat()
+        except OSError:
+            with self._lock:
+                self._assets.pop(name, None)
+            return None
+        with self._lock:
+            asset = self._assets.get(name)
+            if asset is None or asset.mtime_ns != st.st_mtime_ns or asset.size != st.st_size:
+                asset = self._build(name, path, st.st_mtime_ns, st.st_size, set())
+            return asset
+
+    def by_hashed_name(self, filename: str) -> Optional[Asset]:
+        m = _HASHED_NAME.match(filename)
+        if not m:
+            return None
+        asset = self.get(m.group("stem") + m.group("suffix"))
+        if asset is None or asset.hash != m.group("hash"):
+            return None   # 旧版本的哈希：不返回过期内容
+        return asset
+
+    def load_all(self) -> List[Asset]:
+        """启动时调用：把全部资源读入并预压缩"""
+        return [a for a in (self.get(n) for n in self.names()) if a is not None]
+
+    def _build(self, name: str, path: Path, mtime_ns: int, size: int, visiting: set) -> Asset:
+        raw = path.read_bytes()
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/json", "application/javascript",
+                                                                 "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        if name.endswith(".html"):
+            raw = self._rewrite_refs(raw, visiting | {name})
+        asset = Asset(name, content_type, hashlib.sha256(raw).hexdigest()[:HASH_LEN], mtime_ns, size)
+        asset.bodies["identity"] = raw
+        asset.bodies["gzip"] = gzip.compress(raw, compresslevel=9, mtime=0)
+        if brotli is not None:
+            asset.bodies["br"] = brotli.compress(raw, quality=11)
+        # 压缩后反而更大（极小文件）就不提供
+        for enc in ("gzip", "br"):
+            if enc in asset.bodies and len(asset.bodies[enc]) >= len(raw):
+                del asset.bodies[enc]
+        self._assets[name] = asset
+        return asset
+
+    def _rewrite_refs(self, raw: bytes, visiting: set) -> bytes:
+        text = raw.decode("utf-8")
+
+        def repl(m: re.Match) -> str:
+            ref = m.group("name")
+            if ref in visiting or Path(ref).suffix.lower() not in ASSET_SUFFIXES:
+                return m.group(0)
+            path = self.root / ref
+            try:
+                st = path.stat()
+            except OSError:
+                return m.group(0)
+            asset = self._assets.get(ref)
+            if asset is None or asset.mtime_ns != st.st_mtime_ns or asset.size != st.st_size:
+                asset = self._build(ref, path, st.st_mtime_ns, st.st_size, visiting)
+            return m.group("attr") + asset.url
+
+        return _STATIC_REF.sub(repl, text).encode("utf-8")
+
+    def build(self, out_dir: Path) -> Dict[str, str]:
+        """把带哈希的文件与 .gz / .br 写到 out_dir，返回并写入 manifest.json（原名 → 带哈希的地址）"""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {}
+        for asset in self.load_all():
+            target = out_dir / asset.hashed_name
+            target.write_bytes(asset.bodies["identity"])
+            for enc, ext in (("gzip", ".gz"), ("br", ".br")):
+                if enc in asset.bodies:
+                    target.with_name(target.name + ext).write_bytes(asset.bodies[enc])
+            manifest[asset.name] = asset.url
+        (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        return manifest
+
+
+registry = AssetRegistry()
+
+
+def main(argv=None) -> int:
+    import argparse
+    p = argparse.ArgumentParser(description="生成带哈希、预压缩的静态资源")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--out", default=str(STATIC_DIR / "dist"))
+    args = p.parse_args(argv)
+    manifest = registry.build(Path(args.out))
+    for asset in registry.load_all():
+        sizes = " ".join(f"{enc}={len(body)}" for enc, body in asset.bodies.items())
+        print(f"{asset.name:<24} → {manifest[asset.name]}  {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,367 @@
+# backend/app/services/storage.py
+"""
+音频对象存储：TTS 音频与 ASR 上传统一存放，多节点部署时换成 S3 兼容存储即可共享
+
+  key 形如 audio/<内容哈希>.mp3、uploads/<内容哈希>.webm（内容寻址，写入后不再变化）；
+  存储只使用 OBJECT_PREFIXES 下的 key，/media 也只对外提供这些前缀
+
+  - LocalStore：本地目录（默认 static/，与旧的 static/audio、static/uploads 文件兼容）
+  - S3Store：S3 兼容接口（AWS / MinIO / 七牛 Kodo 等），SigV4 签名，路径式寻址；
+             bench/fake_s3.py 提供本地假服务用于联调
+  - url(key)：设置 STORAGE_PUBLIC_BASE_URL（CDN / 桶公网域名）时直接给出该地址，
+              否则走本服务的 /media/<key>（带 immutable 缓存头、ETag、Range，见 api/routes_media.py）
+
+接口均为同步调用；在事件循环里访问 S3 时请放到线程池（asyncio.to_thread）。
+
+环境变量：
+  STORAGE_BACKEND=local            # local / s3
+  STORAGE_LOCAL_ROOT=static
+  STORAGE_PUBLIC_BASE_URL=         # 例如 https://cdn.example.com
+  S3_ENDPOINT=https://s3.amazonaws.com
+  S3_BUCKET=
+  S3_ACCESS_KEY= / S3_SECRET_KEY=
+  S3_REGION=us-east-1
+"""
+from __future__ import annotations
+import os
+import re
+import hmac
+import tempfile
+import hashlib
+import pathlib
+import mimetypes
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote, urlparse
+from xml.etree import ElementTree
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+from ..core.tracing import span
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").strip().lower()
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "static")
+STORAGE_PUBLIC_BASE_URL = os.getenv("STORAGE_PUBLIC_BASE_URL", "").strip().rstrip("/")
+PUBLIC_BASE = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+
+OBJECT_PREFIXES = ("audio/", "uploads/")
+_CONTENT_KEY = re.compile(r"(?:audio|uploads)/[0-9a-f]{32}\.[a-z0-9]{1,5}")
+
+
+def is_content_key(key: str) -> bool:
+    """内容寻址的 key（写入后内容不会变，可以 immutable 缓存）"""
+    return _CONTENT_KEY.fullmatch(key) is not None
+
+
+@dataclass
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str               # 不含引号
+    content_type: str
+    modified: float        # unix 秒
+
+
+def content_type_for(key: str) -> str:
+    ext = key.rsplit(".", 1)[-1].lower() if "." in key else ""
+    return {"mp3": "audio/mpeg", "webm": "audio/webm", "m4a": "audio/mp4", "wav": "audio/wav",
+            "ogg": "audio/ogg", "flac": "audio/flac"}.get(ext) or mimetypes.guess_type(key)[0] \
+        or "application/octet-stream"
+
+
+def _hash_etag(key: str) -> Optional[str]:
+    """内容寻址的 key 本身就是内容哈希，直接作为 ETag"""
+    stem = key.rsplit("/", 1)[-1].split(".", 1)[0]
+    if len(stem) == 32 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    return None
+
+
+class ObjectStore:
+    name = "base"
+    cheap_exists = True     # exists() 是否足够便宜，可以在每次缓存命中时校验
+
+    def url(self, key: str) -> str:
+        if STORAGE_PUBLIC_BASE_URL:
+            return f"{STORAGE_PUBLIC_BASE_URL}/{key}"
+        return f"{PUBLIC_BASE}/media/{key}"
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def get_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        """读取 [start, end] 闭区间"""
+        data = self.get(key)
+        return None if data is None else data[start:end + 1]
+
+    def head(self, key: str) -> Optional[ObjectInfo]:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.head(key) is not None
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        raise NotImplementedError
+
+
+class LocalStore(ObjectStore):
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> pathlib.Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"非法的对象 key: {key!r}")
+        return path
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with span("file.write", path=key, bytes=len(data)):
+            # 每次写入用独立的临时文件再原子替换：并发写同一个 key 互不干扰，也不会读到半个文件
+            with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp",
+                                             delete=False) as tmp:
+                tmp.write(data)
+            try:
+                os.chmod(tmp.name, 0o644)   # mkstemp 默认 0600，静态文件服务器读不到
+                os.replace(tmp.name, path)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except OSError:
+            return None
+
+    def get_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                f.seek(start)
+                return f.read(end - start + 1)
+        except OSError:
+            return None
+
+    def head(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = self._path(key).stat()
+        except (OSError, ValueError):
+            return None
+        etag = _hash_etag(key) or f"{st.st_size:x}-{st.st_mtime_ns:x}"
+        return ObjectInfo(key, st.st_size, etag, content_type_for(key), st.st_mtime)
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self._path(key).is_file()
+        except ValueError:
+            return False
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        base = self.root / prefix if prefix.endswith("/") else self.root
+        if not base.is_dir():
+            return
+        for p in base.rglob("*"):
+            if p.is_file() and not p.name.endswith(".tmp"):
+                key = p.relative_to(self.root).as_posix()
+                if key.startswith(prefix):
+                    st = p.stat()
+                    yield ObjectInfo(key, st.st_size, _hash_etag(key) or f"{st.st_size:x}-{st.st_mtime_ns:x}",
+                                     content_type_for(key), st.st_mtime)
+
+
+class S3Error(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class S3Store(ObjectStore):
+    """S3 兼容存储（路径式：{endpoint}/{bucket}/{key}），AWS SigV4 签名，无需 boto3"""
+    name = "s3"
+    cheap_exists = False
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = "us-east-1", timeout: float = 30.0):
+        if httpx is None:
+            raise RuntimeError("S3 存储需要 httpx")
+        self.endpoint = endpoint.rstrip("/")
+        self.host = urlparse(self.endpoint).netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._client = httpx.Client(timeout=timeout)
+
+    # —— SigV4 —— #
+    def _signed_headers(self, method: str, path: str, query: Dict[str, str], payload: bytes,
+                        extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = now.strftime("%Y%m%d")
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        headers = {"host": self.host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        headers.update({k.lower(): v for k, v in (extra or {}).items()})
+
+        signed = ";".join(sorted(headers))
+        canonical = "\n".join([
+            method,
+            quote(path, safe="/-_.~"),
+            "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(query.items())),
+            "".join(f"{k}:{str(headers[k]).strip()}\n" for k in sorted(headers)),
+            signed,
+            payload_hash,
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+
+        k = ("AWS4" + self.secret_key).encode()
+        for part in (date, self.region, "s3", "aws4_request"):
+            k = hmac.new(k, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(k, to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed}, Signature={signature}")
+        headers.pop("host")
+        return headers
+
+    def _request(self, method: str, key: str = "", query: Optional[Dict[str, str]] = None,
+                 data: bytes = b"", headers: Optional[Dict[str, str]] = None) -> "httpx.Response":
+        path = f"/{self.bucket}/{key}" if key else f"/{self.bucket}"
+        query = query or {}
+        signed = self._signed_headers(method, path, query, data, headers)
+        with span(f"upstream.s3.{method.lower()}", key=key, bytes=len(data)):
+            return self._client.request(method, self.endpoint + quote(path, safe="/-_.~"), params=query,
+                                        content=data or None, headers=signed)
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        resp = self._request("PUT", key, data=data, headers={"content-type": content_type or content_type_for(key)})
+        if resp.status_code not in (200, 201, 204):
+            raise S3Error(resp.status_code, f"S3 PUT 失败: {resp.text[:200]}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        resp = self._request("GET", key)
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise S3Error(resp.status_code, f"S3 GET 失败: {resp.text[:200]}")
+        return resp.content
+
+    def get_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        resp = self._request("GET", key, headers={"range": f"bytes={start}-{end}"})
+        if resp.status_code == 404:
+            return None
+        if resp.status_code == 200:    # 不支持 Range 的实现
+            return resp.content[start:end + 1]
+        if resp.status_code != 206:
+            raise S3Error(resp.status_code, f"S3 GET 失败: {resp.text[:200]}")
+        return resp.content
+
+    def head(self, key: str) -> Optional[ObjectInfo]:
+        resp = self._request("HEAD", key)
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise S3Error(resp.status_code, f"S3 HEAD 失败")
+        modified = resp.headers.get("last-modified")
+        try:
+            ts = datetime.strptime(modified, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc).timestamp()
+        except (TypeError, ValueError):
+            ts = 0.0
+        return ObjectInfo(key, int(resp.headers.get("content-length") or 0),
+                          _hash_etag(key) or resp.headers.get("etag", "").strip('"'),
+                          resp.headers.get("content-type") or content_type_for(key), ts)
+
+    def delete(self, key: str) -> None:
+        resp = self._request("DELETE", key)
+        if resp.status_code not in (200, 204, 404):
+            raise S3Error(resp.status_code, f"S3 DELETE 失败: {resp.text[:200]}")
+
+    def list(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if token:
+                query["continuation-token"] = token
+            resp = self._request("GET", query=query)
+            if resp.status_code != 200:
+                raise S3Error(resp.status_code, f"S3 LIST 失败: {resp.text[:200]}")
+            root = ElementTree.fromstring(resp.content)
+            ns = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+            for item in root.iter(f"{ns}Contents"):
+                key = item.findtext(f"{ns}Key") or ""
+                modified = item.findtext(f"{ns}LastModified") or ""
+                try:
+                    ts = datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+                except ValueError:
+                    ts = 0.0
+                yield ObjectInfo(key, int(item.findtext(f"{ns}Size") or 0),
+                                 _hash_etag(key) or (item.findtext(f"{ns}ETag") or "").strip('"'),
+                                 content_type_for(key), ts)
+            if (root.findtext(f"{ns}IsTruncated") or "").lower() != "true":
+                return
+            token = root.findtext(f"{ns}NextContinuationToken")
+
+
+def _make_store() -> ObjectStore:
+    if STORAGE_BACKEND == "s3":
+        return S3Store(
+            endpoint=os.getenv("S3_ENDPOINT", "https://s3.amazonaws.com"),
+            bucket=os.getenv("S3_BUCKET", ""),
+            access_key=os.getenv("S3_ACCESS_KEY", ""),
+            secret_key=os.getenv("S3_SECRET_KEY", ""),
+            region=os.getenv("S3_REGION", "us-east-1"),
+        )
+    return LocalStore()
+
+
+_store: ObjectStore = _make_store()
+
+
+def get_store() -> ObjectStore:
+    return _store
+
+
+def set_store(store: ObjectStore) -> None:
+    """替换存储后端（测试中传入指向假 S3 的 S3Store）"""
+    global _store
+    _store = store
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range（bytes=a-b / a- / -n），返回闭区间 (start, end)；
+    无 Range 返回 None，不可满足时抛 ValueError
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[6:].strip()
+    if "," in spec:
+        return None     # 多段 Range 不支持，按整文件返回
+    first, _, last = spec.partition("-")
+    if not first:
+        n = int(last)
+        if n <= 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
@@ -2,11 +2,13 @@
 """
 TTS 服务（Qiniu 网关版）
 - 角色名规范化 + 同义词映射，中文/英文名都能命中
-- 调用 https://openai.qiniu.com/v1/voice/tts
-- 保存 mp3 到 static/audio/，返回 (audio_url, tts_b64)
+- 合成前规范化文本（services/tts_text.py）
+- 调用 https://openai.qiniu.com/v1/voice/tts（异步 httpx，客户端断开时随请求取消，不再落盘）
+- mp3 写入对象存储（services/storage.py，本地目录或 S3），返回 (audio_url, tts_b64)
+- 每次上游合成的字符数与音频秒数记入 core.usage；当前会话超出合成字符预算时不再调用上游
 
 需要的环境变量 (.env)：
-  OPENAI_API_KEY=sk-七牛AI密钥
+  OPENAI_API_KEY=sk-七牛AI密钥          # 多个 key 用 UPSTREAM_KEYS（见 core/keypool.py）
   OPENAI_BASE_URL=https://openai.qiniu.com/v1
   USE_TTS=1
   OPENAI_TTS_MODE=qiniu
@@ -17,81 +19,32 @@ TTS 服务（Qiniu 网关版）
 from __future__ import annotations
 import os
 import re
-import uuid
 import base64
-import pathlib
+import asyncio
+import binascii
 import requests
 from typing import Optional, Tuple
 
+from ..core.cancellation import upstream_timeout
+from ..core.keypool import key_pool, has_keys, last_key
+from ..core.scheduler import get_scheduler
+from ..core.tracing import span
+from ..core.upstream import httpx
+from ..core.usage import BudgetExceeded, usage_meter
+from ..presets.registry import get_role
+from . import audio_cache, mp3
+from .tts_text import normalize as normalize_text
+
 # —— 环境配置 —— #
 USE_TTS = os.getenv("USE_TTS", "0") == "1"
 OPENAI_TTS_MODE = os.getenv("OPENAI_TTS_MODE", "qiniu").lower()
 BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openai.qiniu.com/v1").rstrip("/")
-API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
 
 DEFAULT_VOICE = os.getenv("QINIU_TTS_VOICE", "qiniu_zh_male_ybxknjs")
 SPEED = float(os.getenv("QINIU_TTS_SPEED", "1.0"))
 PUBLIC_BASE = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
 
-# —— 本地音频目录 —— #
-STATIC_DIR = pathlib.Path("static")
-AUDIO_DIR = STATIC_DIR / "audio"
-AUDIO_DIR.mkdir(parents=True, exist_ok=True)
-
-# =========================
-#  角色名规范化与同义词映射
-# =========================
-_SEP = r"[·•・\s\._．-]+"
-
-def _norm(name: str) -> str:
-    """规范化角色名：去空白/中点/下划线/点号，统一小写"""
-    s = (name or "").strip().lower()
-    return re.sub(_SEP, "", s)
-
-# 你账号 voice/list 中存在的 voice_type 映射（安全可用）
-ROLE_VOICE_MAP_RAW = {
-    # —— 中文角色 —— #
-    # 渊博学科男教师（沉稳学术）
-    "socrates": "qiniu_zh_male_ybxknjs",
-    "苏格拉底": "qiniu_zh_male_ybxknjs",
-
-    # 磁性课件男声（庄重）
-    "confucius": "qiniu_zh_male_cxkjns",
-    "孔子": "qiniu_zh_male_cxkjns",
-
-    # 温婉学科讲师（温柔）
-    "lin dai yu": "qiniu_zh_female_wwxkjx",
-    "lin_daiyu": "qiniu_zh_female_wwxkjx",
-    "林黛玉": "qiniu_zh_female_wwxkjx",
-
-    # 名著角色猴哥（最贴脸）
-    "sun wukong": "qiniu_zh_male_mzjsxg",
-    "sun_wukong": "qiniu_zh_male_mzjsxg",
-    "孙悟空": "qiniu_zh_male_mzjsxg",
-    "齐天大圣": "qiniu_zh_male_mzjsxg",
-    "孙行者": "qiniu_zh_male_mzjsxg",
-
-    # —— 英文/英式角色 —— #
-    # 英式英语男（莎士比亚/福尔摩斯/牛顿/哈利）
-    "shakespeare": "qiniu_en_male_ysyyn",
-    "莎士比亚": "qiniu_en_male_ysyyn",
-
-    "sherlock": "qiniu_en_male_ysyyn",
-    "sherlock holmes": "qiniu_en_male_ysyyn",
-    "福尔摩斯": "qiniu_en_male_ysyyn",
-
-    "newton": "qiniu_en_male_ysyyn",
-    "isaac newton": "qiniu_en_male_ysyyn",
-    "牛顿": "qiniu_en_male_ysyyn",
-
-    "harry potter": "qiniu_en_male_ysyyn",
-    "harry_potter": "qiniu_en_male_ysyyn",
-    "哈利波特": "qiniu_en_male_ysyyn",
-    "哈利·波特": "qiniu_en_male_ysyyn",
-}
-
-# 规范化后的映射表（查表用）
-ROLE_VOICE_MAP = {_norm(k): v for k, v in ROLE_VOICE_MAP_RAW.items()}
+# 角色 → 音色映射由角色注册表（presets/data/*.json 的 tts_voice）提供
 
 # 兜底音色（中文/英文）
 FALLBACK_ZH = "qiniu_zh_male_ybxknjs"
@@ -104,16 +57,16 @@ def pick_voice(role_name: Optional[str], reply_text: Optional[str] = None, voice
     """
     选音优先级：
       1) voice_override（前端明确指定）
-      2) 命中同义词映射（中英文/别名均可）
+      2) 注册表中的角色音色（id/中英文名/别名均可）
       3) 角色名或回复文本含中文 → 中文兜底
       4) 英文兜底
     """
     if voice_override:
         return voice_override
 
-    key = _norm(role_name or "")
-    if key in ROLE_VOICE_MAP:
-        return ROLE_VOICE_MAP[key]
+    role = get_role(role_name)
+    if role is not None and role.tts_voice:
+        return role.tts_voice
 
     if _looks_chinese(role_name) or _looks_chinese(reply_text):
         return FALLBACK_ZH
@@ -123,41 +76,82 @@ def pick_voice(role_name: Optional[str], reply_text: Optional[str] = None, voice
 # =========================
 #  七牛 TTS 调用
 # =========================
-def _qiniu_tts_request(text: str, voice_type: str) -> Optional[str]:
+class TTSUpstreamError(Exception):
+    """上游 TTS 返回非 200 / 无音频；retry_after 来自 429 的 Retry-After"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+
+def record_usage(text: str, audio: bytes) -> None:
+    """记一次上游合成的用量（字符数 + 按 mp3 帧数算的时长）"""
+    try:
+        seconds = mp3.duration(audio)
+    except mp3.Mp3Error:
+        seconds = 0.0
+    usage_meter.record_tts(len(text), seconds, key=last_key())
+
+async def _qiniu_tts_fetch(text: str, voice_type: str, speed: float = SPEED) -> str:
     """
-    调用七牛 /voice/tts，成功返回 base64 音频串，否则 None
+    调用七牛 /voice/tts，返回 base64 音频串；失败抛 TTSUpstreamError（批量合成据此决定是否重试）
     """
-    url = f"{BASE_URL}/voice/tts"
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
     payload = {
         "audio": {
             "voice_type": voice_type or DEFAULT_VOICE,
             "encoding": "mp3",
-            "speed_ratio": SPEED,
+            "speed_ratio": speed,
         },
         "request": {
             "text": text[:800],
         },
     }
-    resp = requests.post(url, json=payload, headers=headers, timeout=60)
+    try:
+        await usage_meter.check_budget("tts_chars")
+    except BudgetExceeded as e:
+        raise TTSUpstreamError(429, e.message)
+    with span("upstream.qiniu.tts", voice_type=payload["audio"]["voice_type"], chars=len(payload["request"]["text"])) as s:
+        async with get_scheduler("tts").slot() as level:
+            s.set_attribute("priority", level)
+            resp = await key_pool.request("POST", "/voice/tts", BASE_URL, headers={"Content-Type": "application/json"},
+                                          json=payload, timeout=upstream_timeout(60))
+        s.set_attribute("http.status_code", resp.status_code)
     if resp.status_code != 200:
-        print(f"[TTS] HTTP {resp.status_code}: {resp.text[:200]}")
-        return None
-    data = resp.json()
-    b64 = data.get("data")
-    if not b64:
-        print("[TTS] no 'data' in response")
-        return None
+        try:
+            retry_after = float(resp.headers.get("retry-after") or "")
+        except ValueError:
+            retry_after = None
+        raise TTSUpstreamError(resp.status_code, f"HTTP {resp.status_code}: {resp.text[:200]}", retry_after)
+    try:
+        b64 = resp.json()["data"]
+        audio = base64.b64decode(b64, validate=True)
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise TTSUpstreamError(502, f"bad response: {type(e).__name__}: {e}")
+    if not audio:
+        raise TTSUpstreamError(502, "no 'data' in response")
+    record_usage(payload["request"]["text"], audio)
     return b64
 
+async def _qiniu_tts_request(text: str, voice_type: str, speed: float = SPEED) -> Optional[str]:
+    """
+    调用七牛 /voice/tts，成功返回 base64 音频串；上游报错、网络错误或响应体不是音频时返回 None
+    """
+    try:
+        return await _qiniu_tts_fetch(text, voice_type, speed)
+    except (TTSUpstreamError, httpx.HTTPError) as e:
+        print(f"[TTS] {type(e).__name__}: {e}")
+        return None
+
 def tts_available() -> bool:
     """快速判断 TTS 配置是否可用"""
-    return USE_TTS and OPENAI_TTS_MODE == "qiniu" and bool(API_KEY) and bool(BASE_URL)
+    return USE_TTS and OPENAI_TTS_MODE == "qiniu" and has_keys() and bool(BASE_URL)
 
-def synthesize(
+async def synthesize(
     text: str,
     role_name: Optional[str] = None,
     reply_text: Optional[str] = None,
@@ -167,33 +161,56 @@ def synthesize(
     返回 (audio_url, tts_b64)
       - 成功：audio_url 为可播放链接，tts_b64 为 base64 音频
       - 失败或未启用：返回 (None, None)
+    合成前先规范化（去 markdown / emoji，数字单位读出来），按字符计费的上游少收无用字符
     """
     if not tts_available():
         return None, None
 
     try:
         voice = pick_voice(role_name, reply_text, voice_override)
-        b64 = _qiniu_tts_request(text, voice)
+        text = normalize_text(text)[:800]
+        if not text:
+            return None, None
+        key = audio_cache.tts_key(text, voice, SPEED)
+        cached_url = audio_cache.lookup(key)
+        if cached_url:
+            audio_bytes = await asyncio.to_thread(audio_cache.read, key)
+            if audio_bytes is not None:
+                return cached_url, base64.b64encode(audio_bytes).decode("ascii")
+
+        b64 = await _qiniu_tts_request(text, voice)
         if not b64:
             return None, None
 
         audio_bytes = base64.b64decode(b64)
-        name = f"{uuid.uuid4().hex}.mp3"
-        path = AUDIO_DIR / name
-        path.write_bytes(audio_bytes)
-
-        audio_url = f"{PUBLIC_BASE}/static/audio/{name}"
+        audio_url = await asyncio.to_thread(audio_cache.store, key, audio_bytes)
         return audio_url, b64
     except Exception as e:
         print("[TTS] synthesize failed:", e)
         return None, None
 
+async def render_cached(text: str, voice: str, speed: float = SPEED) -> Tuple[Optional[str], bool]:
+    """
+    合成并写入音频缓存，返回 (audio_url, 是否命中缓存)；
+    不检查 USE_TTS（预热与 /v1/tts 只要求配置了密钥），失败返回 (None, False)
+    """
+    key = audio_cache.tts_key(text, voice, speed)
+    url = audio_cache.lookup(key)
+    if url:
+        return url, True
+    if not has_keys():
+        return None, False
+    b64 = await _qiniu_tts_request(text, voice, speed)
+    if not b64:
+        return None, False
+    return await asyncio.to_thread(audio_cache.store, key, base64.b64decode(b64)), False
+
 def list_voices() -> Optional[list]:
     """代理七牛 GET /voice/list，返回列表（失败返回 None）"""
     try:
-        url = f"{BASE_URL}/voice/list"
-        headers = {"Authorization": f"Bearer {API_KEY}"}
-        resp = requests.get(url, headers=headers, timeout=30)
+        with span("upstream.qiniu.voice_list"), key_pool.lease(BASE_URL) as lease:
+            resp = requests.get(lease.url("/voice/list"), headers=lease.headers(), timeout=30)
+            lease.observe(resp)
         if resp.status_code != 200:
             print(f"[TTS] list voices HTTP {resp.status_code}: {resp.text[:200]}")
             return None
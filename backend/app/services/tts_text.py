@@ -0,0 +1,455 @@
+# backend/app/services/tts_text.py
+"""
+TTS 前的文本规范化：LLM 回复里的 markdown、emoji、数字与单位在送去合成前处理掉 / 读出来
+
+  - markdown：标题 #、加粗 ** __、行内代码、代码块（整段丢弃）、链接只留文字、图片 / 裸 URL / HTML 标签去掉、
+              列表符号与 "1." 编号去掉、表格竖线变逗号；换行补句读，让停顿自然
+  - emoji：去掉（含变体选择符、ZWJ 组合、国旗）
+  - 数字：中文按读法展开（12.5% → 百分之十二点五、2024年 → 二零二四年、10:30 → 十点三十分、3~5 → 三到五、
+          1/2 → 二分之一，单位 km / kg / ℃ / m/s …），英文展开成英文读法（3.5 kg → three point five kilograms、
+          1/2 → one half）；2024-10-19 按日期读，010-12345678 这类连字符数字串逐位读，
+          连字符只在两侧带空格、后跟单位或前小后大（3-5）时当作范围；字母后的连字符不是负号（GPT-4 → GPT 四）；
+          货币（$3.50 → three dollars and fifty cents / 三点五美元）与版本号（v2.0.1）单独处理
+  - normalize(text)：一次性处理；StreamingNormalizer：对流式 token 增量处理，只在句末 / 换行处输出
+
+所有正则在导入时编译；没有需要处理的字符时直接返回原文。
+"""
+from __future__ import annotations
+import re
+from typing import List, Optional
+
+# —— markdown —— #
+_CODE_FENCE = re.compile(r"```.*?(?:```|\Z)", re.S)
+_INLINE_CODE = re.compile(r"`([^`\n]*)`")
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"https?://[^\s)）\]】>，。]+")
+_HTML = re.compile(r"</?[a-zA-Z][^>]*>")
+_HEADING = re.compile(r"(?m)^[ \t]{0,3}#{1,6}[ \t]*")
+_QUOTE = re.compile(r"(?m)^[ \t]*>[ \t]?")
+_HR = re.compile(r"(?m)^[ \t]*(?:[-*_][ \t]*){3,}$")
+_TABLE_SEP = re.compile(r"(?m)^[ \t]*\|?[ \t:\-|]+\|[ \t:\-|]*$")
+_BULLET = re.compile(r"(?m)^[ \t]*[-*+•·][ \t]+")
+_NUMBERED = re.compile(r"(?m)^[ \t]*\d{1,3}[.)、](?!\d)[ \t]*")
+_EMPHASIS = re.compile(r"\*{1,3}|_{2,3}|~~")
+_TABLE_EDGE = re.compile(r"(?m)^[ \t]*\||\|[ \t]*$")
+_PIPE = re.compile(r"[ \t]*\|[ \t]*")
+
+# —— emoji —— #
+_EMOJI = re.compile(
+    "[\U0001F000-\U0001FAFF\U0001F1E6-\U0001F1FF\u2600-\u27BF\u2B00-\u2BFF\u2300-\u23FF"
+    "\uFE0E\uFE0F\u200D\u20E3\U000E0020-\U000E007F]+"
+)
+
+# 需要处理的字符；都没有时走快速路径
+_NEEDS_WORK = re.compile(
+    r"[#*_`\[\]<>|~\d%℃°&/+=\n\r\t:：]|https?://|"
+    "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\u2300-\u23FF\uFE0F\u200D]"
+)
+
+_CJK = re.compile(r"[\u4e00-\u9fff]")
+_SPACES = re.compile(r"[ \t\u3000]{2,}")
+_ZH_SPACE = re.compile(r"(?<=[\u4e00-\u9fff，。！？；：、])[ \t\u3000]+|[ \t\u3000]+(?=[\u4e00-\u9fff，。！？；：、])")
+_ZH_PUNCT = "。！？；，、：…—,.!?;:"
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+# —— 数字 —— #
+_ZH_DIGITS = "零一二三四五六七八九"
+_ZH_UNITS = (
+    ("km/h", "千米每小时", "kilometers per hour"), ("m/s²", "米每二次方秒", "meters per second squared"),
+    ("m/s", "米每秒", "meters per second"), ("km²", "平方千米", "square kilometers"), ("m²", "平方米", "square meters"),
+    ("m³", "立方米", "cubic meters"),
+    ("km", "千米", "kilometers"), ("cm", "厘米", "centimeters"), ("mm", "毫米", "millimeters"),
+    ("kg", "千克", "kilograms"), ("mg", "毫克", "milligrams"), ("ml", "毫升", "milliliters"),
+    ("GB", "G", "gigabytes"), ("MB", "兆", "megabytes"), ("KB", "K", "kilobytes"),
+    ("°C", "摄氏度", "degrees Celsius"), ("℃", "摄氏度", "degrees Celsius"), ("°F", "华氏度", "degrees Fahrenheit"),
+    ("°", "度", "degrees"), ("min", "分钟", "minutes"), ("h", "小时", "hours"), ("s", "秒", "seconds"),
+    ("m", "米", "meters"), ("g", "克", "grams"), ("L", "升", "liters"),
+)
+_UNIT_MAP = {u: (zh, en) for u, zh, en in _ZH_UNITS}
+_UNIT_ALT = "|".join(re.escape(u) for u, _, _ in _ZH_UNITS)
+
+_NUM = r"\d+(?:,\d{3})*(?:\.\d+)?"
+_YEAR = re.compile(r"(\d{4})(?=(?:到\d{4})?年)")
+_TIME = re.compile(r"(?<![\d.])([01]?\d|2[0-3])[:：]([0-5]\d)(?![\d:])")
+# 负号：前面紧挨字母 / 数字的 - 是连字符（GPT-4、COVID-19），不当负号
+_SIGNED = rf"(?:(?<![A-Za-z0-9])-)?{_NUM}"
+_PERCENT = re.compile(rf"({_SIGNED})\s*[%％]")
+_RANGE = re.compile(rf"({_NUM})(?:\s*[~～–—]\s*|[ \t]+-[ \t]*|[ \t]*-[ \t]+)(?=\d)")
+_TIME_RANGE = re.compile(r"(?<=\d[:：]\d\d)[ \t]*-[ \t]*(?=\d{1,2}[:：]\d\d)")
+_DATE = re.compile(r"(?<![\d.,\-/])(\d{4})-(0?[1-9]|1[0-2])-(0?[1-9]|[12]\d|3[01])(?![\d\-]|\.\d)")
+# 连字符连起来的数字串：电话 / 编号 / 3-5（是否当作范围见 _hyphen_parts）
+_HYPHEN_GROUP = re.compile(rf"(?<![\d.,\-]){_NUM}(?:-{_NUM})+(?![\d,]|\.\d)")
+_PERCENT_AHEAD = re.compile(r"\s*[%％]")
+_UNIT_AHEAD = re.compile(rf"\s*(?:{_UNIT_ALT})(?![A-Za-z])|\s*[%％]")
+_FRACTION = re.compile(r"(?<![\d/])(\d+)/(\d+)(?![\d/])")
+_NUM_UNIT = re.compile(rf"({_SIGNED})\s*({_UNIT_ALT})(?![A-Za-z])")
+_NUMBER = re.compile(_SIGNED)
+_WORD_HYPHEN = re.compile(r"(?<=[A-Za-z])-(?=\d)")
+# 版本号：v2.0.1 / 1.2.3（三段及以上，或带 v 前缀），各段按整数读，点读作“点”
+_VERSION = re.compile(r"(?<![\w.])(?:[vV]\d+(?:\.\d+)+|\d+(?:\.\d+){2,})(?![\w.]|\.\d)")
+# 货币符号在前：$3.50、¥20、€1,200
+_CURRENCY = re.compile(rf"([$¥￥€£])[ \t]?({_NUM})")
+_CURRENCY_ZH = {"$": "美元", "¥": "元", "￥": "元", "€": "欧元", "£": "英镑"}
+_CURRENCY_EN = {"$": ("dollar", "cent"), "¥": ("yuan", ""), "￥": ("yuan", ""), "€": ("euro", "cent"),
+                "£": ("pound", "penny")}
+_TILDE_RANGE = re.compile(r"(?<=\d)[ \t]*[~～–—][ \t]*(?=\d)")
+_TILDE = re.compile(r"[~～][ \t]*")
+_SYMBOLS_ZH = (("&", "和"), ("+", "加"), ("=", "等于"), ("×", "乘"), ("÷", "除以"))
+_SYMBOLS_EN = (("&", " and "), ("+", " plus "), ("=", " equals "), ("×", " times "), ("÷", " divided by "))
+
+_EN_ONES = ("zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+            "sixteen seventeen eighteen nineteen").split()
+_EN_TENS = "_ _ twenty thirty forty fifty sixty seventy eighty ninety".split()
+_EN_ORDINAL = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+               "nine": "ninth", "twelve": "twelfth"}
+_EN_MONTHS = ("January February March April May June July August September October November December").split()
+
+
+def _zh_under_10k(n: int) -> str:
+    out, zero = [], False
+    for value, unit in ((1000, "千"), (100, "百"), (10, "十"), (1, "")):
+        d = n // value % 10
+        if d:
+            if zero:
+                out.append("零")
+            out.append(_ZH_DIGITS[d] + unit)
+            zero = False
+        elif out:
+            zero = True
+    return "".join(out)
+
+
+def zh_int(n: int) -> str:
+    if n == 0:
+        return "零"
+    if n < 0:
+        return "负" + zh_int(-n)
+    if len(str(n)) > 16:
+        return "".join(_ZH_DIGITS[int(c)] for c in str(n))
+    parts, need_zero = [], False
+    for value, unit in ((10 ** 12, "万亿"), (10 ** 8, "亿"), (10 ** 4, "万"), (1, "")):
+        section = n // value % 10000 if value < 10 ** 12 else n // value
+        if section:
+            if need_zero or (parts and section < 1000):
+                parts.append("零")
+            parts.append(_zh_under_10k(section) + unit)
+            need_zero = False
+        elif parts:
+            need_zero = True
+    text = "".join(parts)
+    return text[1:] if text.startswith("一十") else text
+
+
+def zh_number(s: str) -> str:
+    """'12,345.67' → 一万二千三百四十五点六七；以 0 开头的长串（编号 / 电话）逐位读"""
+    s = s.replace(",", "")
+    neg = s.startswith("-")
+    s = s.lstrip("-")
+    whole, _, frac = s.partition(".")
+    if len(whole) > 1 and whole.startswith("0"):
+        text = "".join(_ZH_DIGITS[int(c)] for c in whole)
+    else:
+        text = zh_int(int(whole or "0"))
+    if frac:
+        text += "点" + "".join(_ZH_DIGITS[int(c)] for c in frac)
+    return ("负" if neg else "") + text
+
+
+def _en_under_1000(n: int) -> str:
+    words = []
+    if n >= 100:
+        words += [_EN_ONES[n // 100], "hundred"]
+        n %= 100
+    if n >= 20:
+        words.append(_EN_TENS[n // 10] + (f"-{_EN_ONES[n % 10]}" if n % 10 else ""))
+    elif n or not words:
+        words.append(_EN_ONES[n])
+    return " ".join(words)
+
+
+def en_int(n: int) -> str:
+    if n < 0:
+        return "minus " + en_int(-n)
+    if n < 1000:
+        return _en_under_1000(n)
+    if n >= 10 ** 15:
+        return " ".join(_EN_ONES[int(c)] for c in str(n))
+    words = []
+    for value, name in ((10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"), (1, "")):
+        chunk = n // value % 1000
+        if chunk:
+            words.append(_en_under_1000(chunk) + (f" {name}" if name else ""))
+    return " ".join(words)
+
+
+def en_number(s: str) -> str:
+    s = s.replace(",", "")
+    neg = s.startswith("-")
+    whole, _, frac = s.lstrip("-").partition(".")
+    text = en_int(int(whole or "0"))
+    if frac:
+        text += " point " + " ".join(_EN_ONES[int(c)] for c in frac)
+    return ("minus " if neg else "") + text
+
+
+def en_ordinal(n: int) -> str:
+    """1 → first，21 → twenty-first，40 → fortieth"""
+    words = en_int(n)
+    cut = max(words.rfind(" "), words.rfind("-")) + 1
+    head, last = words[:cut], words[cut:]
+    if last in _EN_ORDINAL:
+        return head + _EN_ORDINAL[last]
+    return head + (last[:-1] + "ieth" if last.endswith("y") else last + "th")
+
+
+def en_year(n: int) -> str:
+    """1999 → nineteen ninety-nine；2000~2009 及其他按普通整数读"""
+    if 1100 <= n < 2000 or 2010 <= n < 2100:
+        high, low = divmod(n, 100)
+        return f"{en_int(high)} " + (en_int(low) if low >= 10 else f"oh {en_int(low)}" if low else "hundred")
+    return en_int(n)
+
+
+def en_fraction(num: int, den: int) -> str:
+    """1/2 → one half，3/4 → three quarters，5/16 → five sixteenths；分母太大时读作 x over y"""
+    if den == 0 or den > 100:
+        return f"{en_int(num)} over {en_int(den)}"
+    if den == 1:
+        return en_int(num)
+    name = {2: "half", 4: "quarter"}.get(den) or en_ordinal(den)
+    if num != 1:
+        name = "halves" if den == 2 else name + "s"
+    return f"{en_int(num)} {name}"
+
+
+def _version_zh(m: "re.Match") -> str:
+    text = m.group(0)
+    prefix = text[0] if text[0] in "vV" else ""
+    return prefix + "点".join(zh_int(int(p)) for p in text[len(prefix):].split("."))
+
+
+def _version_en(m: "re.Match") -> str:
+    text = m.group(0)
+    prefix = "version " if text[0] in "vV" else ""
+    return prefix + " point ".join(en_int(int(p)) for p in text.lstrip("vV").split("."))
+
+
+def _money_zh(m: "re.Match") -> str:
+    amount = m.group(2).replace(",", "")
+    if "." in amount:
+        amount = amount.rstrip("0").rstrip(".")
+    unit = _CURRENCY_ZH[m.group(1)]
+    # ¥20 元：后面已经写了单位的不再重复
+    if m.string[m.end():m.end() + 4].lstrip(" \t").startswith(unit):
+        unit = ""
+    return zh_number(amount) + unit
+
+
+def _money_en(m: "re.Match") -> str:
+    """$3.50 → three dollars and fifty cents；没有辅币的币种按小数读"""
+    unit, minor = _CURRENCY_EN[m.group(1)]
+    whole, _, frac = m.group(2).replace(",", "").partition(".")
+    if frac and (not minor or len(frac) != 2):
+        return f"{en_number(m.group(2))} {unit}s"
+    n, cents = int(whole or "0"), int(frac or "0")
+    words = []
+    if n or not cents:
+        words.append(f"{en_int(n)} {unit}" + ("" if n == 1 or unit == "yuan" else "s"))
+    if cents:
+        plural = "pence" if minor == "penny" else minor + "s"
+        words.append(f"{en_int(cents)} {minor if cents == 1 else plural}")
+    return " and ".join(words)
+
+
+def _digits_zh(s: str) -> str:
+    return "".join(_ZH_DIGITS[int(c)] if c.isdigit() else "点" if c == "." else "" for c in s)
+
+
+def _digits_en(s: str) -> str:
+    return " ".join(_EN_ONES[int(c)] if c.isdigit() else "point" for c in s if c != ",")
+
+
+def _hyphen_parts(m: "re.Match") -> Optional[List[str]]:
+    """连字符数字串是否是范围：两段，且后面跟单位 / 百分号，或前小后大且都不以 0 开头；是则返回两段"""
+    parts = m.group(0).split("-")
+    if len(parts) != 2:
+        return None
+    if _UNIT_AHEAD.match(m.string, m.end()):
+        return parts
+    if any(len(p.split(".")[0]) > 1 and p.startswith("0") for p in parts):
+        return None
+    return parts if float(parts[0].replace(",", "")) < float(parts[1].replace(",", "")) else None
+
+
+def _hyphen_zh(m: "re.Match") -> str:
+    parts = _hyphen_parts(m)
+    if parts:
+        # 20-30% → 百分之二十到百分之三十
+        percent = "%" if _PERCENT_AHEAD.match(m.string, m.end()) else ""
+        return f"{parts[0]}{percent}到{parts[1]}"
+    return "，".join(_digits_zh(p) for p in m.group(0).split("-"))
+
+
+def _hyphen_en(m: "re.Match") -> str:
+    parts = _hyphen_parts(m)
+    if parts:
+        return f"{parts[0]} to {parts[1]}"
+    return ", ".join(_digits_en(p) for p in m.group(0).split("-"))
+
+
+def _expand_zh(text: str) -> str:
+    text = _TILDE_RANGE.sub("到", text)
+    text = _TIME_RANGE.sub("到", text)
+    text = _WORD_HYPHEN.sub(" ", text)
+    text = _VERSION.sub(_version_zh, text)
+    text = _CURRENCY.sub(_money_zh, text)
+    text = _DATE.sub(lambda m: f"{_digits_zh(m.group(1))}年{zh_int(int(m.group(2)))}月{zh_int(int(m.group(3)))}日", text)
+    text = _TIME.sub(lambda m: f"{zh_int(int(m.group(1)))}点" + (f"{zh_number(m.group(2))}分" if int(m.group(2)) else "整"),
+                     text)
+    text = _HYPHEN_GROUP.sub(_hyphen_zh, text)
+    text = _YEAR.sub(lambda m: _digits_zh(m.group(1)), text)
+    text = _PERCENT.sub(lambda m: "百分之" + zh_number(m.group(1)), text)
+    text = _RANGE.sub(lambda m: zh_number(m.group(1)) + "到", text)
+    text = _FRACTION.sub(lambda m: f"{zh_number(m.group(2))}分之{zh_number(m.group(1))}", text)
+    text = _NUM_UNIT.sub(lambda m: zh_number(m.group(1)) + _UNIT_MAP[m.group(2)][0], text)
+    text = _NUMBER.sub(lambda m: zh_number(m.group(0)), text)
+    text = _TILDE.sub("约", text)
+    for sym, word in _SYMBOLS_ZH:
+        text = text.replace(sym, word)
+    return text
+
+
+def _expand_en(text: str) -> str:
+    text = _TILDE_RANGE.sub(" to ", text)
+    text = _TIME_RANGE.sub(" to ", text)
+    text = _WORD_HYPHEN.sub(" ", text)
+    text = _VERSION.sub(_version_en, text)
+    text = _CURRENCY.sub(_money_en, text)
+    text = _TIME.sub(lambda m: f"{en_int(int(m.group(1)))} " + (en_int(int(m.group(2))) if int(m.group(2))
+                                                                 else "o'clock"), text)
+    text = _DATE.sub(lambda m: f"{_EN_MONTHS[int(m.group(2)) - 1]} {en_ordinal(int(m.group(3)))}, "
+                               f"{en_year(int(m.group(1)))}", text)
+    text = _HYPHEN_GROUP.sub(_hyphen_en, text)
+    text = _PERCENT.sub(lambda m: en_number(m.group(1)) + " percent", text)
+    text = _RANGE.sub(lambda m: en_number(m.group(1)) + " to ", text)
+    text = _FRACTION.sub(lambda m: en_fraction(int(m.group(1)), int(m.group(2))), text)
+    text = _NUM_UNIT.sub(lambda m: f"{en_number(m.group(1))} {_UNIT_MAP[m.group(2)][1]}", text)
+    text = _NUMBER.sub(lambda m: en_number(m.group(0)), text)
+    text = _TILDE.sub("about ", text)
+    for sym, word in _SYMBOLS_EN:
+        text = text.replace(sym, word)
+    return text
+
+
+def _line_breaks(text: str, zh: bool) -> str:
+    """换行处没有标点的补上句读；多余空白合并"""
+    lines = [ln.strip() for ln in text.split("\n")]
+    out: List[str] = []
+    for ln in lines:
+        if not ln:
+            continue
+        if out and out[-1][-1] not in _ZH_PUNCT:
+            out[-1] += "，" if zh else ","
+        out.append(ln)
+    if zh:
+        return _ZH_SPACE.sub("", _SPACES.sub(" ", "".join(out)))
+    return _SPACES.sub(" ", " ".join(out))
+
+
+def normalize(text: str, lang: Optional[str] = None, line_start: bool = True) -> str:
+    """
+    规范化一段要合成的文本；lang 为 zh / en，缺省按是否含汉字判断
+    line_start=False 表示这段接在一行的中间（流式切分时），行首规则（标题、列表编号）不作用于第一行
+    """
+    if not text or not _NEEDS_WORK.search(text):
+        return text.strip()
+    zh = _CJK.search(text) is not None if lang is None else lang == "zh"
+    if not line_start:
+        text = "\x00" + text
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _CODE_FENCE.sub("\n", text)
+    text = _IMAGE.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _URL.sub("", text)
+    text = _HTML.sub("", text)
+    text = _INLINE_CODE.sub(r"\1", text)
+    text = _HR.sub("", text)
+    text = _TABLE_SEP.sub("", text)
+    text = _HEADING.sub("", text)
+    text = _QUOTE.sub("", text)
+    text = _BULLET.sub("", text)
+    text = _NUMBERED.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    text = _TABLE_EDGE.sub("", text)
+    text = _PIPE.sub("，" if zh else ", ", text)
+    text = _EMOJI.sub("", text)
+    text = _expand_zh(text) if zh else _expand_en(text)
+    text = text.replace("\x00", "")
+    return _line_breaks(_BLANK_LINES.sub("\n", text), zh).strip(" ，,")
+
+
+# 流式切分点：中文句末标点、换行；英文句点后需跟空白（避免切开 3.14）
+_BOUNDARY = re.compile(r"[。！？；!?;…]+[”’\"』」)）]*|\n|\.(?=\s)")
+_LOOKBACK = 8
+
+
+class StreamingNormalizer:
+    """
+    增量规范化流式 token：feed() 返回可以送去合成的完整句子（可能为空串），flush() 输出剩余部分
+
+        norm = StreamingNormalizer()
+        async for piece in stream:
+            sentence = norm.feed(piece)
+            if sentence: ...
+        tail = norm.flush()
+    """
+
+    def __init__(self, lang: Optional[str] = None, min_chars: int = 1):
+        self.lang = lang
+        self.min_chars = min_chars     # 切出的句子（原文去掉首尾空白）短于这个长度时并入下一句
+        self._buf = ""
+        self._line_start = True
+        # 增量扫描：_counted 之前的 ``` 个数已记入 _fences（只看奇偶），切分点只在新来的文本附近找
+        self._fences = 0
+        self._counted = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def _cut(self, start: int) -> int:
+        """start 之后最后一个可切分位置（0 表示还不能输出）；未闭合的代码块之内不切"""
+        cut = 0
+        for m in _BOUNDARY.finditer(self._buf, start):
+            end = m.end()
+            if end > self._counted:
+                self._fences += self._buf.count("```", self._counted, end)
+                self._counted = end
+            if self._fences % 2 == 0:
+                cut = end
+        return cut
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return ""
+        self.chars_in += len(chunk)
+        # 往回多看几个字符：上一段末尾的 "." / 句末标点后的引号要和新来的字符一起判断
+        start = max(0, len(self._buf) - _LOOKBACK)
+        self._buf += chunk
+        cut = self._cut(start)
+        if cut == 0 or len(self._buf[:cut].strip()) < self.min_chars:
+            # 太短（如单独的“好。”）留在缓冲里，和下一句一起输出
+            return ""
+        segment, self._buf = self._buf[:cut], self._buf[cut:]
+        self._counted -= cut
+        return self._emit(segment)
+
+    def _emit(self, segment: str) -> str:
+        out = normalize(segment, self.lang, self._line_start)
+        self._line_start = segment.endswith("\n")
+        self.chars_out += len(out)
+        return out
+
+    def flush(self) -> str:
+        segment, self._buf = self._buf, ""
+        self._fences = self._counted = 0
+        return self._emit(segment) if segment.strip() else ""
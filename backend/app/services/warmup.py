@@ -0,0 +1,107 @@
+# backend/app/services/warmup.py
+"""
+预置角色语音预热：启动后在后台把每个角色的问候语与技能示例合成好放进音频缓存，
+用户打开角色时 /v1/roles/{name}/greeting、/v1/tts 直接命中缓存，不访问上游。
+
+环境变量：
+  TTS_WARMUP=1                 # 启动时自动预热（需配置 OPENAI_API_KEY 或 UPSTREAM_KEYS）
+  TTS_WARMUP_CONCURRENCY=4     # 同时进行的上游 TTS 请求数
+"""
+from __future__ import annotations
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from ..core.keypool import has_keys
+from ..core.scheduler import priority
+from ..core.tracing import span
+from ..presets.registry import RoleRecord, get_registry
+from . import tts
+
+TTS_WARMUP = os.getenv("TTS_WARMUP", "1") == "1"
+TTS_WARMUP_CONCURRENCY = int(os.getenv("TTS_WARMUP_CONCURRENCY", "4"))
+DEFAULT_SPEED = 1.0
+
+
+@dataclass
+class WarmupItem:
+    role: str
+    kind: str      # greeting / example
+    label: str     # 技能名（问候语为空）
+    text: str
+    voice: str
+
+
+def role_greeting(role: RoleRecord) -> str:
+    """与前端选择角色后展示的开场白一致"""
+    return (f"你好！我是{role.name}。{role.personality} 你想和我聊些什么呢？"
+            f"我擅长{'、'.join(role.skill_names)}。")
+
+
+def warmup_items() -> List[WarmupItem]:
+    items = []
+    for role in get_registry().listed_roles:
+        items.append(WarmupItem(role.name, "greeting", "", role_greeting(role), role.voice))
+        for skill in role.skills:
+            if skill.example:
+                items.append(WarmupItem(role.name, "example", skill.name, skill.example, role.voice))
+    return items
+
+
+_status: Dict = {"state": "idle"}
+_task: Optional[asyncio.Task] = None
+
+
+def warmup_status() -> Dict:
+    return dict(_status)
+
+
+async def run_warmup(concurrency: int = TTS_WARMUP_CONCURRENCY) -> Dict:
+    """并发（有上限）合成全部预热条目；已在缓存中的直接跳过"""
+    items = warmup_items()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    _status.update(state="running", total=len(items), rendered=0, cached=0, failed=0,
+                   started_at=time.time(), finished_at=None)
+
+    async def render(item: WarmupItem) -> None:
+        async with sem:
+            try:
+                url, hit = await tts.render_cached(item.text, item.voice, DEFAULT_SPEED)
+            except Exception as e:
+                print(f"[WARMUP] {item.role}/{item.kind}{item.label} 失败: {e}")
+                url, hit = None, False
+        if url is None:
+            _status["failed"] += 1
+        elif hit:
+            _status["cached"] += 1
+        else:
+            _status["rendered"] += 1
+
+    with span("warmup.tts", items=len(items)), priority("background"):
+        await asyncio.gather(*(render(it) for it in items))
+    _status.update(state="done", finished_at=time.time())
+    print(f"[WARMUP] 完成：新合成 {_status['rendered']}，已缓存 {_status['cached']}，失败 {_status['failed']}")
+    return warmup_status()
+
+
+def start_background_warmup() -> Optional[asyncio.Task]:
+    """在当前事件循环上启动预热任务；已在运行则返回原任务"""
+    global _task
+    if _task is not None and not _task.done():
+        return _task
+    if not has_keys():
+        _status.update(state="skipped", reason="未配置上游 API key")
+        return None
+    _task = asyncio.get_running_loop().create_task(run_warmup())
+    return _task
+
+
+async def stop_background_warmup() -> None:
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except (asyncio.CancelledError, Exception):
+            pass
@@ -0,0 +1 @@
+# backend/bench: 压测与基准脚本（python -m bench.<name>）
@@ -0,0 +1,190 @@
+# backend/bench/fake_s3.py
+"""
+本地假 S3：路径式寻址的最小实现，供对象存储联调（不校验签名，只检查带了 SigV4 头）
+
+  PUT    /<bucket>/<key>
+  GET    /<bucket>/<key>          支持 Range: bytes=a-b
+  HEAD   /<bucket>/<key>
+  DELETE /<bucket>/<key>
+  GET    /<bucket>?list-type=2&prefix=...&continuation-token=...   ListObjectsV2（每页 max-keys，默认 1000）
+
+  python -m bench.fake_s3 --port 9200
+  STORAGE_BACKEND=s3 S3_ENDPOINT=http://127.0.0.1:9200 S3_BUCKET=voice S3_ACCESS_KEY=x S3_SECRET_KEY=y uvicorn app.main:app
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+
+class FakeS3:
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", page_size: int = 1000):
+        self.page_size = page_size
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str, float]] = {}   # (bucket, key) -> (数据, 类型, 时间)
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeS3":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                if "Content-Length" not in (headers or {}):
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body and self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _route(self) -> Optional[Tuple[str, str, Dict[str, str]]]:
+                if not (self.headers.get("Authorization") or "").startswith("AWS4-HMAC-SHA256 "):
+                    self._send(403, b"<Error><Code>AccessDenied</Code></Error>")
+                    return None
+                with fake._lock:
+                    fake.requests[self.command] = fake.requests.get(self.command, 0) + 1
+                parsed = urlparse(self.path)
+                bucket, _, key = unquote(parsed.path).lstrip("/").partition("/")
+                query = {k: v[0] for k, v in parse_qs(parsed.query, keep_blank_values=True).items()}
+                return bucket, key, query
+
+            def _object_headers(self, data: bytes, ctype: str, mtime: float) -> Dict[str, str]:
+                return {"Content-Type": ctype, "ETag": f'"{hashlib.md5(data).hexdigest()}"',
+                        "Last-Modified": formatdate(mtime, usegmt=True), "Accept-Ranges": "bytes"}
+
+            def do_PUT(self):
+                route = self._route()
+                if route is None:
+                    return
+                bucket, key, _ = route
+                data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                ctype = self.headers.get("Content-Type") or "application/octet-stream"
+                with fake._lock:
+                    fake.objects[(bucket, key)] = (data, ctype, time.time())
+                self._send(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+            def do_HEAD(self):
+                route = self._route()
+                if route is None:
+                    return
+                bucket, key, _ = route
+                obj = fake.objects.get((bucket, key))
+                if obj is None:
+                    self._send(404)
+                    return
+                self._send(200, headers={**self._object_headers(*obj), "Content-Length": str(len(obj[0]))})
+
+            def do_DELETE(self):
+                route = self._route()
+                if route is None:
+                    return
+                bucket, key, _ = route
+                with fake._lock:
+                    fake.objects.pop((bucket, key), None)
+                self._send(204)
+
+            def do_GET(self):
+                route = self._route()
+                if route is None:
+                    return
+                bucket, key, query = route
+                if not key:
+                    self._list(bucket, query)
+                    return
+                obj = fake.objects.get((bucket, key))
+                if obj is None:
+                    self._send(404, b"<Error><Code>NoSuchKey</Code></Error>")
+                    return
+                data = obj[0]
+                headers = self._object_headers(*obj)
+                rng = self.headers.get("Range")
+                if rng and rng.startswith("bytes="):
+                    first, _, last = rng[6:].partition("-")
+                    start = int(first) if first else max(0, len(data) - int(last))
+                    end = min(int(last), len(data) - 1) if first and last else len(data) - 1
+                    if start >= len(data):
+                        self._send(416, headers={"Content-Range": f"bytes */{len(data)}"})
+                        return
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+                    self._send(206, data[start:end + 1], headers)
+                    return
+                self._send(200, data, headers)
+
+            def _list(self, bucket: str, query: Dict[str, str]):
+                prefix = query.get("prefix", "")
+                start = int(query.get("continuation-token") or 0)
+                size = int(query.get("max-keys") or fake.page_size)
+                with fake._lock:
+                    keys = sorted(k for b, k in fake.objects if b == bucket and k.startswith(prefix))
+                    page = [(k, fake.objects[(bucket, k)]) for k in keys[start:start + size]]
+                truncated = start + size < len(keys)
+                items = "".join(
+                    f"<Contents><Key>{escape(k)}</Key>"
+                    f"<LastModified>{time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(m))}</LastModified>"
+                    f"<ETag>&quot;{hashlib.md5(d).hexdigest()}&quot;</ETag><Size>{len(d)}</Size></Contents>"
+                    for k, (d, _, m) in page
+                )
+                body = (
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                    f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+                    + (f"<NextContinuationToken>{start + size}</NextContinuationToken>" if truncated else "")
+                    + items + "</ListBucketResult>"
+                ).encode("utf-8")
+                self._send(200, body, {"Content-Type": "application/xml"})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 S3")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+    fake = FakeS3(args.port, args.host, args.page_size)
+    print(f"fake S3 listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# backend/bench/fake_upstream.py
+"""
+本地假上游：模拟七牛网关 / deepseek 的四个接口，供压测与离线联调使用
+
+  POST /chat/completions   （支持 stream=true 的 SSE）
+  POST /voice/tts          返回一段合法的静音 mp3（base64）
+  POST /voice/asr          返回固定识别文本
+  GET  /voice/list         返回音色列表
+
+延迟与错误分布可配置：
+  python -m bench.fake_upstream --port 9100 --latency chat=lognormal:6.2,0.4 --latency tts=uniform:150,400 \\
+      --error-rate 0.01 --rate-limit-rate 0.02
+
+延迟格式（单位 ms）：fixed:50 / uniform:20,80 / normal:100,20 / lognormal:mu,sigma（ln ms）
+"""
+from __future__ import annotations
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, 单声道；每帧 417 字节、1152 采样
+_MP3_FRAME = bytes.fromhex("fffb90c4") + b"\x00" * 413
+
+ENDPOINTS = ("chat", "tts", "asr", "list")
+
+CANNED_REPLY = (
+    "**好问题！**让我们一步一步来看。\n"
+    "1. 首先，万有引力存在于任何两个有质量的物体之间。\n"
+    "2. 其次，引力大小与质量乘积成正比，与距离平方成反比。\n"
+    "你能想到生活中的一个例子吗？😊"
+)
+
+
+def parse_latency(spec: str):
+    """把 'uniform:20,80' 之类的描述转成一个无参采样函数（返回秒）"""
+    kind, _, args = spec.partition(":")
+    nums = [float(x) for x in args.split(",") if x.strip()] if args else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda: nums[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(nums[0], nums[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(nums[0], nums[1])) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(nums[0], nums[1]) / 1000
+    raise ValueError(f"未知延迟分布: {spec}")
+
+
+@dataclass
+class FakeProfile:
+    latency: Dict[str, str] = field(default_factory=lambda: {
+        "chat": "lognormal:6.5,0.35",    # 中位数约 665ms
+        "tts": "uniform:150,400",
+        "asr": "uniform:300,800",
+        "list": "fixed:20",
+    })
+    error_rate: float = 0.0         # 返回 500 的概率
+    rate_limit_rate: float = 0.0    # 返回 429 的概率
+    stream_chunks: int = 12         # 流式回复切成几段
+    seed: Optional[int] = None
+
+    def sampler(self, endpoint: str):
+        return parse_latency(self.latency.get(endpoint, "fixed:0"))
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {k: 0 for k in ENDPOINTS}
+        self.errors: Dict[str, int] = {k: 0 for k in ENDPOINTS}
+        self.aborted = 0    # 回写时对端已断开（服务端取消了上游请求）
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors), "aborted": self.aborted}
+
+
+def _make_handler(profile: FakeProfile, stats: _Stats):
+    samplers = {k: profile.sampler(k) for k in ENDPOINTS}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):  # 压测时不刷屏
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                with stats.lock:
+                    stats.aborted += 1
+
+        def _send_json(self, status: int, obj) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            n = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(n) if n else b""
+            try:
+                return json.loads(raw or b"{}")
+            except ValueError:
+                return {}
+
+        def _inject_fault(self, endpoint: str) -> bool:
+            with stats.lock:
+                stats.calls[endpoint] += 1
+            time.sleep(samplers[endpoint]())
+            r = random.random()
+            status = None
+            if r < profile.error_rate:
+                status = 500
+            elif r < profile.error_rate + profile.rate_limit_rate:
+                status = 429
+            if status:
+                with stats.lock:
+                    stats.errors[endpoint] += 1
+                self._send_json(status, {"error": {"message": f"fake upstream {status}"}})
+                return True
+            return False
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/voice/list"):
+                if self._inject_fault("list"):
+                    return
+                self._send_json(200, [
+                    {"voice_name": "渊博学科男教师", "voice_type": "qiniu_zh_male_ybxknjs"},
+                    {"voice_name": "温婉学科讲师", "voice_type": "qiniu_zh_female_wwxkjx"},
+                    {"voice_name": "英式英语男", "voice_type": "qiniu_en_male_ysyyn"},
+                ])
+            elif self.path.rstrip("/").endswith("/__stats"):
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            body = self._read_json()
+            if path.endswith("/chat/completions"):
+                if self._inject_fault("chat"):
+                    return
+                if body.get("stream"):
+                    self._stream_chat(body)
+                else:
+                    self._send_json(200, {
+                        "id": "fake-chat",
+                        "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": CANNED_REPLY},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 180, "completion_tokens": 96, "total_tokens": 276},
+                    })
+            elif path.endswith("/voice/tts"):
+                if self._inject_fault("tts"):
+                    return
+                text = (body.get("request") or {}).get("text", "")
+                frames = max(4, min(400, len(text) // 2))   # 粗略：字数越多音频越长
+                self._send_json(200, {
+                    "reqid": "fake-tts",
+                    "data": base64.b64encode(_MP3_FRAME * frames).decode("ascii"),
+                    "addition": {"duration": str(int(frames * 1152 / 44.1))},
+                })
+            elif path.endswith("/voice/asr"):
+                if self._inject_fault("asr"):
+                    return
+                self._send_json(200, {
+                    "reqid": "fake-asr",
+                    "data": {"audio_info": {"duration": 2300},
+                             "result": {"text": "什么是万有引力"}},
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _stream_chat(self, body: dict) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            n = max(1, profile.stream_chunks)
+            step = max(1, len(CANNED_REPLY) // n)
+            pieces = [CANNED_REPLY[i:i + step] for i in range(0, len(CANNED_REPLY), step)]
+            for piece in pieces:
+                chunk = {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            usage = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "usage": {"prompt_tokens": 180, "completion_tokens": 96, "total_tokens": 276}}
+            self._write_chunk(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class FakeUpstream:
+    """在后台线程里跑的假上游服务器；base_url 可直接作为 OPENAI_BASE_URL"""
+
+    def __init__(self, profile: Optional[FakeProfile] = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or FakeProfile()
+        if self.profile.seed is not None:
+            random.seed(self.profile.seed)
+        self.stats = _Stats()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self.profile, self.stats))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeUpstream":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="本地假七牛/deepseek 上游")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--latency", action="append", default=[],
+                   help="endpoint=分布，例如 chat=fixed:500；endpoint ∈ chat/tts/asr/list")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-limit-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=None)
+    return p.parse_args(argv)
+
+
+def profile_from_args(args) -> FakeProfile:
+    profile = FakeProfile(error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    for item in args.latency:
+        ep, _, spec = item.partition("=")
+        parse_latency(spec)  # 提前校验
+        profile.latency[ep.strip()] = spec.strip()
+    return profile
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    fake = FakeUpstream(profile_from_args(args), host=args.host, port=args.port)
+    print(f"[FAKE] listening on {fake.base_url}  latency={fake.profile.latency}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
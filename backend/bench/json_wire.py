@@ -0,0 +1,132 @@
+# backend/bench/json_wire.py
+"""
+JSON 编码与线上字节数基准：按接口构造贴近实际的响应体，对比
+
+  - 编码耗时：Starlette 默认 JSONResponse（标准库 json） vs TracedJSONResponse（orjson，未安装时同为标准库）
+  - 线上字节：原始 / gzip（动态压缩级别）/ br（装了 brotli 时），以及压缩耗时
+  - 页面：static/ 下的测试页，预压缩后（最高级别）的字节数
+
+  cd backend
+  python -m bench.json_wire
+  python -m bench.json_wire --turns 40 --repeat 500
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.core import compression  # noqa: E402
+from app.core.responses import JSON_ENCODER, dumps_json  # noqa: E402
+from bench.fake_upstream import CANNED_REPLY  # noqa: E402
+
+
+def _roles_chat(turns: int) -> Dict[str, Any]:
+    """/v1/roles/chat：回复 + 完整的累计 history"""
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"第 {i + 1} 个问题：为什么苹果会落地？能再举个例子吗？"})
+        history.append({"role": "assistant", "content": CANNED_REPLY})
+    return {"character": "牛顿", "response": CANNED_REPLY, "history": history,
+            "conversation_count": turns, "audio_url": "http://localhost:8000/media/audio/" + "a" * 32 + ".mp3"}
+
+
+def _asr(seconds: int) -> Dict[str, Any]:
+    """/v1/asr：识别文本 + 上游原始结果（逐句 / 逐词时间戳）"""
+    rnd = random.Random(seconds)
+    words = [{"text": w, "start_time": i * 280, "end_time": i * 280 + 250, "confidence": round(rnd.random(), 3)}
+             for i, w in enumerate("今天我们来聊一聊万有引力定律和它的发现过程" * (seconds // 4))]
+    utterances = [{"text": "".join(w["text"] for w in words[i:i + 20]), "start_time": words[i]["start_time"],
+                   "end_time": words[min(i + 19, len(words) - 1)]["end_time"], "words": words[i:i + 20]}
+                  for i in range(0, len(words), 20)]
+    text = "".join(u["text"] for u in utterances)
+    raw = {"reqid": "9f8e7d6c5b4a", "code": 0, "message": "success",
+           "data": {"audio_info": {"duration": seconds * 1000},
+                    "result": {"text": text, "utterances": utterances, "additions": {"duration": str(seconds * 1000)}}}}
+    return {"success": True, "text": text, "audio_url": "http://localhost:8000/media/uploads/" + "b" * 32 + ".webm",
+            "audio_format": "webm", "file_size": seconds * 16000, "language": "zh", "cached": False,
+            "qiniu_reqid": raw["reqid"], "raw_response": raw, "duration": seconds * 1000}
+
+
+def _chat_b64(kb: int) -> Dict[str, Any]:
+    """/v1/chat：ChatResp 带内联 tts_b64（mp3 的 base64）"""
+    rnd = random.Random(kb)
+    audio = bytes(rnd.getrandbits(8) for _ in range(kb * 1024))
+    import base64
+    return {"session_id": "s" * 32, "role_name": "牛顿", "reply_text": CANNED_REPLY,
+            "audio_url": None, "tts_b64": base64.b64encode(audio).decode("ascii")}
+
+
+def _roles_list() -> Dict[str, Any]:
+    """/v1/roles/list：直接取接口的真实输出"""
+    from app.api.routes_roles import list_characters
+    return json.loads(list_characters().body)
+
+
+def _best_us(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / repeat)
+    return best * 1e6
+
+
+def _row(payload: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    std = JSONResponse(payload).body
+    fast = dumps_json(payload)
+    assert json.loads(std) == json.loads(fast)
+    row = {
+        "raw_bytes": len(fast),
+        "encode_us": {"json": round(_best_us(lambda: JSONResponse.render(None, payload), repeat), 1),
+                      JSON_ENCODER: round(_best_us(lambda: dumps_json(payload), repeat), 1)},
+        "wire_bytes": {"identity": len(fast)},
+        "compress_us": {},
+    }
+    for enc in compression.supported_encodings():
+        row["wire_bytes"][enc] = len(compression.compress(fast, enc))
+        row["compress_us"][enc] = round(_best_us(lambda: compression.compress(fast, enc), max(1, repeat // 10)), 1)
+    return row
+
+
+def run(turns: int, asr_seconds: int, b64_kb: int, repeat: int) -> Dict[str, Any]:
+    endpoints = {
+        f"POST /v1/roles/chat ({turns} turns)": _roles_chat(turns),
+        f"POST /v1/asr ({asr_seconds}s, raw_response)": _asr(asr_seconds),
+        f"POST /v1/chat (tts_b64 {b64_kb}KB)": _chat_b64(b64_kb),
+        "GET /v1/roles/list": _roles_list(),
+    }
+    result: Dict[str, Any] = {"encoder": JSON_ENCODER, "compression": list(compression.supported_encodings()),
+                              "endpoints": {name: _row(p, repeat) for name, p in endpoints.items()}}
+
+    from app.services.static_assets import registry
+    pages = {}
+    for asset in registry.load_all():
+        pages[asset.name] = {"url": asset.url, **{enc: len(body) for enc, body in asset.bodies.items()}}
+    result["pages"] = pages
+    return result
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="JSON 编码 / 响应压缩基准")
+    p.add_argument("--turns", type=int, default=20, help="roles/chat 的历史轮数")
+    p.add_argument("--asr-seconds", type=int, default=60, help="ASR 录音时长（决定逐词结果大小）")
+    p.add_argument("--b64-kb", type=int, default=48, help="内联音频大小")
+    p.add_argument("--repeat", type=int, default=200)
+    args = p.parse_args(argv)
+    print(json.dumps(run(args.turns, args.asr_seconds, args.b64_kb, args.repeat), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
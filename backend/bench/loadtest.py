@@ -0,0 +1,377 @@
+# backend/bench/loadtest.py
+"""
+压测 / 延迟基准：用本地假上游驱动 app.main:app
+
+  cd backend
+  python -m bench.loadtest --users 50 --duration 60
+  python -m bench.loadtest --users 50 --duration 60 --compare bench/results/<上一次>.json
+
+流程：
+  1) 启动 bench.fake_upstream（延迟 / 错误分布可配）
+  2) 把 OPENAI_BASE_URL 等环境变量指向假上游，在临时工作目录里导入 app.main:app
+  3) uvicorn 在独立线程 + 独立事件循环中运行，同一个循环上挂一个探针测事件循环延迟
+  4) N 个虚拟用户按脚本循环：chat（文字对话 + 朗读）、voice（上传录音 → 对话 → 朗读）、session（/v1/session/start + /v1/chat）
+  5) 输出 RPS、各接口 p50/p95/p99 与事件循环延迟，并写入 bench/results/<时间>-<commit>.json
+  6) 服务端开启 LOOP_BLOCK_DEBUG，按阻塞位置汇总；--compare 时出现基线里没有的阻塞位置也算回归
+
+依赖：httpx（openai SDK 已带）、uvicorn
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.fake_upstream import FakeUpstream, profile_from_args, _MP3_FRAME  # noqa: E402
+
+QUESTIONS = ["你是谁", "教我一个咒语", "什么是万有引力", "怎样才能认识自己", "帮我分析一下这个案子", "给我写一首春天的诗"]
+CHARACTERS = ["苏格拉底", "牛顿", "哈利波特", "福尔摩斯", "孙悟空", "林黛玉"]
+VOICES = ["qiniu_zh_male_yxx", "qiniu_zh_male_standard", "qiniu_zh_female_gentle"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+        "mean": round(statistics.fmean(values), 2) if values else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, name: str, ms: float, ok: bool) -> None:
+        self.latencies.setdefault(name, []).append(ms)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+# =========================
+#  被测服务
+# =========================
+class LagProbe:
+    """挂在服务端事件循环上：每 interval 秒 sleep 一次，记录实际多睡了多久"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (loop.time() - t0 - self.interval) * 1000))
+
+
+class AppServer:
+    def __init__(self, port: int):
+        import uvicorn
+        from app.main import app
+
+        self.port = port
+        self.probe = LagProbe()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                                    log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self._run, name="bench-app", daemon=True)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        probe = loop.create_task(self.probe.run())
+        loop.run_until_complete(self.server.serve())
+        probe.cancel()
+        loop.run_until_complete(asyncio.gather(probe, return_exceptions=True))
+        loop.close()
+
+    def start(self) -> None:
+        self.thread.start()
+        deadline = time.time() + 15
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("被测服务启动超时")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+# =========================
+#  虚拟用户脚本
+# =========================
+async def _timed(client, rec: Recorder, name: str, method: str, url: str, **kw):
+    t0 = time.perf_counter()
+    ok = False
+    resp = None
+    try:
+        resp = await client.request(method, url, **kw)
+        ok = resp.status_code < 400
+    except Exception:
+        ok = False
+    rec.add(name, (time.perf_counter() - t0) * 1000, ok)
+    return resp if ok else None
+
+
+async def script_chat(client, rec: Recorder, turns: int) -> None:
+    await _timed(client, rec, "GET /v1/roles/list", "GET", "/v1/roles/list")
+    name = random.choice(CHARACTERS)
+    history = "[]"
+    for _ in range(turns):
+        resp = await _timed(client, rec, "POST /v1/roles/chat", "POST", "/v1/roles/chat",
+                            data={"character_name": name, "message": random.choice(QUESTIONS), "history": history})
+        if resp is None:
+            return
+        body = resp.json()
+        history = json.dumps(body.get("history", []), ensure_ascii=False)
+        await _timed(client, rec, "POST /v1/tts", "POST", "/v1/tts",
+                     data={"text": body.get("ai_response", ""), "voice_type": body.get("voice_type", VOICES[0])})
+
+
+async def script_voice(client, rec: Recorder, turns: int, clip: bytes) -> None:
+    name = random.choice(CHARACTERS)
+    history = "[]"
+    for _ in range(turns):
+        turn = {"X-Turn-Id": f"bench-{random.getrandbits(48):x}"}
+        resp = await _timed(client, rec, "POST /v1/asr", "POST", "/v1/asr", headers=turn,
+                            files={"file": ("recording.mp3", clip, "audio/mpeg")}, data={"language": "auto"})
+        if resp is None:
+            return
+        text = resp.json().get("text") or random.choice(QUESTIONS)
+        resp = await _timed(client, rec, "POST /v1/roles/chat", "POST", "/v1/roles/chat", headers=turn,
+                            data={"character_name": name, "message": text, "history": history})
+        if resp is None:
+            return
+        body = resp.json()
+        history = json.dumps(body.get("history", []), ensure_ascii=False)
+        await _timed(client, rec, "POST /v1/tts", "POST", "/v1/tts", headers=turn,
+                     data={"text": body.get("ai_response", ""), "voice_type": body.get("voice_type", VOICES[0])})
+
+
+async def script_session(client, rec: Recorder, turns: int) -> None:
+    resp = await _timed(client, rec, "POST /v1/session/start", "POST", "/v1/session/start",
+                        json={"role_name": random.choice(CHARACTERS), "memory_limit": 6})
+    if resp is None:
+        return
+    sid = resp.json()["session_id"]
+    for _ in range(turns):
+        await _timed(client, rec, "POST /v1/chat", "POST", "/v1/chat",
+                     json={"session_id": sid, "text": random.choice(QUESTIONS), "skill": "knowledge"})
+
+
+async def drive(base_url: str, users: int, duration: float, mix: Dict[str, float], turns: int) -> Recorder:
+    import httpx
+
+    rec = Recorder()
+    clip = _MP3_FRAME * 80
+    stop_at = time.perf_counter() + duration
+    names, weights = zip(*mix.items())
+
+    async def user(uid: int) -> None:
+        limits = httpx.Limits(max_connections=4)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            await asyncio.sleep(random.random() * 0.5)  # 错峰启动
+            while time.perf_counter() < stop_at:
+                kind = random.choices(names, weights)[0]
+                if kind == "voice":
+                    await script_voice(client, rec, turns, clip)
+                elif kind == "session":
+                    await script_session(client, rec, turns)
+                else:
+                    await script_chat(client, rec, turns)
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return rec
+
+
+# =========================
+#  报告与回归比较
+# =========================
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _loop_blocks() -> dict:
+    """服务端 loop_monitor 记录的阻塞，按位置（最内层业务代码帧）汇总"""
+    from app.core.loop_monitor import loop_monitor
+    culprits: Dict[str, int] = {}
+    for block in loop_monitor.stats(include_stacks=False)["blocks"]:
+        where = block.get("culprit", "?")
+        culprits[where] = culprits.get(where, 0) + 1
+    return {"count": sum(culprits.values()), "culprits": dict(sorted(culprits.items(), key=lambda kv: -kv[1]))}
+
+
+def build_report(rec: Recorder, elapsed: float, lag: List[float], upstream: dict, args,
+                 loop_blocks: Optional[dict] = None) -> dict:
+    endpoints = {}
+    total = 0
+    for name, values in sorted(rec.latencies.items()):
+        total += len(values)
+        endpoints[name] = {
+            "count": len(values),
+            "errors": rec.errors.get(name, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "latency_ms": _summary(values),
+        }
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"users": args.users, "duration": args.duration, "turns": args.turns,
+                   "mix": args.mix, "latency": args.latency, "error_rate": args.error_rate,
+                   "rate_limit_rate": args.rate_limit_rate},
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "errors": sum(rec.errors.values()),
+        "endpoints": endpoints,
+        "event_loop_lag_ms": _summary(lag),
+        "loop_blocks": loop_blocks or {"count": 0, "culprits": {}},
+        "upstream": upstream,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n== commit {report['commit']}  {report['requests']} req / {report['elapsed_s']}s "
+          f"= {report['rps']} rps  errors={report['errors']}")
+    print(f"{'endpoint':<28}{'count':>7}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, ep in report["endpoints"].items():
+        lat = ep["latency_ms"]
+        print(f"{name:<28}{ep['count']:>7}{ep['errors']:>6}{ep['rps']:>8}"
+              f"{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}")
+    lag = report["event_loop_lag_ms"]
+    print(f"event loop lag ms: p50={lag['p50']} p99={lag['p99']} max={lag['max']}")
+    blocks = report.get("loop_blocks") or {}
+    for where, n in (blocks.get("culprits") or {}).items():
+        print(f"  loop blocked x{n}: {where}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """返回回归项列表；p95 变差或 rps 下降超过 tolerance（比例）记为回归"""
+    regressions = []
+    print(f"\n== 对比基线 commit {baseline.get('commit')}")
+    for name, ep in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base:
+            continue
+        p95, b95 = ep["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        delta = (p95 - b95) / b95 if b95 else 0.0
+        print(f"{name:<28} p95 {b95:>9} → {p95:>9}  ({delta:+.1%})")
+        if delta > tolerance:
+            regressions.append(f"{name} p95 {b95}→{p95}")
+    rps, brps = report["rps"], baseline.get("rps", 0)
+    if brps and (brps - rps) / brps > tolerance:
+        regressions.append(f"rps {brps}→{rps}")
+    blag, lag = baseline.get("event_loop_lag_ms", {}).get("p99", 0), report["event_loop_lag_ms"]["p99"]
+    print(f"{'event loop lag p99':<28}     {blag:>9} → {lag:>9}")
+    known = set((baseline.get("loop_blocks") or {}).get("culprits", {}))
+    for where in (report.get("loop_blocks") or {}).get("culprits", {}):
+        if where not in known:
+            regressions.append(f"新的事件循环阻塞: {where}")
+    return regressions
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="AI 角色扮演后端压测")
+    p.add_argument("--users", type=int, default=20, help="并发虚拟用户数")
+    p.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    p.add_argument("--turns", type=int, default=3, help="每个脚本的对话轮数")
+    p.add_argument("--mix", default="chat=0.5,voice=0.3,session=0.2", help="脚本权重")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency", action="append", default=[], help="同 fake_upstream --latency")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-limit-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--out", default=None, help="结果文件路径（默认 bench/results/<时间>-<commit>.json）")
+    p.add_argument("--compare", default=None, help="与之前的结果文件对比")
+    p.add_argument("--tolerance", type=float, default=0.10, help="回归阈值（比例）")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    random.seed(args.seed)
+    mix = {k.strip(): float(v) for k, v in (x.split("=") for x in args.mix.split(","))}
+    # 下面会切换工作目录，先把用户给的相对路径定下来
+    out_path = Path(args.out).resolve() if args.out else None
+    compare_path = Path(args.compare).resolve() if args.compare else None
+
+    fake = FakeUpstream(profile_from_args(args)).start()
+
+    # 被测服务读取模块级环境变量，必须在导入 app 之前设置
+    os.environ.update({
+        "OPENAI_BASE_URL": fake.base_url,
+        "OPENAI_API_KEY": "sk-bench",
+        "USE_TTS": "1",
+        "OPENAI_TTS_MODE": "qiniu",
+        # ASR 只校验不是 localhost；假上游并不会真的回源拉取
+        "PUBLIC_BASE_URL": f"http://bench.invalid:{args.port}",
+        "TRACE_EXPORTER": os.getenv("TRACE_EXPORTER", "none"),
+        "LOOP_BLOCK_DEBUG": os.getenv("LOOP_BLOCK_DEBUG", "1"),
+        "LOOP_BLOCK_THRESHOLD_MS": os.getenv("LOOP_BLOCK_THRESHOLD_MS", "50"),
+    })
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(workdir)  # static/audio、static/uploads 写到临时目录
+
+    server = AppServer(args.port)
+    server.start()
+    print(f"[BENCH] app on :{args.port}, fake upstream {fake.base_url}, workdir {workdir}")
+
+    t0 = time.perf_counter()
+    try:
+        rec = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.users, args.duration, mix, args.turns))
+    finally:
+        elapsed = time.perf_counter() - t0
+        server.stop()
+        fake.stop()
+
+    report = build_report(rec, elapsed, server.probe.samples, fake.stats.snapshot(), args, _loop_blocks())
+    print_report(report)
+
+    out = out_path or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[BENCH] 结果已保存: {out}")
+
+    if compare_path:
+        baseline = json.loads(compare_path.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("[BENCH] 发现回归：\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
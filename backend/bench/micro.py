@@ -0,0 +1,344 @@
+# backend/bench/micro.py
+"""
+热点小函数的微基准：每个请求都会走到的纯 Python 辅助函数，固定数据集、可重复，输出 ns/op 与每次调用的分配
+
+  - 数据集（--seed 固定，默认 42）：--roles 个合成角色（中英文名 / 别名 / 技能）装入一份临时注册表，
+    --history 轮的长对话历史，以及文件名 / Content-Type / 各种形状的 ASR 响应 / 带 markdown 的回复
+  - 计时：每个用例对整批输入循环，自动加轮数使单次测量 ≥ --min-time 秒，重复 --repeat 次取最好与中位数；
+    计时期间关闭 GC，并扣除同样输入下空函数调用的循环开销
+  - 分配：CPython 不提供分配次数计数，这里报两项（tracemalloc）：
+      peak_B/op    单次调用期间的临时内存峰值（字节）
+      blocks/op    调用后净增的内存块数（缓存 / 泄漏会体现在这里，正常应接近 0）
+  - 基线：--save 写出 JSON；--compare 与基线逐项对比，ns/op 变慢超过 --threshold（默认 10%）记为退步，
+    有退步时退出码为 1（可直接放进 CI）
+
+  cd backend
+  python -m bench.micro
+  python -m bench.micro -k norm,search --roles 20000
+  python -m bench.micro --save bench/micro_baseline.json
+  python -m bench.micro --compare bench/micro_baseline.json
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.api import routes_audio, routes_roles  # noqa: E402
+from app.core.session_store import Scene, freeze  # noqa: E402
+from app.presets import registry  # noqa: E402
+from app.services import llm, persona_guard, scene, tts  # noqa: E402
+from app.services.tts_text import StreamingNormalizer, normalize  # noqa: E402
+from bench.tts_normalize import REPLIES  # noqa: E402
+
+_SURNAMES = "李王张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗"
+_GIVEN = "白甫轩然子明清风云月山海天星辰雨雪华文武"
+_LATIN = ["isaac", "marie", "ada", "alan", "albert", "nikola", "charles", "grace", "leonardo", "galileo"]
+_SKILLS = ["knowledge", "socratic", "teacher", "detective", "poet"]
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable[..., Any]
+    inputs: Sequence[Tuple]          # 每个元素是一次调用的参数
+
+
+# =========================
+#  数据集
+# =========================
+def synthetic_roles(n: int, rng: random.Random) -> List[Dict]:
+    """n 个合成角色（与 presets/data/*.json 同结构），名称互不冲突"""
+    roles = []
+    for i in range(n):
+        zh = rng.choice(_SURNAMES) + rng.choice(_GIVEN) + f"{i}号"
+        en = f"{rng.choice(_LATIN)} {i}"
+        roles.append({
+            "id": f"r{i}",
+            "order": i,
+            "name": zh,
+            "aliases": [en, f"{en.replace(' ', '_')}.bot"],
+            "voice": "qiniu_zh_female_wwxkjx",
+            "tts_voice": "qiniu_zh_male_ybxknjs" if i % 3 else "",
+            "system_prompt": f"你是{zh}。" * 5,
+            "taboo": ["AI", "人工智能"],
+            "skills": [{"name": s, "description": s, "example": s} for s in rng.sample(_SKILLS, 2)],
+        })
+    return roles
+
+
+def role_queries(names: List[str], rng: random.Random, n: int = 200) -> List[str]:
+    """命中（原样 / 大小写空格变体 / 别名）与不命中各一部分"""
+    out = []
+    for _ in range(n):
+        name = rng.choice(names)
+        out.append(rng.choice([name, f" {name.upper()} ", name.replace(" ", "·"), f"未知角色{rng.randint(0, 9999)}"]))
+    return out
+
+
+def long_history(turns: int) -> List[Dict]:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"第 {i + 1} 个问题：为什么苹果会落地？能再举个例子吗？"})
+        history.append({"role": "assistant", "content": REPLIES[i % len(REPLIES)]})
+    return history
+
+
+def asr_results() -> List[Dict]:
+    """ASR 响应的几种形状（含缺字段的；会触发异常日志的畸形响应不放进来，打印会淹没被测函数本身）"""
+    return [
+        {"reqid": "a", "data": {"audio_info": {"duration": 3200}, "result": {"text": " 你好，牛顿先生 "}}},
+        {"reqid": "b", "data": {"text": "hello there"}},
+        {"reqid": "c", "text": "直接在顶层"},
+        {"reqid": "d", "data": {"result": {}}},
+        {"reqid": "e"},
+        {"reqid": "f", "data": {"result": {"text": ""}}},
+    ]
+
+
+FILES = [
+    ("voice.mp3", "audio/mpeg"), ("录音.WAV", None), ("clip", "audio/webm"), (None, "audio/x-m4a"),
+    ("a.b.c.flac", "audio/flac"), ("noext", None), ("track.aac", "audio/aac"), (None, None),
+]
+
+
+# =========================
+#  用例
+# =========================
+def build_cases(n_roles: int, turns: int, seed: int) -> List[Case]:
+    rng = random.Random(seed)
+    data = synthetic_roles(n_roles, rng)
+    # 合成角色与预置角色放进同一份注册表（bench 进程内替换，不写文件）
+    reg = registry.RoleRegistry(tuple(registry._record_from_json(d) for d in data) + registry.get_registry().roles)
+    registry._registry = reg
+    names = [r.name for r in reg.roles] + [a for r in reg.roles[:200] for a in r.aliases]
+    queries = role_queries(names, rng)
+
+    history = long_history(turns)
+    history_json = json.dumps(history, ensure_ascii=False)
+    card = freeze({"style": "严谨", "backstory": ["经典力学", "万有引力", "微积分"] * 4,
+                   "lexicon": ["自然哲学", "实验", "观测"] * 4, "taboo": ["AI"]})
+
+    sc = Scene(("牛顿", "苏格拉底", "福尔摩斯"), limit=turns)
+    speakers = [*sc.characters, scene.USER]
+    for i in range(turns * 4):
+        sc.append(speakers[i % len(speakers)], REPLIES[i % len(REPLIES)])
+    newton = reg.get("牛顿")
+
+    matcher = persona_guard.role_matcher(newton) or persona_guard.Matcher(persona_guard.DEFAULT_TABOO)
+
+    def guard_stream(text: str) -> str:
+        flt = persona_guard.ClauseFilter(matcher)
+        out = [flt.feed(text[i:i + 3])[0] for i in range(0, len(text), 3)]
+        out.append(flt.flush()[0])
+        return "".join(out)
+
+    def normalize_stream(text: str) -> str:
+        norm = StreamingNormalizer()
+        out = [norm.feed(text[i:i + 3]) for i in range(0, len(text), 3)]
+        out.append(norm.flush())
+        return "".join(out)
+
+    return [
+        Case("norm_key", registry.norm_key, [(q,) for q in queries]),
+        Case("registry.get", reg.get, [(q,) for q in queries]),
+        Case("search_roles", routes_roles.search_roles, [(q,) for q in queries[:20]]),
+        Case("pick_voice", tts.pick_voice, [(q, r) for q, r in zip(queries, REPLIES * 50)]),
+        Case("build_system_prompt", llm.build_system_prompt, [(n, card, s) for n, s in zip(names[:50], _SKILLS * 10)]),
+        Case("guess_audio_format", routes_audio._guess_audio_format, FILES),
+        Case("extract_asr_text", routes_audio._extract_text_from_asr_result, [(r,) for r in asr_results()]),
+        Case("prepare_chat", routes_roles._prepare_chat, [("牛顿", "再讲一遍", history_json, "科学解释")]),
+        Case("build_chat_messages", routes_roles._build_chat_messages, [(history, "你是牛顿。")]),
+        Case("scene.character_messages", scene.character_messages, [(sc, newton, "继续讨论")]),
+        Case("tts_text.normalize", normalize, [(r,) for r in REPLIES]),
+        Case("tts_text.stream", normalize_stream, [(r,) for r in REPLIES]),
+        Case("persona_guard.stream", guard_stream, [(r,) for r in REPLIES]),
+    ]
+
+
+# =========================
+#  测量
+# =========================
+def _noop(*args) -> None:
+    return None
+
+
+def _run(fn: Callable, inputs: Sequence[Tuple], loops: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(loops):
+        for args in inputs:
+            fn(*args)
+    return time.perf_counter() - t0
+
+
+def _calibrate(fn: Callable, inputs: Sequence[Tuple], min_time: float) -> int:
+    loops = 1
+    while True:
+        if _run(fn, inputs, loops) >= min_time:
+            return loops
+        loops *= 2
+
+
+def time_case(case: Case, repeat: int, min_time: float) -> Dict[str, float]:
+    ops = len(case.inputs)
+    loops = _calibrate(case.fn, case.inputs, min_time)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = [_run(case.fn, case.inputs, loops) / (loops * ops) * 1e9 for _ in range(repeat)]
+        overhead = min(_run(_noop, case.inputs, loops) / (loops * ops) * 1e9 for _ in range(repeat))
+    finally:
+        if enabled:
+            gc.enable()
+    return {
+        "ns_op": round(max(0.0, min(samples) - overhead), 1),
+        "ns_op_median": round(max(0.0, statistics.median(samples) - overhead), 1),
+        "loops": loops * ops,
+    }
+
+
+def alloc_case(case: Case, rounds: int = 20) -> Dict[str, float]:
+    for args in case.inputs:          # 预热：惰性初始化 / 编译好的正则不算进来
+        case.fn(*args)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for args in case.inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            case.fn(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for _ in range(rounds):
+        for args in case.inputs:
+            case.fn(*args)
+    gc.collect()
+    retained = sys.getallocatedblocks() - blocks
+    return {
+        "peak_bytes_op": round(statistics.mean(peaks)),
+        "blocks_op": round(retained / (rounds * len(case.inputs)), 2),
+    }
+
+
+def run(cases: List[Case], repeat: int, min_time: float, allocs: bool = True, out=sys.stdout) -> Dict[str, Dict]:
+    results = {}
+    for case in cases:
+        row = time_case(case, repeat, min_time)
+        if allocs:
+            row.update(alloc_case(case))
+        results[case.name] = row
+        print(_fmt_row(case.name, row), file=out, flush=True)
+    return results
+
+
+# =========================
+#  输出 / 基线
+# =========================
+def _fmt_row(name: str, row: Dict) -> str:
+    alloc = (f"{row['peak_bytes_op']:>12,}  {row['blocks_op']:>9}" if "peak_bytes_op" in row else "")
+    return f"{name:<26}{row['ns_op']:>14,.1f}{row['ns_op_median']:>14,.1f}  {alloc}"
+
+
+def _header() -> str:
+    return f"{'case':<26}{'ns/op(best)':>14}{'ns/op(med)':>14}  {'peak_B/op':>12}  {'blocks/op':>9}"
+
+
+def meta(args) -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "roles": args.roles, "history": args.history, "seed": args.seed,
+    }
+
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> Tuple[List[Dict], int]:
+    rows, regressions = [], 0
+    for name, row in current.items():
+        old = baseline.get(name)
+        if not old or not old.get("ns_op"):
+            rows.append({"case": name, "status": "new", "ns_op": row["ns_op"]})
+            continue
+        delta = (row["ns_op"] - old["ns_op"]) / old["ns_op"]
+        status = "regressed" if delta > threshold else "improved" if delta < -threshold else "same"
+        regressions += status == "regressed"
+        rows.append({"case": name, "status": status, "baseline_ns_op": old["ns_op"], "ns_op": row["ns_op"],
+                     "delta": round(delta, 3),
+                     "peak_bytes_op": (old.get("peak_bytes_op"), row.get("peak_bytes_op"))})
+    return rows, regressions
+
+
+def _print_compare(rows: List[Dict], baseline_meta: Dict) -> None:
+    print(f"基线：python {baseline_meta.get('python')}  {baseline_meta.get('created_at')}  "
+          f"roles={baseline_meta.get('roles')} history={baseline_meta.get('history')}")
+    print(f"{'case':<26}{'baseline':>12}{'now':>12}{'delta':>9}  status")
+    for r in rows:
+        if r["status"] == "new":
+            print(f"{r['case']:<26}{'-':>12}{r['ns_op']:>12,.1f}{'':>9}  new")
+            continue
+        print(f"{r['case']:<26}{r['baseline_ns_op']:>12,.1f}{r['ns_op']:>12,.1f}{r['delta']:>+9.1%}  {r['status']}")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="热点辅助函数微基准（ns/op + 分配）")
+    p.add_argument("-k", dest="only", default="", help="只跑名称包含这些子串的用例（逗号分隔）")
+    p.add_argument("--roles", type=int, default=5000, help="合成角色数")
+    p.add_argument("--history", type=int, default=200, help="长对话历史轮数")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--min-time", type=float, default=0.1, help="单次测量的最短秒数")
+    p.add_argument("--no-alloc", action="store_true", help="不统计分配（更快）")
+    p.add_argument("--save", metavar="PATH", help="把结果写成基线 JSON")
+    p.add_argument("--compare", metavar="PATH", help="与基线 JSON 对比，有退步时退出码为 1")
+    p.add_argument("--threshold", type=float, default=0.10, help="ns/op 变化超过该比例才算退步 / 提升")
+    p.add_argument("--json", action="store_true", help="输出 JSON 而不是表格")
+    args = p.parse_args(argv)
+
+    cases = build_cases(args.roles, args.history, args.seed)
+    if args.only:
+        keys = [k.strip() for k in args.only.split(",") if k.strip()]
+        cases = [c for c in cases if any(k in c.name for k in keys)]
+    # 表格逐行输出；--json 时进度写到 stderr，stdout 只有 JSON
+    out = sys.stderr if args.json else sys.stdout
+    print(_header(), file=out)
+    results = run(cases, args.repeat, args.min_time, allocs=not args.no_alloc, out=out)
+    report = {"meta": meta(args), "results": results}
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"基线已写入 {args.save}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows, regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if args.json:
+            print(json.dumps({**report, "compare": rows}, ensure_ascii=False, indent=2))
+        else:
+            _print_compare(rows, baseline.get("meta", {}))
+        return 1 if regressions else 0
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
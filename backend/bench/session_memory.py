@@ -0,0 +1,117 @@
+# backend/bench/session_memory.py
+"""
+会话内存基准：每个会话占用多少字节（tracemalloc 统计）
+
+  cd backend
+  python -m bench.session_memory --sessions 20000 --turns 6
+
+对比两种布局：
+  legacy  旧版 SESSIONS[sid] = {"role_card": 角色卡副本, "history": [{"user", "assistant"}, ...]}
+  current app.core.session_store（共享冻结角色卡 + 扁平 TurnBuffer）
+对话文本在两种布局中共用同一批字符串对象，只比较结构开销。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core import session_store  # noqa: E402
+from app.services.role import build_role_card  # noqa: E402
+
+ROLES = ["苏格拉底", "牛顿", "哈利波特", "福尔摩斯", "孙悟空", "林黛玉"]
+
+
+def _legacy_create(store: Dict, role_name: str, role_card: dict, limit: int, copy_card: bool) -> str:
+    # 与旧 create_session 相同：整张角色卡（可变 dict）挂在每个会话上。
+    # 旧 build_role_card 对预置角色返回同一对象（copy_card=False）；
+    # LLM 生成的卡或被调用方改写过的卡每个会话各持一份（copy_card=True）
+    sid = str(uuid.uuid4())
+    store[sid] = {
+        "role_name": role_name,
+        "role_card": copy.deepcopy(role_card) if copy_card else role_card,
+        "history": [],
+        "limit": limit,
+        "created_at": time.time(),
+    }
+    return sid
+
+
+def _legacy_append(sess: Dict, user: str, assistant: str) -> None:
+    sess["history"].append({"user": user, "assistant": assistant})
+    if len(sess["history"]) > sess["limit"]:
+        del sess["history"][0]
+
+
+def _measure(build: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def run(sessions: int, turns: int, limit: int) -> Dict:
+    cards = {name: asyncio.run(build_role_card(name)) for name in ROLES}
+    legacy_cards = {name: json.loads(json.dumps(session_store._thaw(c), ensure_ascii=False)) for name, c in cards.items()}
+    texts: List[str] = [f"第{i}句对话内容" for i in range(turns * 2)]
+
+    def build_legacy(copy_card: bool):
+        store: Dict = {}
+        for i in range(sessions):
+            name = ROLES[i % len(ROLES)]
+            sess = store[_legacy_create(store, name, legacy_cards[name], limit, copy_card)]
+            for t in range(turns):
+                _legacy_append(sess, texts[2 * t], texts[2 * t + 1])
+        return store
+
+    def build_current():
+        session_store.SESSIONS.clear()
+        for i in range(sessions):
+            name = ROLES[i % len(ROLES)]
+            sess = session_store.get_session(session_store.create_session(name, cards[name], limit))
+            for t in range(turns):
+                sess.history.append(texts[2 * t], texts[2 * t + 1])
+        return session_store.SESSIONS
+
+    legacy = _measure(lambda: build_legacy(True))
+    legacy_shared = _measure(lambda: build_legacy(False))
+    current = _measure(build_current)
+    session_store.SESSIONS.clear()
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "limit": limit,
+        "legacy_bytes_per_session": round(legacy / sessions),
+        "legacy_shared_card_bytes_per_session": round(legacy_shared / sessions),
+        "current_bytes_per_session": round(current / sessions),
+        "reduction": round(1 - current / legacy, 3) if legacy else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="会话内存占用基准")
+    p.add_argument("--sessions", type=int, default=20000)
+    p.add_argument("--turns", type=int, default=6, help="每个会话写入的轮数")
+    p.add_argument("--limit", type=int, default=6, help="memory_limit")
+    args = p.parse_args(argv)
+    print(json.dumps(run(args.sessions, args.turns, args.limit), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# backend/bench/tts_normalize.py
+"""
+TTS 文本规范化基准：用贴近实际的 LLM 回复（markdown 列表 / 加粗 / emoji / 数字单位）统计
+
+  - 送去合成的字符数：原文 vs 规范化后（上游按字符计费）
+  - 规范化本身的开销：一次性 normalize 与流式 StreamingNormalizer（按 3 字符一个 token 喂入）的 µs/条
+  - 合成耗时：默认按线性模型估算（--base-ms + --ms-per-char × 字符数）；
+              --live 时对每条回复真实调用上游 TTS（需要 OPENAI_API_KEY / UPSTREAM_KEYS）测量
+
+  cd backend
+  python -m bench.tts_normalize
+  python -m bench.tts_normalize --live
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.tts_text import StreamingNormalizer, normalize  # noqa: E402
+from bench.fake_upstream import CANNED_REPLY  # noqa: E402
+
+REPLIES: List[str] = [
+    CANNED_REPLY,
+    "## 牛顿第二定律 🍎\n\n**核心公式**：`F = ma`\n\n"
+    "- **F**：合外力，单位是牛顿（N）\n- **m**：质量，比如 2.5 kg\n- **a**：加速度，单位 m/s²\n\n"
+    "举个例子：一辆 1500 kg 的汽车以 3 m/s² 加速，需要的力就是 4500 N。💪\n\n"
+    "> 记住：力是改变运动状态的原因，而不是维持运动的原因。",
+    "哈哈，问得好！✨ 让我们用**苏格拉底式**的方法来想一想：\n\n"
+    "1. 你认为“正义”是什么？\n2. 如果一个人说谎是为了救人，他是正义的吗？🤔\n3. 那么正义是否取决于结果？\n\n"
+    "请先回答第一个问题，我们再继续。😊",
+    "### 线索分析 🔍\n\n| 线索 | 推论 |\n|---|---|\n| 鞋底泥土呈红色 | 去过城南工地 |\n"
+    "| 袖口有粉笔灰 | 可能是教师 |\n\n结论：嫌疑人大约在 **21:30** 离开，概率约 85%。详见 [案件档案](https://example.com/case/42)。",
+    "好的！今天的学习计划如下 📚：\n\n- 08:00~09:30 阅读《论语》第 1~3 章\n- 10:00 做 20 道练习题\n"
+    "- 下午复习，目标正确率 90% 以上 🎯\n\n加油，你一定可以的！🔥🔥",
+    "**Great question!** 🎉 Here's the short version:\n\n1. Water boils at 100 °C at sea level.\n"
+    "2. At 3,000 m altitude it boils at about 90 °C.\n3. So cooking takes ~25% longer up there. 🏔️\n\n"
+    "Try it yourself & let me know!",
+    "Elementary, my dear friend. 🕵️ The mud on your boots is **red clay**, found only within 2 km of the docks. "
+    "You arrived at 6:45, and you walked, not rode — note the wear on your left heel.",
+    "为了让你更好理解，我画个简单的比喻：\n\n```\n地球 --(引力)--> 苹果\n```\n\n"
+    "苹果落地，是因为地球的引力大约是 9.8 m/s² 的加速度。🌍 月球上只有约 1/6。",
+]
+
+
+def _bench_us(fn, repeat: int) -> float:
+    best = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best.append((time.perf_counter() - t0) / repeat * 1e6)
+    return min(best)
+
+
+def _stream(text: str, token_chars: int = 3) -> str:
+    norm = StreamingNormalizer()
+    out = [norm.feed(text[i:i + token_chars]) for i in range(0, len(text), token_chars)]
+    out.append(norm.flush())
+    return "".join(out)
+
+
+async def _live_ms(texts: List[str]) -> List[float]:
+    from app.services import tts
+    from app.core.upstream import aclose_http_client
+    out = []
+    try:
+        for text in texts:
+            t0 = time.perf_counter()
+            await tts._qiniu_tts_fetch(text, tts.pick_voice(None, text))
+            out.append((time.perf_counter() - t0) * 1000)
+    finally:
+        await aclose_http_client()
+    return out
+
+
+def run(repeat: int, base_ms: float, ms_per_char: float, live: bool) -> Dict:
+    rows = []
+    raw_total = norm_total = 0
+    for text in REPLIES:
+        cleaned = normalize(text)
+        raw_total += len(text)
+        norm_total += len(cleaned)
+        rows.append({
+            "raw_chars": len(text),
+            "tts_chars": len(cleaned),
+            "normalize_us": round(_bench_us(lambda: normalize(text), repeat), 1),
+            "stream_us": round(_bench_us(lambda: _stream(text), max(1, repeat // 5)), 1),
+            "preview": cleaned[:40],
+        })
+
+    result = {
+        "replies": len(REPLIES),
+        "raw_chars": raw_total,
+        "tts_chars": norm_total,
+        "chars_saved": raw_total - norm_total,
+        "chars_saved_ratio": round(1 - norm_total / raw_total, 3),
+        "normalize_us_median": statistics.median(r["normalize_us"] for r in rows),
+        "stream_us_median": statistics.median(r["stream_us"] for r in rows),
+    }
+    if live:
+        raw_ms = asyncio.run(_live_ms(REPLIES))
+        norm_ms = asyncio.run(_live_ms([normalize(t) for t in REPLIES]))
+        result["synthesis"] = {"mode": "live", "raw_ms": round(sum(raw_ms), 1), "normalized_ms": round(sum(norm_ms), 1)}
+    else:
+        raw_ms = sum(base_ms + ms_per_char * r["raw_chars"] for r in rows)
+        norm_ms = sum(base_ms + ms_per_char * r["tts_chars"] for r in rows)
+        result["synthesis"] = {"mode": f"model {base_ms:g}ms + {ms_per_char:g}ms/char",
+                               "raw_ms": round(raw_ms, 1), "normalized_ms": round(norm_ms, 1)}
+    s = result["synthesis"]
+    s["reduction"] = round(1 - s["normalized_ms"] / s["raw_ms"], 3) if s["raw_ms"] else 0.0
+    result["per_reply"] = rows
+    return result
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="TTS 文本规范化基准")
+    p.add_argument("--repeat", type=int, default=2000)
+    p.add_argument("--base-ms", type=float, default=150.0, help="模型：每次合成的固定开销")
+    p.add_argument("--ms-per-char", type=float, default=6.0, help="模型：每个字符的合成耗时")
+    p.add_argument("--live", action="store_true", help="真实调用上游 TTS 测量")
+    args = p.parse_args(argv)
+    print(json.dumps(run(args.repeat, args.base_ms, args.ms_per_char, args.live), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
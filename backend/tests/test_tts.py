@@ -0,0 +1,62 @@
+"""
+tts.render_cached：上游失败（网络错误 / 非 200 / 响应体不是音频）时返回 (None, False)，不抛异常
+bulk_tts.parse_item：与 tts.synthesize 一样先规范化文本，两条路径的缓存 key 相同
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import upstream
+from app.core.keypool import KeyPool
+from app.services import audio_cache, bulk_tts, tts
+from app.services.tts_text import normalize
+
+
+def _render(monkeypatch, handler):
+    monkeypatch.setattr(tts, "key_pool", KeyPool(["sk-test"]))
+    monkeypatch.setattr(tts, "has_keys", lambda: True)
+    monkeypatch.setattr(audio_cache, "lookup", lambda key: None)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        upstream._clients[loop] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await tts.render_cached("你好", "qiniu_zh_male_ybxknjs")
+        finally:
+            await upstream._clients.pop(loop).aclose()
+
+    return asyncio.run(run())
+
+
+def _connect_error(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def _read_timeout(request):
+    raise httpx.ReadTimeout("timed out", request=request)
+
+
+@pytest.mark.parametrize("handler", [
+    _connect_error,
+    _read_timeout,
+    lambda request: httpx.Response(503, text="busy"),
+    lambda request: httpx.Response(200, text="<html>gateway</html>"),
+    lambda request: httpx.Response(200, json={"code": 0}),
+    lambda request: httpx.Response(200, json={"data": "不是 base64"}),
+    lambda request: httpx.Response(200, json={"data": ""}),
+])
+def test_render_cached_failure(monkeypatch, handler):
+    assert _render(monkeypatch, handler) == (None, False)
+
+
+def test_bulk_item_key_matches_synthesize():
+    raw = "**GPT-4** 的价格是 $3.50 😀"
+    item = bulk_tts.parse_item({"text": raw, "voice": "qiniu_zh_male_ybxknjs"}, "1")
+    assert item.text == normalize(raw)[:800]
+    assert item.key == audio_cache.tts_key(normalize(raw)[:800], "qiniu_zh_male_ybxknjs", tts.SPEED)
+
+
+def test_bulk_item_rejects_text_that_normalizes_to_nothing():
+    with pytest.raises(ValueError):
+        bulk_tts.parse_item({"text": "😀😀"}, "1")
@@ -0,0 +1,53 @@
+# backend/tests/test_tts_text.py
+import pytest
+
+from app.services.tts_text import StreamingNormalizer, normalize
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("会议在2024-10-19举行", "会议在二零二四年十月十九日举行"),
+    ("电话 010-12345678", "电话零一零，一二三四五六七八"),
+    ("需要3-5天", "需要三到五天"),
+    ("下降了20-30%", "下降了百分之二十到百分之三十"),
+    ("温度 -5℃", "温度负五摄氏度"),
+    ("AI 与 GPT-4", "AI与GPT四"),
+    ("Win-10 系统", "Win十系统"),
+    ("价格 $3.50", "价格三点五美元"),
+    ("升级到 v2.0.1 吧", "升级到v二点零点一吧"),
+])
+def test_normalize_zh(text, expected):
+    assert normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("The meeting is 2024-10-19.", "The meeting is October nineteenth, twenty twenty-four."),
+    ("Call 010-12345678", "Call zero one zero, one two three four five six seven eight"),
+    ("COVID-19 is over", "COVID nineteen is over"),
+    ("GPT-4 is a model", "GPT four is a model"),
+    ("Win-10 works", "Win ten works"),
+    ("-3 degrees", "minus three degrees"),
+    ("Use 1/2 cup", "Use one half cup"),
+    ("It costs $3.50.", "It costs three dollars and fifty cents."),
+    ("update to v2.0.1 now", "update to version two point zero point one now"),
+])
+def test_normalize_en(text, expected):
+    assert normalize(text) == expected
+
+
+def _stream(text: str, size: int = 3, **kwargs) -> list:
+    norm = StreamingNormalizer(**kwargs)
+    out = [norm.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    out.append(norm.flush())
+    return [s for s in out if s]
+
+
+def test_stream_splits_sentences_across_chunks():
+    assert _stream("Hello there. I am here.\nOK", size=1) == ["Hello there.", "I am here.", "OK"]
+
+
+def test_stream_min_chars_merges_short_sentences():
+    assert _stream("好。我们开始吧。今天讲力学。", size=2, min_chars=4) == ["好。我们开始吧。", "今天讲力学。"]
+
+
+def test_stream_does_not_cut_inside_code_fence():
+    assert _stream("看代码：\n```py\nx = 1. y\n```\n完了。", size=2) == ["看代码：", "完了。"]